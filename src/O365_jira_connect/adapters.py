@@ -0,0 +1,87 @@
+import socket
+import time
+
+import requests.adapters
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from O365_jira_connect.metrics import Histogram
+
+__all__ = ("PooledAdapter",)
+
+
+class _TimedPoolMixin:
+    """Observe how long getting a connection out of the pool takes."""
+
+    wait: Histogram = None
+
+    def _get_conn(self, timeout=None):
+        start = time.perf_counter()
+        try:
+            return super()._get_conn(timeout=timeout)
+        finally:
+            self.wait.observe(time.perf_counter() - start)
+
+
+class PooledAdapter(requests.adapters.HTTPAdapter):
+    """An HTTP adapter whose connection pool is sized for concurrent use.
+
+    Requests wait for a pooled connection rather than opening throwaway
+    ones once the pool is exhausted (``pool_block``). The waiting time is
+    kept in ``pool_wait``: if it grows, the pool is what bounds throughput.
+    Connections are kept alive at the TCP level, sparing TLS handshakes after
+    idle periods, and every request gets a default timeout.
+    """
+
+    def __init__(
+        self,
+        pool_connections: int = 10,
+        pool_maxsize: int = 10,
+        pool_block: bool = True,
+        timeout: tuple = (10, 60),
+        keepalive: bool = True,
+        **kwargs,
+    ):
+        """
+        :param pool_connections: the number of hosts a pool is kept for
+        :param pool_maxsize: the max connections kept per host
+        :param pool_block: whether to wait for a free connection
+        :param timeout: the default connect and read timeouts, in seconds
+        :param keepalive: whether to enable TCP keep-alive
+        :param kwargs: the arguments of the underlying adapter
+        """
+        self.timeout = timeout
+        self.keepalive = keepalive
+        self.pool_wait = Histogram()
+        super().__init__(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block,
+            **kwargs,
+        )
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        if self.keepalive:
+            pool_kwargs.setdefault(
+                "socket_options",
+                [
+                    *HTTPConnection.default_socket_options,
+                    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+                ],
+            )
+        super().init_poolmanager(connections, maxsize, block=block, **pool_kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": self._timed(HTTPConnectionPool),
+            "https": self._timed(HTTPSConnectionPool),
+        }
+
+    def send(self, request, timeout=None, **kwargs):
+        timeout = timeout if timeout is not None else self.timeout
+        return super().send(request, timeout=timeout, **kwargs)
+
+    def snapshot(self) -> dict:
+        return {"pool_wait": self.pool_wait.snapshot()}
+
+    def _timed(self, pool_class):
+        name = f"Timed{pool_class.__name__}"
+        return type(name, (_TimedPoolMixin, pool_class), {"wait": self.pool_wait})
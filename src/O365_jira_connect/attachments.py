@@ -0,0 +1,96 @@
+import contextlib
+import logging
+import pathlib
+
+import O365
+
+__all__ = ("RemoteAttachment", "list_attachments")
+
+logger = logging.getLogger(__name__)
+
+ATTACHMENTS_ENDPOINT = "/messages/{id}/attachments"
+CONTENT_ENDPOINT = "/messages/{id}/attachments/{ida}/$value"
+
+# the attachment properties to list, leaving out the base64 content
+SELECT = ("id", "name", "contentType", "size", "isInline")
+
+
+class RemoteAttachment:
+    """An attachment of a message whose content stays remote until read.
+
+    Reading the content downloads the raw bytes through the ``$value``
+    endpoint, rather than the base64 encoded content embedded in json.
+    """
+
+    def __init__(
+        self,
+        message: O365.Message,
+        attachment_id: str,
+        name: str,
+        size: int = None,
+        content_type: str = None,
+        is_inline: bool = False,
+    ):
+        self.message = message
+        self.attachment_id = attachment_id
+        self.name = name
+        self.size = size
+        self.content_type = content_type
+        self.is_inline = is_inline
+
+    @classmethod
+    def from_cloud(cls, message: O365.Message, data: dict):
+        name = data.get("name") or data["id"]
+        # attached messages are downloaded in their MIME format
+        if "itemAttachment" in data.get("@odata.type", ""):
+            name = str(pathlib.PurePath(name).with_suffix(".eml"))
+        return cls(
+            message=message,
+            attachment_id=data["id"],
+            name=name,
+            size=data.get("size"),
+            content_type=data.get("contentType"),
+            is_inline=data.get("isInline", False),
+        )
+
+    @property
+    def url(self) -> str:
+        endpoint = CONTENT_ENDPOINT.format(
+            id=self.message.object_id, ida=self.attachment_id
+        )
+        return self.message.attachments.build_url(endpoint)
+
+    def download(self) -> bytes:
+        """Download the attachment content."""
+        return b"".join(self.iter_content())
+
+    def iter_content(self, chunk_size: int = 64 * 1024):
+        """Download the attachment content piece by piece, as it arrives."""
+        response = self.message.con.get(self.url, stream=True)
+        if not response:
+            return
+        with contextlib.closing(response):
+            yield from response.iter_content(chunk_size=chunk_size)
+
+    def __repr__(self):
+        return f"<RemoteAttachment '{self.name}' ({self.size} bytes)>"
+
+
+def list_attachments(message: O365.Message) -> list[RemoteAttachment]:
+    """List the attachments of a message, without downloading their content."""
+    endpoint = ATTACHMENTS_ENDPOINT.format(id=message.object_id)
+    url = message.attachments.build_url(endpoint)
+    params = {"$select": ",".join(SELECT)}
+
+    attachments = []
+    while url:
+        response = message.con.get(url, params=params)
+        if not response:
+            logger.warning(f"Could not list attachments of '{message.subject}'.")
+            break
+        data = response.json()
+        attachments.extend(
+            RemoteAttachment.from_cloud(message, item) for item in data.get("value", [])
+        )
+        url, params = data.get("@odata.nextLink"), None
+    return attachments
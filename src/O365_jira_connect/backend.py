@@ -1,33 +1,65 @@
 import logging
+import threading
+import time
 import typing
+import uuid
 
-from O365.utils import BaseTokenBackend
+import sqlalchemy.exc
+from O365.utils import BaseTokenBackend, Token
+from sqlalchemy import or_
+from sqlalchemy.dialects import postgresql, sqlite
 
-from O365_jira_connect.models import AccessToken
-from O365_jira_connect.session import with_session
+from O365_jira_connect.models import AccessToken, Lock
+from O365_jira_connect.session import with_new_session
 
 logger = logging.getLogger(__name__)
 
+TOKEN_ID = 1  # the id of the one token row
+REFRESH_LOCK = "token-refresh"
+
 
 class DatabaseTokenBackend(BaseTokenBackend):
-    def __init__(self):
+    """A token backend storing the token in the ``access_tokens`` table.
+
+    The token is cached in memory until its access expires. Refreshes are
+    coordinated through a lock in the database, so that among the processes
+    sharing the token only one refreshes it while the others wait for it.
+    """
+
+    def __init__(self, expiry_margin: int = 60, lock_ttl: int = 60):
+        """
+        :param expiry_margin: seconds before its expiry a cached token is
+                              no longer used
+        :param lock_ttl: seconds after which an unreleased refresh lock can
+                         be taken over, e.g. if its owner died
+        """
         super().__init__()
         self.svc = TokenSvc()
+        self.expiry_margin = expiry_margin
+        self.lock_ttl = lock_ttl
+        self.owner = uuid.uuid4().hex
+        self._cached = None
+        self._lock = threading.Lock()
 
     def load_token(self):
-        return self.svc.find_by(one=True)
+        with self._lock:
+            if not self._is_fresh(self._cached):
+                self._cached = self._load()
+            return self._cached
 
     def save_token(self):
         if self.token is None:
             raise ValueError("You have to set the 'token' first.")
 
-        # replace older token
-        token = self.svc.find_by(one=True)
-        if token is not None:
-            self.svc.delete(token_id=token.id)
-
-        # ... with the new one
-        self.svc.create(**self.token)
+        # replace older token, releasing the refresh lock if held
+        with self._lock:
+            self._cached = self.token
+        try:
+            self.svc.replace(lock=(REFRESH_LOCK, self.owner), **self.token)
+        except sqlalchemy.exc.OperationalError as ex:
+            # the token stays in use, and the lock expires for the others
+            logger.warning(f"Could not store the refreshed token: {ex.orig}")
+            return False
 
         return True
 
@@ -35,61 +67,175 @@ class DatabaseTokenBackend(BaseTokenBackend):
         if self.token is None:
             return False
 
-        token = self.svc.find_by(one=True, access_token=self.token.access_token)
-        if token is not None:
-            self.svc.delete(token_id=token.id)
+        with self._lock:
+            self._cached = None
+        return self.svc.delete(access_token=self.token["access_token"])
 
+    def check_token(self):
+        return self.load_token() is not None
+
+    def should_refresh_token(self, con=None):
+        """Take the refresh lock or wait for the process that holds it.
+
+        :return: True if this process is to refresh the token, False if the
+                 token was refreshed by another one
+        """
+        delay = 0.1
+        while True:
+            if self.svc.acquire_lock(REFRESH_LOCK, self.owner, ttl=self.lock_ttl):
+                # the token may have been refreshed while waiting for the lock
+                if self._adopt_refreshed():
+                    self.svc.release_lock(REFRESH_LOCK, self.owner)
+                    return False
+                return True
+            time.sleep(delay)
+            delay = min(delay * 2, 2)
+            if self._adopt_refreshed():
+                return False
+
+    def invalidate(self):
+        """Drop the cached token."""
+        with self._lock:
+            self._cached = None
+
+    def _adopt_refreshed(self) -> bool:
+        """Take the stored token if it is a fresh one, unlike the current."""
+        token = self._load()
+        current = self.token or {}
+        if token and token.get("access_token") != current.get("access_token"):
+            if self._is_fresh(token):
+                with self._lock:
+                    self._cached = self.token = token
+                return True
         return False
 
-    def check_token(self):
-        return self.svc.find_by(one=True) is not None
+    def _is_fresh(self, token: typing.Optional[Token]) -> bool:
+        if token is None or "expires_at" not in token:
+            return False
+        return time.time() < token["expires_at"] - self.expiry_margin
+
+    def _load(self) -> typing.Optional[Token]:
+        model = self.svc.find_by(one=True)
+        if model is None:
+            return None
+        columns = AccessToken.__table__.columns
+        return Token(
+            {c.name: getattr(model, c.name) for c in columns if c.name != "id"}
+        )
 
 
 class TokenSvc:
     @staticmethod
-    @with_session
+    @with_new_session
     def create(session=None, **kwargs) -> AccessToken:
         token = AccessToken(**kwargs)
 
         session.add(token)
-        session.commit()
+        session.flush()
 
         logger.debug(f"Created token '{token.access_token}'.")
 
         return token
 
     @staticmethod
-    @with_session
+    @with_new_session
+    def replace(lock: tuple = None, session=None, **kwargs):
+        """Replace the stored token with a new one in a single transaction,
+        so that there is always exactly one token stored.
+
+        :param lock: the name and owner of a lock to release along
+        :param kwargs: the token properties
+        """
+        columns = {c.name for c in AccessToken.__table__.columns} - {"id"}
+        values = {k: v for k, v in kwargs.items() if k in columns}
+
+        # tokens stored before the token had a fixed id
+        session.query(AccessToken).filter(AccessToken.id != TOKEN_ID).delete()
+
+        dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(
+            session.get_bind().dialect.name
+        )
+        if dialect:
+            statement = dialect.insert(AccessToken).values(id=TOKEN_ID, **values)
+            session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[AccessToken.id], set_=values
+                )
+            )
+        else:
+            session.merge(AccessToken(id=TOKEN_ID, **values))
+
+        if lock:
+            name, owner = lock
+            session.query(Lock).filter_by(name=name, owner=owner).delete()
+
+        logger.debug("Replaced token.")
+
+    @staticmethod
+    @with_new_session
     def get(token_id, session=None) -> typing.Optional[AccessToken]:
         return session.query(AccessToken).get(token_id)
 
     @staticmethod
-    @with_session
+    @with_new_session
     def find_by(
         one=False, session=None, **filters
     ) -> typing.Union[list[AccessToken], typing.Optional[AccessToken]]:
         query = session.query(AccessToken).filter_by(**filters)
         return query.all() if not one else query.one_or_none()
 
-    @classmethod
-    @with_session
-    def update(cls, token_id, session=None, **kwargs):
-        token = cls.get(token_id=token_id)
+    @staticmethod
+    @with_new_session
+    def update(token_id, session=None, **kwargs):
+        token = session.query(AccessToken).get(token_id)
         for key, value in kwargs.items():
             if hasattr(token, key):
                 setattr(token, key, value)
-        session.commit()
+        session.flush()
 
         access_token = token.access_token
         msg = f"Updated token '{access_token}' with the attributes: '{kwargs}'."
         logger.info(msg)
 
-    @classmethod
-    @with_session
-    def delete(cls, token_id, session=None):
-        token = cls.get(token_id=token_id)
-        if token:
-            session.delete(token)
-            session.commit()
+    @staticmethod
+    @with_new_session
+    def delete(session=None, **filters) -> bool:
+        deleted = session.query(AccessToken).filter_by(**filters).delete()
+        if deleted:
+            logger.debug("Deleted token.")
+        return bool(deleted)
+
+    @staticmethod
+    @with_new_session
+    def acquire_lock(name, owner, ttl: int, session=None) -> bool:
+        """Take a lock unless another owner holds it and it has not expired.
+
+        A database locked by another writer (e.g. on SQLite) is taken as the
+        lock being held, to be tried again later.
+        """
+        now = time.time()
+        try:
+            taken = (
+                session.query(Lock)
+                .filter(
+                    Lock.name == name, or_(Lock.expires_at < now, Lock.owner == owner)
+                )
+                .update({"owner": owner, "expires_at": now + ttl})
+            )
+            if taken:
+                return True
+            session.add(Lock(name=name, owner=owner, expires_at=now + ttl))
+            session.flush()
+        except sqlalchemy.exc.IntegrityError:
+            session.rollback()
+            return False
+        except sqlalchemy.exc.OperationalError as ex:
+            logger.warning(f"Could not take lock '{name}': {ex.orig}")
+            session.rollback()
+            return False
+        return True
 
-            logger.debug(f"Deleted token '{token.access_token}'.")
+    @staticmethod
+    @with_new_session
+    def release_lock(name, owner, session=None):
+        session.query(Lock).filter_by(name=name, owner=owner).delete()
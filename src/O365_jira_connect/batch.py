@@ -0,0 +1,347 @@
+import concurrent.futures
+import http
+import json
+import logging
+import threading
+import typing
+
+import O365
+import O365.mailbox
+import requests
+import requests.structures
+
+from O365_jira_connect.metrics import Counter, Histogram
+
+__all__ = (
+    "BatchRequest",
+    "GraphBatcher",
+    "delete_message",
+    "get_message",
+    "reply_all",
+    "send",
+    "send_draft",
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_SIZE = 20  # the max requests Graph takes in a batch
+BATCH_SIZE_BUCKETS = (1, 2, 5, 10, 15, 20)
+
+REPLY_ALL_ENDPOINT = "/messages/{id}/replyAll"
+
+
+class BatchRequest:
+    """A Graph request sent as part of a JSON batch."""
+
+    def __init__(
+        self,
+        method: str,
+        url: str,
+        params: dict = None,
+        body: dict = None,
+        headers: dict = None,
+        depends_on: typing.Iterable["BatchRequest"] = (),
+    ):
+        """
+        :param method: the HTTP method
+        :param url: the request url, as built by the O365 components
+        :param params: the query parameters
+        :param body: the json body
+        :param headers: the request headers
+        :param depends_on: the requests to succeed before this one is sent;
+                           they must be submitted along
+        """
+        if params:
+            url = requests.Request(method, url, params=params).prepare().url
+        self.method = method.upper()
+        self.url = url
+        self.body = body
+        self.headers = headers or {}
+        self.depends_on = tuple(depends_on)
+        self.attempts = 0
+        self.future = concurrent.futures.Future()
+
+    def result(self, timeout: float = None) -> requests.Response:
+        return self.future.result(timeout=timeout)
+
+    def to_api_data(self, ids: dict, base_url: str) -> dict:
+        url = self.url
+        if url.startswith(base_url):  # batched urls are relative to the version
+            url = "/" + url[len(base_url) :]
+        data = {"id": ids[self], "method": self.method, "url": url}
+        headers = dict(self.headers)
+        if self.body is not None:
+            headers.setdefault("Content-Type", "application/json")
+            data["body"] = self.body
+        if headers:
+            data["headers"] = headers
+        depends_on = [ids[r] for r in self.depends_on if r in ids]
+        if depends_on:
+            data["dependsOn"] = depends_on
+        return data
+
+    def __repr__(self):
+        return f"<BatchRequest {self.method} {self.url}>"
+
+
+class GraphBatcher:
+    """Send Graph requests in JSON batches of up to 20 requests.
+
+    Requests queued within ``window`` seconds of each other share a batch,
+    whether they come from one message or from several messages processed
+    at once. Requests submitted together are kept in the same batch, so
+    that they may depend on one another (``dependsOn``). Throttled requests
+    are sent again once their ``Retry-After`` elapses.
+    """
+
+    def __init__(
+        self,
+        con: O365.Connection,
+        protocol: O365.Protocol,
+        window: float = 0.05,
+        max_retries: int = 3,
+    ):
+        """
+        :param con: the connection the batches are sent through
+        :param protocol: the Graph protocol
+        :param window: seconds to wait for more requests before sending a batch
+        :param max_retries: the max retries of a throttled request
+        """
+        self.con = con
+        self.base_url = protocol.service_url
+        self.url = f"{self.base_url}$batch"
+        self.window = window
+        self.max_retries = max_retries
+        self.batches = Counter()
+        self.requests = Counter()
+        self.throttled = Counter()
+        self.batch_size = Histogram(buckets=BATCH_SIZE_BUCKETS)
+        self._pending: list[list[BatchRequest]] = []
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def submit(self, *requests_: BatchRequest) -> list[concurrent.futures.Future]:
+        """Queue requests to be sent in the same batch.
+
+        :return: the futures of their responses
+        """
+        if len(requests_) > MAX_BATCH_SIZE:
+            raise ValueError(f"At most {MAX_BATCH_SIZE} requests fit in a batch.")
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("The batcher is stopped.")
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self.run, name="graph-batcher", daemon=True
+                )
+                self._thread.start()
+            self._pending.append(list(requests_))
+            self._cond.notify_all()
+        return [r.future for r in requests_]
+
+    def send(self, *requests_: BatchRequest) -> list[requests.Response]:
+        """Send requests in the same batch and wait for their responses.
+
+        :raise requests.HTTPError: if any request failed
+        """
+        return [future.result() for future in self.submit(*requests_)]
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request in the next batch and wait for its response."""
+        return self.send(BatchRequest(method, url, **kwargs))[0]
+
+    def stop(self, timeout: float = None):
+        """Send the queued requests and stop."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        logger.info(f"Graph batcher stopped: {self.snapshot()}")
+
+    def run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._stopped)
+                if not self._pending:
+                    return
+                # give other requests of the same tick the chance to join
+                self._cond.wait_for(
+                    lambda: self._stopped or self._queued() >= MAX_BATCH_SIZE,
+                    timeout=self.window,
+                )
+                groups, self._pending = self._pending, []
+            for batch in self._pack(groups):
+                self._send(batch)
+
+    def _queued(self) -> int:
+        return sum(len(group) for group in self._pending)
+
+    @staticmethod
+    def _pack(groups):
+        batch = []
+        for group in groups:
+            if len(batch) + len(group) > MAX_BATCH_SIZE:
+                yield batch
+                batch = []
+            batch.extend(group)
+        if batch:
+            yield batch
+
+    def _send(self, batch: list[BatchRequest]):
+        ids = {request: str(i) for i, request in enumerate(batch, 1)}
+        data = {"requests": [r.to_api_data(ids, self.base_url) for r in batch]}
+        self.batches.inc()
+        self.requests.inc(len(batch))
+        self.batch_size.observe(len(batch))
+        try:
+            response = self.con.post(self.url, data=data)
+            responses = {item["id"]: item for item in response.json()["responses"]}
+        except Exception as ex:
+            for request in batch:
+                request.future.set_exception(ex)
+            return
+
+        retry, delay = [], 0.0
+        for request in batch:
+            request.attempts += 1
+            item = responses.get(ids[request])
+            if item is None:
+                exc = RuntimeError(f"No response to {request} in batch.")
+                request.future.set_exception(exc)
+                continue
+            response = self._to_response(request, item)
+            if request.attempts <= self.max_retries and (
+                response.status_code == requests.codes.too_many_requests
+                # dependencies that were throttled fail the request as well
+                or response.status_code == requests.codes.failed_dependency
+                and any(r in retry for r in request.depends_on)
+            ):
+                retry.append(request)
+                delay = max(delay, self._retry_after(response))
+                continue
+            try:
+                response.raise_for_status()
+            except requests.HTTPError as ex:
+                request.future.set_exception(ex)
+            else:
+                request.future.set_result(response)
+
+        if retry:
+            self.throttled.inc(len(retry))
+            logger.warning(f"{len(retry)} batched requests throttled, retrying.")
+            for request in retry:  # depend only on the ones still to be sent
+                request.depends_on = tuple(r for r in request.depends_on if r in retry)
+            timer = threading.Timer(delay, self._requeue, args=(retry,))
+            timer.daemon = True
+            timer.start()
+
+    def _requeue(self, requests_):
+        with self._cond:
+            if not self._stopped:
+                self._pending.append(requests_)
+                self._cond.notify_all()
+                return
+        self._send(requests_)
+
+    @staticmethod
+    def _to_response(request: BatchRequest, item: dict) -> requests.Response:
+        response = requests.Response()
+        response.status_code = item["status"]
+        response.headers = requests.structures.CaseInsensitiveDict(
+            item.get("headers", {})
+        )
+        response.url = request.url
+        try:
+            response.reason = http.HTTPStatus(response.status_code).phrase
+        except ValueError:
+            pass
+        body = item.get("body")
+        if body is None:
+            response._content = b""
+        elif isinstance(body, str):
+            response._content = body.encode()
+        else:
+            response._content = json.dumps(body).encode()
+        response.encoding = "utf-8"
+        return response
+
+    @staticmethod
+    def _retry_after(response) -> float:
+        try:
+            return max(float(response.headers.get("Retry-After", 1)), 0.0)
+        except ValueError:
+            return 1.0
+
+    def snapshot(self) -> dict:
+        return {
+            "batches": self.batches.value,
+            "requests": self.requests.value,
+            "throttled": self.throttled.value,
+            "batch_size": self.batch_size.snapshot(),
+        }
+
+
+def send(
+    con: O365.Connection, *requests_: BatchRequest, batcher: GraphBatcher = None
+) -> list[requests.Response]:
+    """Send requests in one batch given a batcher, or one after the other
+    otherwise, stopping at the first failure.
+
+    :raise requests.HTTPError: if any request failed
+    """
+    if batcher:
+        return batcher.send(*requests_)
+    return [
+        con.oauth_request(r.url, r.method.lower(), data=r.body, headers=dict(r.headers))
+        for r in requests_
+    ]
+
+
+def get_message(
+    batcher: GraphBatcher,
+    folder: O365.mailbox.Folder,
+    message_id: str,
+    query: O365.utils.Query = None,
+) -> O365.Message:
+    """Fetch a message in the next batch, as ``Folder.get_message`` would."""
+    url = folder.build_url(folder._endpoints.get("message").format(id=message_id))
+    params = query.as_params() if query else None
+    response = batcher.request("GET", url, params=params)
+    return folder.message_constructor(
+        parent=folder, **{folder._cloud_data_key: response.json()}
+    )
+
+
+def send_draft(message: O365.Message) -> list[BatchRequest]:
+    """The requests that send a draft: saving its changes, then sending it."""
+    requests_ = []
+    changes = message._track_changes
+    if changes:
+        body = message.to_api_data(restrict_keys=changes)
+        body.pop(message._cc("attachments"), None)
+        url = message.build_url(
+            message._endpoints.get("get_message").format(id=message.object_id)
+        )
+        requests_.append(BatchRequest("PATCH", url, body=body))
+    url = message.build_url(
+        message._endpoints.get("send_draft").format(id=message.object_id)
+    )
+    requests_.append(BatchRequest("POST", url, depends_on=requests_))
+    return requests_
+
+
+def delete_message(message: O365.Message, depends_on=()) -> BatchRequest:
+    url = message.build_url(
+        message._endpoints.get("get_message").format(id=message.object_id)
+    )
+    return BatchRequest("DELETE", url, depends_on=depends_on)
+
+
+def reply_all(message: O365.Message, body: str) -> BatchRequest:
+    """The request that replies to all the recipients of a message at once,
+    with the given html body. The threading headers are set by Graph."""
+    url = message.build_url(REPLY_ALL_ENDPOINT.format(id=message.object_id))
+    data = {"message": {"body": {"contentType": "HTML", "content": body}}}
+    return BatchRequest("POST", url, body=data)
@@ -0,0 +1,117 @@
+import functools
+import html
+import json
+import re
+import typing
+
+import bs4
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as HTMLParser
+except ImportError:
+    HTMLParser = None
+
+try:
+    import lxml  # noqa: F401
+
+    SOUP_PARSER = "lxml"
+except ImportError:
+    SOUP_PARSER = "html.parser"
+
+__all__ = ("ParsedBody",)
+
+DEFAULT_MAX_SIZE = 1024 * 1024  # 1M characters
+
+JSON_RE = re.compile(r"{.*\s.*}")
+HEAD_RE = re.compile(r"<head[\s>].*?</head>", re.IGNORECASE | re.DOTALL)
+META_RE = re.compile(r"<meta\s[^>]*>", re.IGNORECASE)
+ATTR_RE = re.compile(r"""([\w-]+)\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""")
+SKIP_RE = re.compile(r"<(script|style|head)[\s>].*?</\1>", re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(r"<[^>]+>")
+
+
+class ParsedBody:
+    """The body of a message, parsed at most once.
+
+    The text, the head meta tags and the embedded json payload are extracted
+    from the same parse and kept. Parsing uses the lexbor parser of
+    ``selectolax`` when installed (the ``fast`` extra) and ``BeautifulSoup``
+    otherwise (with ``lxml`` when installed). Bodies larger than ``max_size``
+    are not parsed at all; a cheap regex based extraction is used instead.
+    """
+
+    def __init__(self, content: str, content_type="HTML", max_size=DEFAULT_MAX_SIZE):
+        self.content = content or ""
+        self.is_html = content_type.upper() == "HTML"
+        self.oversize = max_size is not None and len(self.content) > max_size
+
+    @functools.cached_property
+    def soup(self) -> typing.Optional[bs4.BeautifulSoup]:
+        """The BeautifulSoup tree, e.g. for bodies about to be rewritten.
+        It is not available for oversize bodies."""
+        if not self.is_html or self.oversize:
+            return None
+        return bs4.BeautifulSoup(self.content, SOUP_PARSER)
+
+    @functools.cached_property
+    def text(self) -> str:
+        if not self.is_html:
+            return self.content
+        elif self.oversize:
+            return html.unescape(TAG_RE.sub("", SKIP_RE.sub("", self.content)))
+        elif HTMLParser is not None:
+            node = self._tree.body or self._tree.root
+            return node.text(deep=True) if node else ""
+        else:
+            node = self.soup.body or self.soup
+            return node.text
+
+    @functools.cached_property
+    def meta(self) -> list[dict]:
+        """The attributes of every meta tag in the head."""
+        if not self.is_html:
+            return []
+        elif self.oversize:
+            return self._scan_meta(self.content)
+        elif HTMLParser is not None:
+            return [dict(node.attributes) for node in self._tree.css("head meta")]
+        else:
+            head = self.soup.head
+            return [dict(tag.attrs) for tag in head.find_all("meta")] if head else []
+
+    def has_meta(self, **attrs) -> bool:
+        """Whether any head meta tag holds all the given attributes."""
+        return any(
+            all(meta.get(k) == v for k, v in attrs.items()) for meta in self.meta
+        )
+
+    @functools.cached_property
+    def json(self) -> typing.Optional[dict]:
+        """The json payload embedded in the body, if any. The head, styles and
+        scripts are left out of the search."""
+        if not self.is_html:
+            serialized = self.content
+        elif self.oversize:
+            serialized = html.unescape(SKIP_RE.sub("", self.content))
+        elif HTMLParser is not None:
+            node = self._tree.body or self._tree.root
+            serialized = html.unescape(node.html if node else "")
+        else:
+            serialized = html.unescape(str(self.soup.body or self.soup))
+
+        match = JSON_RE.search(serialized)
+        return json.loads(match.group()) if match else None
+
+    @functools.cached_property
+    def _tree(self):
+        return HTMLParser(self.content)
+
+    @staticmethod
+    def _scan_meta(content) -> list[dict]:
+        """Find the head meta tags without parsing the whole document."""
+        head = HEAD_RE.search(content)
+        tags = META_RE.findall(head.group()) if head else []
+        return [
+            {name.lower(): html.unescape(v1 or v2 or v3) for name, v1, v2, v3 in attrs}
+            for attrs in map(ATTR_RE.findall, tags)
+        ]
@@ -0,0 +1,72 @@
+import collections
+import threading
+import time
+
+__all__ = ("TTLCache",)
+
+
+class TTLCache:
+    """A thread-safe LRU cache whose entries expire after a time-to-live.
+
+    Entries may override the default ttl, which allows for instance to keep
+    negative results around for a shorter period than positive ones.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = collections.OrderedDict()
+        self._lock = threading.RLock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl: float = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+            return item[0] if item is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+            }
+
+    def __contains__(self, key):
+        sentinel = object()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+            found = self.get(key, sentinel) is not sentinel
+            self.hits, self.misses = hits, misses  # membership is not a lookup
+        return found
+
+    def __len__(self):
+        return len(self._data)
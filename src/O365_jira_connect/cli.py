@@ -6,7 +6,11 @@ import O365
 from O365_notifications.streaming import O365StreamingSubscriber
 from O365_notifications.constants import O365EventType
 
+from O365_jira_connect import jql, migrations
+from O365_jira_connect.adapters import PooledAdapter
 from O365_jira_connect.backend import DatabaseTokenBackend
+from O365_jira_connect.batch import GraphBatcher
+from O365_jira_connect.connection import PooledAccount
 from O365_jira_connect.filters import (
     BlacklistFilter,
     JiraCommentNotificationFilter,
@@ -15,6 +19,8 @@ from O365_jira_connect.filters import (
     WhitelistFilter,
 )
 from O365_jira_connect.handlers import JiraNotificationHandler
+from O365_jira_connect.refresher import TokenRefresher
+from O365_jira_connect.services import issue_s
 from O365_jira_connect.session import init_engine
 
 # configure logging
@@ -32,15 +38,85 @@ logger = logging.getLogger(__name__)
     show_envvar=True,
     help="the database URI used to store information on issues",
 )
+@click.option(
+    "--pool-size",
+    required=True,
+    type=click.IntRange(min=1),
+    default=5,
+    envvar="DATABASE_POOL_SIZE",
+    show_envvar=True,
+    help="the number of database connections kept open; ignored on SQLite",
+)
+@click.option(
+    "--max-overflow",
+    required=True,
+    type=click.IntRange(min=0),
+    default=10,
+    envvar="DATABASE_MAX_OVERFLOW",
+    show_envvar=True,
+    help="the number of connections opened beyond the pool size; ignored on SQLite",
+)
+@click.option(
+    "--pool-pre-ping/--no-pool-pre-ping",
+    default=True,
+    envvar="DATABASE_POOL_PRE_PING",
+    show_envvar=True,
+    help="test database connections before using them",
+)
+@click.option(
+    "--pool-recycle",
+    required=True,
+    type=int,
+    default=3600,
+    envvar="DATABASE_POOL_RECYCLE",
+    show_envvar=True,
+    help="the seconds after which database connections are replaced",
+)
+@click.option(
+    "--busy-timeout",
+    required=True,
+    type=click.IntRange(min=0),
+    default=5000,
+    envvar="SQLITE_BUSY_TIMEOUT",
+    show_envvar=True,
+    help="the milliseconds SQLite waits on a locked database",
+)
 @click.group(context_settings={"help_option_names": ["-h", "--help"]})
-def cli(debug, database):
+def cli(debug, database, **pool_options):
     if debug:
         click.echo("Debug mode is enabled")
         logger.setLevel(logging.DEBUG)
-    init_engine(engine_url=database, debug=debug)
+    init_engine(engine_url=database, debug=debug, **pool_options)
 
 
 def o365_options(f):
+    f = click.option(
+        "--read-timeout",
+        required=True,
+        type=float,
+        default=60,
+        envvar="O365_READ_TIMEOUT",
+        show_envvar=True,
+        help="the seconds to wait for O365 to answer",
+    )(f)
+    f = click.option(
+        "--connect-timeout",
+        required=True,
+        type=float,
+        default=10,
+        envvar="O365_CONNECT_TIMEOUT",
+        show_envvar=True,
+        help="the seconds to wait for a connection to O365",
+    )(f)
+    f = click.option(
+        "--pool-maxsize",
+        required=True,
+        type=click.IntRange(min=1),
+        default=20,
+        envvar="O365_POOL_MAXSIZE",
+        show_envvar=True,
+        help="the max connections kept open to O365; keep it above the workers",
+    )(f)
     f = click.option(
         "--retries",
         required=False,
@@ -154,6 +230,90 @@ def authorize(**params):
     return authorize_account(**params)
 
 
+@cli.group()
+def db():
+    """Operations involving the database."""
+    pass
+
+
+@click.option(
+    "--batch-size",
+    required=True,
+    type=click.IntRange(min=1),
+    default=500,
+    show_default=True,
+    help="the number of rows migrated per transaction",
+)
+@db.command()
+def migrate(batch_size):
+    """Migrate existing data onto the current database schema."""
+    migrations.migrate(batch_size=batch_size)
+
+
+@cli.group()
+def issues():
+    """Operations involving issues."""
+    pass
+
+
+@click.option(
+    "--batch-size",
+    required=True,
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+    help="the number of issues loaded at once",
+)
+@issues.command("backfill-attachments")
+def backfill_attachments(batch_size):
+    """Index the attachments issues already have in Jira, so that they are
+    not attached again."""
+    count = issue_s.backfill_attachments(batch_size=batch_size)
+    logger.info(f"Indexed {count} attachments.")
+
+
+@click.option(
+    "--restart",
+    is_flag=True,
+    default=False,
+    help="start over rather than resume from the last checkpoint",
+)
+@click.option(
+    "--prune/--no-prune",
+    default=False,
+    show_default=True,
+    help="delete the stale issues and update the moved ones, "
+    "rather than only reporting them",
+)
+@click.option(
+    "--chunk-size",
+    required=True,
+    type=click.IntRange(min=1, max=jql.MAX_KEYS),
+    default=100,
+    show_default=True,
+    help="the number of keys searched for at once",
+)
+@click.option(
+    "--batch-size",
+    required=True,
+    type=click.IntRange(min=1),
+    default=1000,
+    show_default=True,
+    help="the number of issues checked per transaction",
+)
+@issues.command()
+def reconcile(batch_size, chunk_size, prune, restart):
+    """Find the issues no longer in Jira, e.g. deleted or moved, resuming
+    from the last checkpoint."""
+    stats = issue_s.reconcile(
+        batch_size=batch_size, chunk_size=chunk_size, prune=prune, restart=restart
+    )
+    logger.info(
+        f"Reconciled {stats['checked']} issues in {stats['seconds']}s: "
+        f"{stats['moved']} moved, {stats['stale']} stale."
+    )
+
+
 @cli.group()
 @o365_options
 def messages(**_):
@@ -179,6 +339,89 @@ def messages(**_):
     show_envvar=True,
     help="the O365 connection timeout in minutes",
 )
+@click.option(
+    "--token-refresh-margin",
+    required=True,
+    type=click.IntRange(min=0),
+    default=300,
+    envvar="TOKEN_REFRESH_MARGIN_IN_SECONDS",
+    show_envvar=True,
+    help="the seconds before its expiry the token is refreshed in the background;"
+    " 0 to refresh it on expiry only",
+)
+@click.option(
+    "--reply-mode",
+    required=True,
+    type=click.Choice(["draft", "oneshot"]),
+    default="draft",
+    show_default=True,
+    envvar="REPLY_MODE",
+    show_envvar=True,
+    help="how replies are sent: filling in a draft made by the server, or"
+    " rendered locally and sent in a single call",
+)
+@click.option(
+    "--graph-batch-window",
+    required=True,
+    type=click.FloatRange(min=0),
+    default=0.05,
+    envvar="GRAPH_BATCH_WINDOW_IN_SECONDS",
+    show_envvar=True,
+    help="the seconds Graph requests wait for others to share a $batch request",
+)
+@click.option(
+    "--workers",
+    required=True,
+    type=click.IntRange(min=1),
+    default=1,
+    envvar="WORKERS",
+    show_envvar=True,
+    help="the number of messages processed concurrently",
+)
+@click.option(
+    "--filters-order",
+    required=False,
+    type=str,
+    multiple=True,
+    default=[],
+    envvar="FILTERS_ORDER",
+    show_envvar=True,
+    help="the order filters are applied in, by name (the class name by default)",
+)
+@click.option(
+    "--max-body-size",
+    required=True,
+    type=int,
+    default=1024 * 1024,
+    envvar="MAX_BODY_SIZE",
+    show_envvar=True,
+    help="the size of message bodies above which a cheaper text extraction is used",
+)
+@click.option(
+    "--lists-reload-interval",
+    required=True,
+    type=int,
+    default=60,
+    envvar="LISTS_RELOAD_INTERVAL_IN_SECONDS",
+    show_envvar=True,
+    help="the interval of seconds the blacklist and whitelist are checked for changes",
+)
+@click.option(
+    "--blacklist-file",
+    required=False,
+    type=click.Path(exists=True, dir_okay=False),
+    envvar="BLACKLIST_FILE",
+    show_envvar=True,
+    help="a file with additional blacklist rules, one per line",
+)
+@click.option(
+    "--whitelist-file",
+    required=False,
+    type=click.Path(exists=True, dir_okay=False),
+    envvar="WHITELIST_FILE",
+    show_envvar=True,
+    help="a file with additional whitelist rules, one per line",
+)
 @click.option(
     "--blacklist",
     required=True,
@@ -202,7 +445,9 @@ def messages(**_):
 @jira_options
 @messages.command()
 @click.pass_context
-def streaming(ctx, connection_timeout, keep_alive_interval, **params):
+def streaming(
+    ctx, connection_timeout, keep_alive_interval, token_refresh_margin, **params
+):
     """Start streaming connection for handling incoming O365 events."""
     parent_params = ctx.parent.params
     if parent_params["grant_type"] == "credentials":
@@ -213,16 +458,32 @@ def streaming(ctx, connection_timeout, keep_alive_interval, **params):
         )
         sys.exit(0)
 
+    # the history of issues created before the upgrade is needed right away
+    if migrations.pending():
+        logger.info("Migrating existing data onto the current database schema ...")
+        migrations.migrate()
+
     subscriber = create_subscriber(**parent_params)
     handler = create_handler(subscriber, **params)
 
+    # refresh the token ahead of its expiry
+    refresher = None
+    if token_refresh_margin:
+        refresher = TokenRefresher(subscriber.con, margin=token_refresh_margin)
+        refresher.start()
+
     # start listening for streaming events ...
-    subscriber.start_streaming(
-        notification_handler=handler,
-        connection_timeout=connection_timeout,
-        keep_alive_interval=keep_alive_interval,
-        refresh_after_expire=True,
-    )
+    try:
+        subscriber.start_streaming(
+            notification_handler=handler,
+            connection_timeout=connection_timeout,
+            keep_alive_interval=keep_alive_interval,
+            refresh_after_expire=True,
+        )
+    finally:
+        if refresher:
+            refresher.stop()
+        handler.shutdown()
 
 
 def authorize_account(
@@ -235,6 +496,9 @@ def authorize_account(
     grant_type,
     scopes,
     retries,
+    pool_maxsize,
+    connect_timeout,
+    read_timeout,
 ):
     kwargs = {"api_version": api_version} if api_version else {}
     if protocol == "graph":
@@ -246,7 +510,10 @@ def authorize_account(
     if scopes and grant_type == "credentials":
         scopes = None
 
-    account = O365.Account(
+    adapter = PooledAdapter(
+        pool_maxsize=pool_maxsize, timeout=(connect_timeout, read_timeout)
+    )
+    account = PooledAccount(
         credentials=(client_id, client_secret),
         protocol=protocol,
         tenant_id=tenant_id,
@@ -255,6 +522,7 @@ def authorize_account(
         scopes=scopes,
         request_retries=retries,
         token_backend=DatabaseTokenBackend(),
+        adapter=adapter,
     )
 
     if account.is_authenticated:
@@ -282,18 +550,44 @@ def create_subscriber(principal: str = None, **kwargs):
 def create_handler(subscriber, **configs):
     resources = [sub.resource for sub in subscriber.subscriptions]
     main_resource = subscriber.main_resource
+    reload_interval = configs["lists_reload_interval"]
+
+    # JSON batching is a Graph feature
+    batcher = None
+    if isinstance(subscriber.protocol, O365.MSGraphProtocol):
+        batcher = GraphBatcher(
+            subscriber.con,
+            subscriber.protocol,
+            window=configs["graph_batch_window"],
+        )
+
     filters = [
-        BlacklistFilter(blacklist=configs.pop("blacklist")),
-        JiraCommentNotificationFilter(folder=resources[0]),
+        BlacklistFilter(
+            blacklist=configs.pop("blacklist"),
+            path=configs["blacklist_file"],
+            reload_interval=reload_interval,
+        ),
+        JiraCommentNotificationFilter(
+            folder=resources[0], batcher=batcher, reply_mode=configs["reply_mode"]
+        ),
         RecipientControlFilter(email=main_resource, ignore=[resources[1]]),
         ValidateMetadataFilter(),
-        WhitelistFilter(whitelist=configs.pop("whitelist")),
+        WhitelistFilter(
+            whitelist=configs.pop("whitelist"),
+            path=configs["whitelist_file"],
+            reload_interval=reload_interval,
+        ),
     ]
 
     return JiraNotificationHandler(
         parent=subscriber,
         namespace=subscriber.namespace,
         filters=filters,
+        filters_order=configs["filters_order"],
+        workers=configs["workers"],
+        max_body_size=configs["max_body_size"],
+        batcher=batcher,
+        reply_mode=configs["reply_mode"],
         issue_type=configs["issue_type"],
         default_labels=configs["default_labels"],
     )
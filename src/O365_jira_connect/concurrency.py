@@ -0,0 +1,97 @@
+import collections
+import concurrent.futures
+import threading
+import typing
+
+__all__ = ("FanOut", "KeyedExecutor")
+
+
+class KeyedExecutor:
+    """Run tasks on a pool of threads while tasks that share the same key run
+    one at a time and in the order they were submitted.
+
+    Tasks submitted with no key are not ordered whatsoever. Tasks submitted
+    with a key once the executor is shut down fail right away.
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = ""):
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=thread_name_prefix
+        )
+        self._queues: dict[typing.Hashable, collections.deque] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, **kwargs) -> concurrent.futures.Future:
+        if key is None:
+            return self._pool.submit(fn, *args, **kwargs)
+
+        future = concurrent.futures.Future()
+        task = (future, fn, args, kwargs)
+        with self._lock:
+            queue = self._queues.get(key)
+            if queue is not None:
+                # a worker is already draining tasks for this key
+                queue.append(task)
+                return future
+            self._queues[key] = collections.deque([task])
+        try:
+            self._pool.submit(self._drain, key)
+        except RuntimeError as ex:
+            # e.g. once shut down; fail the tasks queued meanwhile as well
+            with self._lock:
+                queue = self._queues.pop(key)
+            for task in queue:
+                task[0].set_exception(ex)
+        return future
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+    def _drain(self, key):
+        while True:
+            with self._lock:
+                queue = self._queues[key]
+                if not queue:
+                    del self._queues[key]
+                    return
+                future, fn, args, kwargs = queue.popleft()
+
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as ex:
+                future.set_exception(ex)
+            else:
+                future.set_result(result)
+
+
+class FanOut:
+    """Run independent tasks concurrently on a bounded pool of threads.
+
+    A failing task does not stop the others: failures are collected along
+    with the results, once every task is done.
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = ""):
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=thread_name_prefix
+        )
+        self._futures: dict[str, concurrent.futures.Future] = {}
+
+    def submit(self, name: str, fn, *args, **kwargs):
+        self._futures[name] = self._pool.submit(fn, *args, **kwargs)
+
+    def join(self) -> tuple[dict, dict[str, BaseException]]:
+        """Wait for every task to be done.
+
+        :return: the results and the failures, by task name
+        """
+        self._pool.shutdown(wait=True)
+        results, errors = {}, {}
+        for name, future in self._futures.items():
+            if future.exception() is not None:
+                errors[name] = future.exception()
+            else:
+                results[name] = future.result()
+        return results, errors
@@ -0,0 +1,28 @@
+import O365
+
+from O365_jira_connect.adapters import PooledAdapter
+
+__all__ = ("PooledAccount", "PooledConnection")
+
+
+class PooledConnection(O365.Connection):
+    """An O365 connection whose sessions go through a pooled adapter."""
+
+    def __init__(self, *args, adapter: PooledAdapter = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.adapter = adapter
+
+    def get_session(self, **kwargs):
+        session = super().get_session(**kwargs)
+        if self.adapter is not None:
+            if self.request_retries:  # keep the retries set up by O365
+                self.adapter.max_retries = session.get_adapter("https://").max_retries
+            session.mount("https://", self.adapter)
+            session.mount("http://", self.adapter)
+        return session
+
+
+class PooledAccount(O365.Account):
+    """An O365 account whose connection pools its HTTP connections."""
+
+    connection_constructor = PooledConnection
@@ -0,0 +1,77 @@
+import functools
+import typing
+
+import O365
+
+from O365_jira_connect.attachments import RemoteAttachment, list_attachments
+from O365_jira_connect.body import DEFAULT_MAX_SIZE, ParsedBody
+from O365_jira_connect.models import Issue
+from O365_jira_connect.services import issue_s
+
+__all__ = ("MessageContext",)
+
+
+class MessageContext:
+    """Lookups on a message that are shared by the filter chain and the handler.
+
+    Every lookup is computed on first access and kept for the remaining of the
+    message processing, so that no matter how many filters run, a message
+    costs one issue query and one parse of each body.
+    """
+
+    def __init__(self, message: O365.Message, max_body_size=DEFAULT_MAX_SIZE):
+        self.message = message
+        self.max_body_size = max_body_size
+
+    @functools.cached_property
+    def issue(self) -> typing.Optional[Issue]:
+        """The local issue of the message conversation, if any."""
+        cid = self.message.conversation_id
+        return issue_s.find_one(outlook_conversation_id=cid, _model=True)
+
+    @functools.cached_property
+    def body(self) -> ParsedBody:
+        message = self.message
+        return ParsedBody(
+            message.body, content_type=message.body_type, max_size=self.max_body_size
+        )
+
+    @functools.cached_property
+    def unique_body(self) -> ParsedBody:
+        message = self.message
+        return ParsedBody(
+            message.unique_body,
+            content_type=message.unique_body_type,
+            max_size=self.max_body_size,
+        )
+
+    @functools.cached_property
+    def sender(self) -> str:
+        return self.message.sender.address
+
+    @functools.cached_property
+    def to(self) -> set[str]:
+        return {e.address for e in self.message.to}
+
+    @functools.cached_property
+    def cc(self) -> set[str]:
+        return {e.address for e in self.message.cc}
+
+    @functools.cached_property
+    def bcc(self) -> set[str]:
+        return {e.address for e in self.message.bcc}
+
+    @functools.cached_property
+    def watchers(self) -> list[str]:
+        """The cc and bcc recipients, in the order they appear."""
+        ccs = (e.address for e in self.message.cc)
+        bccs = (e.address for e in self.message.bcc)
+        return list(dict.fromkeys((*ccs, *bccs)))
+
+    @functools.cached_property
+    def attachments(self) -> list[RemoteAttachment]:
+        """The message attachments, listed on first access only, once the
+        message is known to be worth it. Their content is not downloaded."""
+        # inline-only attachments are not reported by 'HasAttachments',
+        # hence always listing them
+        return list_attachments(self.message)
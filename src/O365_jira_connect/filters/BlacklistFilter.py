@@ -1,6 +1,7 @@
 import logging
 
-from O365_jira_connect.filters.base import OutlookMessageFilter
+from O365_jira_connect.filters.base import FilterCost, OutlookMessageFilter
+from O365_jira_connect.filters.matcher import ReloadingSenderMatcher
 
 __all__ = ("BlacklistFilter",)
 
@@ -9,17 +10,21 @@ logger = logging.getLogger(__name__)
 
 class BlacklistFilter(OutlookMessageFilter):
     """Filter for message blacklist. It currently checks if sender's email is
-    blacklisted."""
+    blacklisted. See :class:`SenderMatcher` for the supported rules."""
 
-    def __init__(self, blacklist):
-        self.blacklist = blacklist
+    cost = FilterCost.MEMORY
 
-    def apply(self, message):
+    def __init__(self, blacklist=(), path=None, reload_interval=60):
+        self.blacklist = ReloadingSenderMatcher(
+            rules=blacklist, name="blacklist", path=path, interval=reload_interval
+        )
+
+    def apply(self, message, ctx=None):
         if not message:
             return None
 
         sender = message.sender.address
-        if sender in self.blacklist:
+        if self.blacklist.match(sender):
             logger.info(
                 f"Message skipped as the sender's email '{sender}' is blacklisted."
             )
@@ -5,8 +5,9 @@ import re
 import requests
 import O365.mailbox
 
-from O365_jira_connect import utils
-from O365_jira_connect.filters.base import OutlookMessageFilter
+from O365_jira_connect import batch, utils
+from O365_jira_connect.batch import GraphBatcher
+from O365_jira_connect.filters.base import FilterCost, OutlookMessageFilter
 from O365_jira_connect.handlers import JiraNotificationHandler
 from O365_jira_connect.services import issue_s, jira_s
 
@@ -20,24 +21,41 @@ class JiraCommentNotificationFilter(OutlookMessageFilter):
     recipient gets notified whenever a new comment has been added to the issue.
     """
 
-    def __init__(self, folder: O365.mailbox.Folder):
+    cost = FilterCost.NETWORK
+    side_effects = True
+
+    def __init__(
+        self,
+        folder: O365.mailbox.Folder,
+        batcher: GraphBatcher = None,
+        reply_mode: str = "draft",
+    ):
         self.folder = folder
+        self.batcher = batcher
+        self.reply_mode = reply_mode
 
-    def apply(self, message):
+    def apply(self, message, ctx=None):
         if not message:
             return None
+        ctx = self.context(message, ctx)
 
-        if message.sender.address.split("@")[1] == "automation.atlassian.com":
-            payload = utils.message_json(message)
+        if ctx.sender.split("@")[1] == "automation.atlassian.com":
+            payload = ctx.unique_body.json
+            if not payload:
+                logger.warning("Comment notification with no payload.")
+                return None
             model = issue_s.find_one(key=payload["issue"], _model=True)
             if not model:
                 logger.warning("Comment on issue that was not found.")
                 return None
 
             # locate last lent message to reply on
-            last_message_id = model.outlook_messages_id.split(",")[-1]
+            last_message_id = issue_s.last_message_id(issue_id=model.id)
+            if not last_message_id:
+                logger.warning("Comment on issue with no message history.")
+                return None
             try:
-                last_message = self.folder.get_message(object_id=last_message_id)
+                last_message = self._get_message(last_message_id)
             except requests.exceptions.HTTPError as e:
                 if e.response.status_code == requests.codes.not_found:
                     logger.warning("Reply-to message was not found; no email was sent.")
@@ -61,20 +79,29 @@ class JiraCommentNotificationFilter(OutlookMessageFilter):
                 )
 
                 # send out the comment message has a reply to the last sent message
+                # and delete the message since it serves no further purpose
                 metadata = {"name": "message", "content": "relay jira comment"}
-                reply = JiraNotificationHandler.create_reply(
-                    message=last_message,
+                JiraNotificationHandler.send_reply(
+                    last_message,
                     values={
                         "body": body,
                         "author": payload["author"]["name"],
                         "metadata": [metadata],
                     },
+                    delete=message,
+                    batcher=self.batcher,
+                    reply_mode=self.reply_mode,
                 )
-                reply.send()
+                return None
 
             # delete message since it serves no further purpose
-            message.delete()
+            batch.send(message.con, batch.delete_message(message), batcher=self.batcher)
 
             return None
 
         return message
+
+    def _get_message(self, message_id) -> O365.Message:
+        if self.batcher:
+            return batch.get_message(self.batcher, self.folder, message_id)
+        return self.folder.get_message(object_id=message_id)
@@ -1,10 +1,8 @@
-import itertools
 import logging
 
 import O365.mailbox
 
-from O365_jira_connect.filters.base import OutlookMessageFilter
-from O365_jira_connect.services import issue_s
+from O365_jira_connect.filters.base import FilterCost, OutlookMessageFilter
 
 __all__ = ("RecipientControlFilter",)
 
@@ -14,38 +12,33 @@ logger = logging.getLogger(__name__)
 class RecipientControlFilter(OutlookMessageFilter):
     """Filter for message validating its recipients"""
 
+    cost = FilterCost.DATABASE
+
     def __init__(self, email, ignore: list[O365.mailbox.Folder] = ()):
         self.email = email
         self.ignore = ignore
 
-    def apply(self, message):
+    def apply(self, message, ctx=None):
         if not message:
             return None
+        ctx = self.context(message, ctx)
 
         # exclude case where recipient is both present in the 'from' recipient field
         # and in any of the other recipient fields. This case will cause a duplicate
         # notification. Therefore, exclude the event where the message is sent because
         # the event will be triggered upon message delivery.
-        other_recipients = itertools.chain(
-            (e.address for e in message.cc),
-            (e.address for e in message.bcc),
-            (e.address for e in message.to),
-        )
         if (
-            self.email == message.sender.address
-            and self.email in other_recipients
+            self.email == ctx.sender
+            and self.email in ctx.cc | ctx.bcc | ctx.to
             and any(comp.folder_id == message.folder_id for comp in self.ignore)
         ):
             logger.info("Message filtered as the notification is a duplicate.")
             return None
 
         # check for existing issue
-        cid = message.conversation_id
-        existing_issue = issue_s.find_one(outlook_conversation_id=cid, _model=True)
-
-        if not existing_issue:
+        if not ctx.issue:
             # exclude if new message initiated by the recipient
-            if self.email == message.sender.address:
+            if self.email == ctx.sender:
                 logger.info(
                     f"Message filtered as the recipient '{self.email}' "
                     "is the sender of a new conversation."
@@ -54,7 +47,7 @@ class RecipientControlFilter(OutlookMessageFilter):
 
             # exclude if new message did not come from the recipient
             # and is not directly sent 'to' recipient (must be in cc or bcc)
-            elif self.email not in (e.address for e in message.to):
+            elif self.email not in ctx.to:
                 logger.info(
                     f"Message filtered as the recipient '{self.email}' "
                     "is not in the senders list of a new conversation."
@@ -1,6 +1,6 @@
 import logging
 
-from O365_jira_connect.filters.base import OutlookMessageFilter
+from O365_jira_connect.filters.base import FilterCost, OutlookMessageFilter
 from O365_jira_connect.services import issue_s
 
 __all__ = ("ValidateMetadataFilter",)
@@ -11,22 +11,23 @@ logger = logging.getLogger(__name__)
 class ValidateMetadataFilter(OutlookMessageFilter):
     """Filter message based on metadata present in the message"""
 
-    def apply(self, message):
+    cost = FilterCost.DATABASE
+    side_effects = True
+
+    def apply(self, message, ctx=None):
         if not message:
             return None
+        ctx = self.context(message, ctx)
 
-        soup = message.get_body_soup()
-
-        if soup is None or soup.head is None:
+        if not ctx.body.meta:
             return message
         else:
 
             # append message to history if jira metadata is present
-            opts = {"outlook_conversation_id": message.conversation_id, "_model": True}
-            model = issue_s.find_one(**opts)
+            model = ctx.issue
 
             # ignore the notification email sent to user after the creation of an issue
-            if soup.head.find("meta", attrs={"content": "jira issue notification"}):
+            if ctx.body.has_meta(content="jira issue notification"):
                 issue_s.add_message_to_history(message, model=model)
                 logger.info(
                     "Message filtered as this is a message notification to the user "
@@ -35,7 +36,7 @@ class ValidateMetadataFilter(OutlookMessageFilter):
                 return None
 
             # ignore the message sent when a new comment is added to the issue
-            elif soup.head.find("meta", attrs={"content": "relay jira comment"}):
+            elif ctx.body.has_meta(content="relay jira comment"):
                 issue_s.add_message_to_history(message, model=model)
                 logger.info(
                     "Message filtered as this is a relay message from a Jira comment."
@@ -1,6 +1,7 @@
 import logging
 
-from O365_jira_connect.filters.base import OutlookMessageFilter
+from O365_jira_connect.filters.base import FilterCost, OutlookMessageFilter
+from O365_jira_connect.filters.matcher import ReloadingSenderMatcher
 
 __all__ = ("WhitelistFilter",)
 
@@ -9,17 +10,21 @@ logger = logging.getLogger(__name__)
 
 class WhitelistFilter(OutlookMessageFilter):
     """Filter for message whitelist. It currently checks if the sender's domain is
-    whitelisted."""
+    whitelisted. See :class:`SenderMatcher` for the supported rules."""
 
-    def __init__(self, whitelist):
-        self.whitelist = whitelist
+    cost = FilterCost.MEMORY
 
-    def apply(self, message):
+    def __init__(self, whitelist=(), path=None, reload_interval=60):
+        self.whitelist = ReloadingSenderMatcher(
+            rules=whitelist, name="whitelist", path=path, interval=reload_interval
+        )
+
+    def apply(self, message, ctx=None):
         if not message:
             return None
 
         sender = message.sender.address
-        if sender.split("@")[1] not in self.whitelist:
+        if not self.whitelist.match(sender):
             logger.info(
                 f"Message skipped as the sender's email '{sender}' is not whitelisted."
             )
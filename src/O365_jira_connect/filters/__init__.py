@@ -1,11 +1,13 @@
 from .BlacklistFilter import BlacklistFilter
 from .JiraCommentNotificationFilter import JiraCommentNotificationFilter
+from .pipeline import FilterPipeline
 from .RecipientControlFilter import RecipientControlFilter
 from .ValidateMetadataFilter import ValidateMetadataFilter
 from .WhitelistFilter import WhitelistFilter
 
 __all__ = (
     BlacklistFilter,
+    FilterPipeline,
     JiraCommentNotificationFilter,
     RecipientControlFilter,
     ValidateMetadataFilter,
@@ -1,13 +1,33 @@
+import enum
 from abc import ABC, abstractmethod
 
+from O365_jira_connect.context import MessageContext
+
+
+class FilterCost(enum.IntEnum):
+    """How expensive a filter is to apply."""
+
+    MEMORY = 0  # pure in-memory checks
+    DATABASE = 1  # queries the local database
+    NETWORK = 2  # calls remote services
+
 
 class Filter(ABC):
+    cost = FilterCost.MEMORY
+    side_effects = False  # whether applying the filter changes any state
+    name: str = None  # tells apart instances of a class; the class name if unset
+
     @abstractmethod
-    def apply(self, message):
+    def apply(self, message, ctx=None):
         raise NotImplementedError("Subclasses must implement this method.")
 
 
 class OutlookMessageFilter(Filter, ABC):
     @abstractmethod
-    def apply(self, message):
+    def apply(self, message, ctx: MessageContext = None):
         raise NotImplementedError("Subclasses must implement this method.")
+
+    @staticmethod
+    def context(message, ctx: MessageContext = None) -> MessageContext:
+        """The shared message context, or a new one if none is given."""
+        return ctx if ctx is not None else MessageContext(message)
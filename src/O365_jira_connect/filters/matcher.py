@@ -0,0 +1,149 @@
+import logging
+import os
+import re
+import threading
+import time
+
+import sqlalchemy.exc
+
+from O365_jira_connect.models import SenderRule
+from O365_jira_connect.session import with_session
+
+__all__ = ("SenderMatcher", "ReloadingSenderMatcher")
+
+logger = logging.getLogger(__name__)
+
+REGEX_PREFIX = "re:"
+WILDCARD_PREFIX = "*."
+
+
+class SenderMatcher:
+    """Match email addresses against a list of rules.
+
+    The supported rules are:
+        * an address, e.g. ``someone@example.com``
+        * a domain, e.g. ``example.com``
+        * any subdomain of a domain, e.g. ``*.example.com``
+        * a regular expression on the address, e.g. ``re:^noreply@.*``
+
+    Rules are compiled into a set of addresses, a set of domains, a trie of
+    reversed domain labels and one combined regex. A lookup therefore costs
+    O(address length) regardless of how many rules there are, regexes aside.
+    """
+
+    def __init__(self, rules=()):
+        self.compile(rules)
+
+    def compile(self, rules):
+        addresses, domains, trie, patterns = set(), set(), {}, []
+        for rule in rules:
+            rule = rule.strip()
+            if not rule:
+                continue
+            elif rule.startswith(REGEX_PREFIX):
+                patterns.append(rule[len(REGEX_PREFIX) :])
+            elif rule.startswith(WILDCARD_PREFIX):
+                node = trie
+                for label in reversed(rule[len(WILDCARD_PREFIX) :].lower().split(".")):
+                    node = node.setdefault(label, {})
+                node[None] = True  # any subdomain below this node matches
+            elif "@" in rule:
+                addresses.add(rule.lower())
+            else:
+                domains.add(rule.lower())
+
+        regex = "|".join(f"(?:{p})" for p in patterns)
+        regex = re.compile(regex, re.IGNORECASE) if regex else None
+
+        # swap at once so that concurrent lookups see a consistent state
+        self._compiled = (frozenset(addresses), frozenset(domains), trie, regex)
+
+    def match(self, address: str) -> bool:
+        if not address:
+            return False
+        addresses, domains, trie, regex = self._compiled
+        address = address.lower()
+        domain = address.rpartition("@")[2]
+        return (
+            address in addresses
+            or domain in domains
+            or self._match_subdomain(trie, domain)
+            or bool(regex and regex.search(address))
+        )
+
+    def __contains__(self, address):
+        return self.match(address)
+
+    @staticmethod
+    def _match_subdomain(trie, domain) -> bool:
+        node = trie
+        labels = domain.split(".")
+        for i, label in enumerate(reversed(labels), start=1):
+            node = node.get(label)
+            if node is None:
+                return False
+            if None in node and i < len(labels):
+                return True
+        return False
+
+
+class ReloadingSenderMatcher(SenderMatcher):
+    """A sender matcher that also takes rules from a file and from the
+    ``sender_rules`` table, reloading them when they change.
+
+    Sources are checked at most once every ``interval`` seconds, on lookup.
+    The file holds one rule per line; lines starting with '#' are ignored.
+    """
+
+    def __init__(self, rules=(), name=None, path=None, interval: int = 60):
+        """
+        :param rules: the static rules
+        :param name: the list name of the rules in the database, if any
+        :param path: the file with additional rules, if any
+        :param interval: seconds between checks for changes
+        """
+        self.rules = list(rules)
+        self.name = name
+        self.path = path
+        self.interval = interval
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        super().__init__(rules=self.rules)
+        self.reload()
+
+    def match(self, address: str) -> bool:
+        if time.monotonic() - self._checked_at >= self.interval:
+            self.reload()
+        return super().match(address)
+
+    def reload(self, force=False):
+        """Compile the rules again if any of the sources changed."""
+        if not self._lock.acquire(blocking=False):
+            return  # another thread is reloading already
+        try:
+            self._checked_at = time.monotonic()
+            db_rules = self._load_db_rules(name=self.name) if self.name else []
+            mtime = os.stat(self.path).st_mtime if self.path else None
+            signature = (mtime, tuple(db_rules))
+            if force or signature != self._signature:
+                file_rules = self._load_file_rules(self.path) if self.path else []
+                self.compile([*self.rules, *file_rules, *db_rules])
+                self._signature = signature
+                logger.info(f"Loaded sender rules for '{self.name or self.path}'.")
+        except (OSError, sqlalchemy.exc.SQLAlchemyError) as ex:
+            logger.warning(f"Could not load sender rules: {ex}")
+        finally:
+            self._lock.release()
+
+    @staticmethod
+    def _load_file_rules(path) -> list[str]:
+        with open(path) as file:
+            lines = (line.strip() for line in file)
+            return [line for line in lines if line and not line.startswith("#")]
+
+    @staticmethod
+    @with_session
+    def _load_db_rules(name, session=None) -> list[str]:
+        query = session.query(SenderRule.pattern).filter_by(list_name=name)
+        return [row.pattern for row in query.order_by(SenderRule.id)]
@@ -0,0 +1,103 @@
+import collections
+import logging
+import time
+
+from O365_jira_connect.context import MessageContext
+from O365_jira_connect.filters.base import OutlookMessageFilter
+from O365_jira_connect.metrics import Counter, Histogram
+
+__all__ = ("FilterPipeline",)
+
+logger = logging.getLogger(__name__)
+
+
+class FilterStats:
+    """Counters and latency of a single filter."""
+
+    def __init__(self):
+        self.applied = Counter()
+        self.rejected = Counter()
+        self.latency = Histogram()
+
+    def snapshot(self) -> dict:
+        return {
+            "applied": self.applied.value,
+            "rejected": self.rejected.value,
+            "latency": self.latency.snapshot(),
+        }
+
+
+class FilterPipeline:
+    """Apply a chain of filters to a message, stopping at the first rejection.
+
+    Filters run from the cheapest to the most expensive cost class, keeping
+    the given order for filters of the same class, so that e.g. the sender
+    lists reject a message before any network call. Filters with side effects
+    keep their given order among themselves: one runs no earlier than the
+    most expensive of those given before it. Hence they act only upon the
+    messages cheaper filters let through. An explicit order, given as filter
+    names, takes precedence; unlisted filters run afterwards.
+
+    Filters are named after their ``name``, or their class otherwise. Stats
+    are kept per filter: filters sharing a name are told apart by their
+    rank in the pipeline (e.g. 'Whitelist#2').
+    """
+
+    def __init__(self, filters: list[OutlookMessageFilter], order: list[str] = None):
+        self.filters = self.sort(filters, order=order)
+        self.names = self.unique_names(self.filters)
+        self.stats = {name: FilterStats() for name in self.names}
+
+    def apply(self, message, ctx: MessageContext = None) -> bool:
+        """Whether the message passes every filter."""
+        ctx = ctx if ctx is not None else MessageContext(message)
+        for f, name in zip(self.filters, self.names):
+            stats = self.stats[name]
+            start = time.perf_counter()
+            try:
+                result = f.apply(message, ctx)
+            finally:
+                stats.latency.observe(time.perf_counter() - start)
+                stats.applied.inc()
+            if not result:
+                stats.rejected.inc()
+                logger.debug(f"Message rejected by filter '{name}'.")
+                return False
+        return True
+
+    def snapshot(self) -> dict:
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
+
+    @classmethod
+    def sort(cls, filters, order: list[str] = None) -> list[OutlookMessageFilter]:
+        filters = list(filters)
+        if order:
+            unknown = set(order) - {cls.name(f) for f in filters}
+            if unknown:
+                raise ValueError(f"Unknown filters in order: {sorted(unknown)}.")
+            rank = {name: i for i, name in enumerate(order)}
+            return sorted(filters, key=lambda f: rank.get(cls.name(f), len(rank)))
+
+        # filters with side effects rank no lower than those before them
+        ranks, floor = {}, 0
+        for f in filters:
+            if f.side_effects:
+                floor = max(floor, f.cost)
+                ranks[id(f)] = floor
+        return sorted(filters, key=lambda f: ranks.get(id(f), f.cost))
+
+    @staticmethod
+    def name(f) -> str:
+        return getattr(f, "name", None) or type(f).__name__
+
+    @classmethod
+    def unique_names(cls, filters) -> list[str]:
+        """The names of the filters, suffixed by their rank among the filters
+        of the same name, from the second one on."""
+        seen = collections.Counter()
+        names = []
+        for f in filters:
+            name = cls.name(f)
+            seen[name] += 1
+            names.append(name if seen[name] == 1 else f"{name}#{seen[name]}")
+        return names
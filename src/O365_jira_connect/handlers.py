@@ -1,7 +1,9 @@
-import itertools
+import html
 import json
 import logging
+import typing
 
+import jira
 import mistune
 import O365
 import O365.mailbox
@@ -9,13 +11,24 @@ import O365.mailbox
 from O365_notifications.base import O365Notification, O365NotificationHandler
 from O365_notifications.constants import O365EventType, O365Namespace
 
+from O365_jira_connect import batch
+from O365_jira_connect.batch import GraphBatcher
+from O365_jira_connect.body import DEFAULT_MAX_SIZE, ParsedBody
+from O365_jira_connect.concurrency import KeyedExecutor
+from O365_jira_connect.context import MessageContext
 from O365_jira_connect.filters.base import OutlookMessageFilter
+from O365_jira_connect.filters.pipeline import FilterPipeline
 from O365_jira_connect.services import issue_s
+from O365_jira_connect.session import session_scope
 
 __all__ = ("JiraNotificationHandler",)
 
 logger = logging.getLogger(__name__)
 
+# 'draft': fill in a reply draft created by the server, then send it
+# 'oneshot': render the reply locally and send it in a single call
+REPLY_MODES = ("draft", "oneshot")
+
 
 class JiraNotificationHandler(O365NotificationHandler):
     def __init__(
@@ -23,11 +36,26 @@ class JiraNotificationHandler(O365NotificationHandler):
         parent: O365.utils.ApiComponent,
         namespace: O365Namespace,
         filters: list[OutlookMessageFilter] = (),
+        filters_order: list[str] = None,
+        workers: int = 1,
+        max_body_size: int = DEFAULT_MAX_SIZE,
+        batcher: GraphBatcher = None,
+        reply_mode: str = "draft",
         **configs,
     ):
+        if reply_mode not in REPLY_MODES:
+            raise ValueError(f"Reply mode must be one of {REPLY_MODES}.")
         self.parent = parent
         self.namespace = namespace
-        self.filters = filters
+        self.max_body_size = max_body_size
+        self.batcher = batcher
+        self.reply_mode = reply_mode
+        self.filters = FilterPipeline(filters, order=filters_order)
+        self.executor = (
+            KeyedExecutor(max_workers=workers, thread_name_prefix="handler")
+            if workers > 1
+            else None
+        )
         issue_s.configs.update(configs)
 
     def process(self, notification: O365Notification):
@@ -49,16 +77,59 @@ class JiraNotificationHandler(O365NotificationHandler):
                 notification.resource.type
                 == self.namespace.O365ResourceDataType.MESSAGE
             ):
-                self.process_message(message_id=notification.resource.id)
+                message_id = notification.resource.id
+                if self.executor:
+                    future = self.executor.submit(None, self.dispatch, message_id)
+                    future.add_done_callback(self._log_failure)
+                else:
+                    self.process_message(message_id=message_id)
+
+    def dispatch(self, message_id):
+        """Fetch a message and queue it for processing.
+
+        Messages of the same conversation are processed one at a time, so
+        that a conversation does not end up with two issues. They are
+        processed in the order their fetches complete, rather than in the
+        order of the notifications: the conversation is only known once a
+        message is fetched, and messages are fetched concurrently.
+        """
+        message = self.get_message(message_id, parent=self.parent, batcher=self.batcher)
+        future = self.executor.submit(
+            message.conversation_id, self.handle_message, message
+        )
+        future.add_done_callback(self._log_failure)
+
+    def shutdown(self, wait=True):
+        """Wait for the queued messages to be processed."""
+        if self.executor:
+            self.executor.shutdown(wait=wait)
+        logger.info(f"Filters stopped: {self.filters.snapshot()}")
+        if self.batcher:
+            self.batcher.stop()
+
+        # the limits Jira set and the time spent waiting on them and on the
+        # connection pools
+        self._log_adapter("Jira", getattr(issue_s.jira, "adapter", None))
+        self._log_adapter("Graph", getattr(self.parent.con, "adapter", None))
 
     def process_message(self, message_id):
         """Process a message and create/update an issue."""
-        message = self.get_message(message_id, parent=self.parent)
+        message = self.get_message(message_id, parent=self.parent, batcher=self.batcher)
+        self.handle_message(message)
 
-        # watchers list
-        ccs = (e.address for e in message.cc)
-        bccs = (e.address for e in message.bcc)
-        emails = list(itertools.chain(ccs, bccs))
+    def handle_message(self, message: O365.Message):
+        """Create/update an issue out of a message.
+
+        The message is processed within one session, though every database
+        step of it is committed on its own, so that no write transaction is
+        held while Jira or Graph are called. On SQLite, such a transaction
+        would lock out every other writer.
+        """
+        with session_scope():
+            self._handle_message(message)
+
+    def _handle_message(self, message: O365.Message):
+        ctx = MessageContext(message, max_body_size=self.max_body_size)
 
         logger.info("\n*** Processing new message ***")
         logger.info(
@@ -67,81 +138,122 @@ class JiraNotificationHandler(O365NotificationHandler):
                     "outlook id": message.object_id,
                     "created": message.created.strftime("%d/%m/%Y %H:%M:%S"),
                     "subject": message.subject,
-                    "from": message.sender.address,
+                    "from": ctx.sender,
                 },
                 indent=4,
             )
         )
 
         # skip message processing if message is filtered
-        if any(not e for e in list(map(lambda f: f.apply(message), self.filters))):
+        if not self.filters.apply(message, ctx):
             logger.info(f"Message '{message.subject}' filtered.")
             return
 
         # check for local existing issue
-        existing_issue = issue_s.find_one(
-            outlook_conversation_id=message.conversation_id, _model=True
-        )
+        existing_issue = ctx.issue
+
+        # delete local reference if issue no longer exists in Jira, opening
+        # a new issue instead
+        if existing_issue and not issue_s.exists(existing_issue.key):
+            self._drop_issue(existing_issue)
+            existing_issue = None
 
         # add new comment if issue already exists.
         # create new issue otherwise.
         if existing_issue:
 
-            # delete local reference if issue no longer exists in Jira
-            exists = next(iter(issue_s.find_by(key=existing_issue.key, limit=1)), None)
-            if not exists:
-                issue_s.delete(issue_id=existing_issue.id)
-
             # only add comment if not added yet
-            if message.object_id not in existing_issue.outlook_messages_id:
-                issue_s.create_comment(
-                    issue=existing_issue,
-                    author=message.sender.address,
-                    body=O365.message.bs(message.unique_body, "html.parser").body.text,
-                    watchers=emails,
-                    attachments=message.attachments,
-                )
-
-                # append message to history
-                issue_s.add_message_to_history(message, existing_issue)
-
-                logger.info(f"New comment added on issue '{existing_issue.key}'.")
+            if not issue_s.has_message(message_id=message.object_id):
+                try:
+                    issue_s.create_comment(
+                        issue=existing_issue,
+                        author=ctx.sender,
+                        body=ctx.unique_body.text,
+                        watchers=ctx.watchers,
+                        attachments=ctx.attachments,
+                    )
+                except jira.JIRAError as ex:
+                    # deleted in Jira while still known to exist
+                    if ex.status_code != 404:
+                        raise ex
+                    self._drop_issue(existing_issue)
+                    existing_issue = None
+                else:
+                    # append message to history
+                    issue_s.add_message_to_history(message, existing_issue)
+
+                    key = existing_issue.key
+                    logger.info(f"New comment added on issue '{key}'.")
             else:
                 key = existing_issue.key
                 logger.info(f"Comment on issue '{key}' has already been added.")
-        else:
 
-            # create issue in Jira and keep local reference
-            issue = issue_s.create(
+        if not existing_issue:
+
+            # create issue in Jira and keep local reference, notifying the
+            # issue reporter along
+            notifications = []
+
+            def notify(key):
+                notifications.append(
+                    self.notify_reporter(
+                        message=message,
+                        issue_key=key,
+                        batcher=self.batcher,
+                        reply_mode=self.reply_mode,
+                    )
+                )
+
+            model = issue_s.create(
                 # Jira fields
                 title=message.subject,
-                body=O365.message.bs(message.unique_body, "html.parser").body.text,
-                reporter=message.sender.address,
+                body=ctx.unique_body.text,
+                reporter=ctx.sender,
                 board="support",
                 category="general",
                 priority=message.importance.value,
-                watchers=emails,
-                attachments=message.attachments,
+                watchers=ctx.watchers,
+                attachments=ctx.attachments,
+                notify=notify,
                 # local fields
                 outlook_message_id=message.object_id,
                 outlook_conversation_id=message.conversation_id,
-                outlook_messages_id=message.object_id,
+                received_at=message.received,
             )
 
-            # get local issue reference
-            model = issue_s.find_one(key=issue["key"], _model=True)
+            # append message to history; a reply sent in one shot is appended
+            # once it shows up in the sent items
+            for notification in filter(None, notifications):
+                issue_s.add_message_to_history(message=notification, model=model)
 
-            # notify issue reporter about created issue
-            notification = self.notify_reporter(message=message, issue_key=model.key)
+            logger.info(f"New issue created with Jira key '{model.key}'.")
 
-            # append message to history
-            issue_s.add_message_to_history(message=notification, model=model)
+    @staticmethod
+    def _log_adapter(name, adapter):
+        if hasattr(adapter, "snapshot"):
+            logger.info(f"{name} HTTP adapter stats: {adapter.snapshot()}")
 
-            logger.info(f"New issue created with Jira key '{model.key}'.")
+    @staticmethod
+    def _drop_issue(issue):
+        """Delete the local reference of an issue no longer in Jira."""
+        logger.info(f"Issue '{issue.key}' no longer exists in Jira.")
+        issue_s.delete(issue_id=issue.id)
 
     @staticmethod
-    def get_message(message_id, parent: O365.utils.ApiComponent):
-        """Create a complete message O365 component given its id."""
+    def _log_failure(future):
+        if future.exception():
+            logger.error("Message processing failed.", exc_info=future.exception())
+
+    @staticmethod
+    def get_message(
+        message_id, parent: O365.utils.ApiComponent, batcher: GraphBatcher = None
+    ):
+        """Create a message O365 component given its id.
+
+        Only the properties the filters need are fetched. Attachments are
+        listed later on, and only for messages that pass the filters. Given a
+        batcher, the message is fetched along with others fetched meanwhile.
+        """
 
         # force certain properties from the message to be present
         select = (
@@ -166,12 +278,19 @@ class JiraNotificationHandler(O365NotificationHandler):
         folder = O365.mailbox.Folder(parent=parent)
 
         query = folder.new_query().select(*select)
-        return folder.get_message(
-            object_id=message_id, query=query, download_attachments=True
-        )
+        if batcher:
+            return batch.get_message(batcher, folder, message_id, query=query)
+        return folder.get_message(object_id=message_id, query=query)
 
     @classmethod
-    def notify_reporter(cls, *, message: O365.Message, issue_key: str):
+    def notify_reporter(
+        cls,
+        *,
+        message: O365.Message,
+        issue_key: str,
+        batcher: GraphBatcher = None,
+        reply_mode: str = "draft",
+    ) -> typing.Optional[O365.Message]:
         # creating notification message to be sent to all recipients
         markdown = mistune.create_markdown(escape=False)
         body = markdown(
@@ -185,8 +304,41 @@ class JiraNotificationHandler(O365NotificationHandler):
         )
 
         metadata = {"name": "message", "content": "jira issue notification"}
-        reply = cls.create_reply(message, values={"body": body, "metadata": [metadata]})
-        reply.send()
+        return cls.send_reply(
+            message,
+            values={"body": body, "metadata": [metadata]},
+            batcher=batcher,
+            reply_mode=reply_mode,
+        )
+
+    @classmethod
+    def send_reply(
+        cls,
+        message: O365.Message,
+        values: dict,
+        *,
+        delete: O365.Message = None,
+        batcher: GraphBatcher = None,
+        reply_mode: str = "draft",
+    ) -> typing.Optional[O365.Message]:
+        """Reply to all the recipients of a message, out of template.
+
+        :param message: the message to reply to
+        :param values: the template values
+        :param delete: a message to delete once the reply is sent
+        :param batcher: the batcher sending the requests in one round trip
+        :param reply_mode: one of ``REPLY_MODES``
+        :return: the reply, unless sent in one shot
+        """
+        if reply_mode == "oneshot":
+            reply = None
+            requests_ = [batch.reply_all(message, cls.render_reply(message, values))]
+        else:
+            reply = cls.create_reply(message, values=values)
+            requests_ = batch.send_draft(reply)
+        if delete is not None:
+            requests_.append(batch.delete_message(delete, depends_on=requests_[-1:]))
+        batch.send(message.con, *requests_, batcher=batcher)
         return reply
 
     @staticmethod
@@ -194,11 +346,8 @@ class JiraNotificationHandler(O365NotificationHandler):
         """Create a reply message from template."""
         reply = message.reply(to_all=True)
 
-        # process email body with bs
-        bs = O365.message.bs
-
         if reply.body_type.lower() == "html":
-            soup = bs(reply.body, "html.parser")
+            soup = ParsedBody(reply.body, max_size=None).soup
             soup.find("hr").decompose()  # remove horizontal lines
             reply_body = soup.find("body").decode_contents()
             style_bs = soup.find("style")
@@ -217,3 +366,41 @@ class JiraNotificationHandler(O365NotificationHandler):
         reply.body = body
 
         return reply
+
+    @classmethod
+    def render_reply(cls, message: O365.Message, values: dict = None) -> str:
+        """Render a reply body from template, quoting the message as the
+        server does on reply drafts, with no need for one."""
+        parsed = ParsedBody(message.body, content_type=message.body_type, max_size=None)
+        if parsed.is_html:
+            soup = parsed.soup
+            body = (soup.body or soup).decode_contents()
+            style_bs = soup.find("style")
+            style = style_bs.decode_contents() if style_bs else ""
+        else:
+            body = html.escape(parsed.content).replace("\n", "<br/>")
+            style = ""
+
+        sent = message.sent or message.created
+        quote = issue_s.create_message_body(
+            template="quote.j2",
+            values={
+                "sender": cls._recipient(message.sender),
+                "sent": sent.strftime("%A, %B %d, %Y %I:%M %p") if sent else "",
+                "to": "; ".join(cls._recipient(r) for r in message.to),
+                "cc": "; ".join(cls._recipient(r) for r in message.cc),
+                "subject": message.subject,
+                "body": body,
+            },
+        )
+        return issue_s.create_message_body(
+            template="reply.j2", values={"reply": quote, "style": style, **values}
+        )
+
+    @staticmethod
+    def _recipient(recipient) -> str:
+        if not recipient:
+            return ""
+        if recipient.name and recipient.name != recipient.address:
+            return f"{recipient.name} <{recipient.address}>"
+        return recipient.address
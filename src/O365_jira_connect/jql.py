@@ -0,0 +1,99 @@
+import functools
+import re
+import typing
+
+__all__ = ("build_jql", "build_jql_chunks", "quote")
+
+MAX_KEYS = 500  # the max keys of a 'key in' clause, keeping queries short
+
+SORT_RE = re.compile(r"^[\w.]+(\s+(ASC|DESC))?$", re.IGNORECASE)
+
+Values = typing.Union[str, typing.Iterable[str]]
+
+
+def quote(value) -> str:
+    """Quote a value as a jql string, escaping quotes and backslashes."""
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{value}"'
+
+
+def build_jql(
+    assignee: str = None,
+    filters: Values = None,
+    key: Values = None,
+    labels: Values = None,
+    status: str = None,
+    summary: str = None,
+    watcher: str = None,
+    sort: str = None,
+    **_,
+) -> str:
+    """Build a jql query out of searching criteria, ANDed together.
+
+    :param assignee: the assignee key (e.g. email)
+    :param filters: the filter ids to apply
+    :param key: the Jira ticket keys
+    :param labels: base labels to search for
+    :param status: the status key
+    :param summary: the text search
+    :param watcher: the watcher key (e.g. email)
+    :param sort: sorting criteria (e.g. 'created DESC')
+    """
+    return _compile(
+        assignee=assignee,
+        filters=_values(filters),
+        keys=_values(key),
+        labels=_values(labels),
+        status=status,
+        summary=summary,
+        watcher=watcher,
+        sort=sort,
+    )
+
+
+def build_jql_chunks(key: Values = None, max_keys: int = MAX_KEYS, **criteria):
+    """Build jql queries out of searching criteria, splitting the keys
+    across several queries of up to ``max_keys`` keys each.
+
+    :return: the queries, in the order of the keys
+    """
+    keys = _values(key)
+    if len(keys) <= max_keys:
+        return [build_jql(key=keys, **criteria)]
+    return [
+        build_jql(key=keys[i : i + max_keys], **criteria)
+        for i in range(0, len(keys), max_keys)
+    ]
+
+
+def _values(value: Values) -> tuple:
+    if not value:
+        return ()
+    if isinstance(value, str):
+        return (value,)
+    return tuple(value)
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(assignee, filters, keys, labels, status, summary, watcher, sort) -> str:
+    clauses = []
+    if assignee:
+        clauses.append(f"assignee = {quote(assignee)}")
+    if filters:
+        clauses.append(f"filter in ({', '.join(map(quote, filters))})")
+    if keys:
+        clauses.append(f"key in ({', '.join(map(quote, keys))})")
+    if labels:
+        clauses.append(f"labels in ({', '.join(map(quote, labels))})")
+    if status:
+        clauses.append(f"status = {quote(status)}")
+    if summary:
+        clauses.append(f"summary ~ {quote(summary)}")
+    if watcher:
+        clauses.append(f"watcher = {quote(watcher)}")
+    jql = " AND ".join(clauses)
+    if sort:
+        if not SORT_RE.match(sort):
+            raise ValueError(f"Invalid sort criteria '{sort}'.")
+        jql = f"{jql} ORDER BY {sort}".lstrip()
+    return jql
@@ -0,0 +1,62 @@
+import bisect
+import contextlib
+import threading
+import time
+
+__all__ = ("Counter", "Histogram")
+
+# latency buckets, in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Counter:
+    """A thread-safe monotonic counter."""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """A thread-safe histogram of observations over fixed buckets.
+
+    Each bucket counts the observations less than or equal to its upper bound;
+    the last bucket holds everything above the greatest bound.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    @contextlib.contextmanager
+    def time(self):
+        """Observe the duration of the wrapped block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            bounds = [*self.buckets, float("inf")]
+            return {
+                "count": self.count,
+                "sum": self.sum,
+                "avg": self.sum / self.count if self.count else 0.0,
+                "buckets": dict(zip(bounds, self.counts)),
+            }
@@ -0,0 +1,83 @@
+import datetime
+import logging
+
+from O365_jira_connect.models import Issue, IssueMessage
+from O365_jira_connect.session import with_session
+
+__all__ = ("migrate", "pending")
+
+logger = logging.getLogger(__name__)
+
+# the max values of an 'in' clause, below the bound parameters limit of SQLite
+MAX_PARAMS = 500
+
+
+def migrate(batch_size: int = 500):
+    """Migrate existing data onto the current schema. Every step is idempotent,
+    so running it more than once is harmless."""
+    migrated = migrate_messages_history(batch_size=batch_size)
+    logger.info(f"Migrated history of {migrated} issues onto 'issue_messages'.")
+
+
+@with_session
+def pending(session=None) -> bool:
+    """Whether any existing data is yet to be migrated."""
+    query = session.query(Issue.id).filter(Issue.outlook_messages_id.isnot(None))
+    return session.query(query.exists()).scalar()
+
+
+def migrate_messages_history(batch_size: int = 500) -> int:
+    """Move the comma-joined 'issues.outlook_messages_id' column into the
+    'issue_messages' table, one row per message.
+
+    Messages keep their original order, although their exact received time
+    is unknown. Migrated issues have the old column reset.
+    """
+    total, last_id = 0, 0
+    while True:
+        count, last_id = _migrate_messages_batch(last_id=last_id, limit=batch_size)
+        if not count:
+            return total
+        total += count
+
+
+@with_session
+def _migrate_messages_batch(last_id, limit, session=None):
+    issues = (
+        session.query(Issue)
+        .filter(Issue.id > last_id, Issue.outlook_messages_id.isnot(None))
+        .order_by(Issue.id)
+        .limit(limit)
+        .all()
+    )
+    if not issues:
+        return 0, last_id
+
+    history = {
+        issue.id: [i for i in issue.outlook_messages_id.split(",") if i]
+        for issue in issues
+    }
+    message_ids = [i for ids in history.values() for i in ids]
+    known = set()
+    for n in range(0, len(message_ids), MAX_PARAMS):
+        query = session.query(IssueMessage.outlook_message_id).filter(
+            IssueMessage.outlook_message_id.in_(message_ids[n : n + MAX_PARAMS])
+        )
+        known.update(row.outlook_message_id for row in query)
+    for issue in issues:
+        for n, message_id in enumerate(history[issue.id]):
+            if message_id in known:
+                continue
+            known.add(message_id)
+            received_at = issue.created_at or datetime.datetime.utcnow()
+            session.add(
+                IssueMessage(
+                    issue_id=issue.id,
+                    outlook_message_id=message_id,
+                    received_at=received_at + datetime.timedelta(microseconds=n),
+                )
+            )
+        issue.outlook_messages_id = None
+    session.flush()
+
+    return len(issues), issues[-1].id
@@ -1,7 +1,19 @@
 import datetime
 
 import jira.resources
-from sqlalchemy import ARRAY, Column, DateTime, Float, Integer, String
+from sqlalchemy import (
+    ARRAY,
+    JSON,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    UniqueConstraint,
+)
+from sqlalchemy.orm import relationship
 
 from O365_jira_connect.session import Base
 
@@ -22,6 +34,19 @@ class AccessToken(Base):
         return f"<AccessToken '{self.id}'>"
 
 
+class Lock(Base):
+    """A lock shared by every process using the database."""
+
+    __tablename__ = "locks"
+
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(Float, nullable=False)
+
+    def __str__(self):
+        return f"<Lock '{self.name}'>"
+
+
 class Issue(Base):
     __tablename__ = "issues"
 
@@ -29,11 +54,116 @@ class Issue(Base):
     key = Column(String, unique=True, nullable=False, index=True)
     outlook_message_id = Column(String, unique=True)
     outlook_conversation_id = Column(String, unique=True)
-    outlook_messages_id = Column(String)
+    outlook_messages_id = Column(String)  # deprecated: see 'issue_messages'
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow)
     reporter = Column(String, nullable=False)
+    messages = relationship(
+        "IssueMessage",
+        back_populates="issue",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        order_by="IssueMessage.received_at",
+    )
+    attachments = relationship(
+        "IssueAttachment",
+        back_populates="issue",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
     jira_issue: jira.resources.Issue = None  # a reference to Jira issue
 
     def __str__(self):
         return f"<Issue '{self.key}'>"
+
+
+class IssueMessage(Base):
+    """An outlook message that is part of the issue history."""
+
+    __tablename__ = "issue_messages"
+    __table_args__ = (
+        Index("ix_issue_messages_issue_id_received_at", "issue_id", "received_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    issue_id = Column(
+        Integer, ForeignKey("issues.id", ondelete="CASCADE"), nullable=False
+    )
+    outlook_message_id = Column(String, unique=True, nullable=False, index=True)
+    received_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+    issue = relationship("Issue", back_populates="messages")
+
+    def __str__(self):
+        return f"<IssueMessage '{self.outlook_message_id}'>"
+
+
+class IssueAttachment(Base):
+    """The content hash of a file attached to an issue in Jira."""
+
+    __tablename__ = "issue_attachments"
+    __table_args__ = (UniqueConstraint("issue_id", "sha256"),)
+
+    id = Column(Integer, primary_key=True)
+    issue_id = Column(
+        Integer, ForeignKey("issues.id", ondelete="CASCADE"), nullable=False
+    )
+    sha256 = Column(String(64), nullable=False)
+    jira_id = Column(String, nullable=True)  # the id of the Jira attachment
+    filename = Column(String, nullable=True)
+    size = Column(Integer, nullable=True)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    issue = relationship("Issue", back_populates="attachments")
+
+    @classmethod
+    def from_jira(cls, attachment: jira.resources.Attachment, **kwargs):
+        """Create an entry out of a Jira attachment whose hash is known."""
+        return cls(
+            sha256=attachment.sha256,
+            jira_id=attachment.id,
+            filename=getattr(attachment, "filename", None),
+            size=getattr(attachment, "size", None),
+            **kwargs,
+        )
+
+    def __str__(self):
+        return f"<IssueAttachment '{self.sha256}'>"
+
+
+class JiraUser(Base):
+    __tablename__ = "jira_users"
+
+    email = Column(String, primary_key=True)
+    account_id = Column(String, nullable=True, index=True)
+    raw = Column(JSON, nullable=True)  # the Jira user data; null if not a Jira user
+    resolved_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    def __str__(self):
+        return f"<JiraUser '{self.email}'>"
+
+
+class SenderRule(Base):
+    """A rule of a sender list, such as the blacklist or the whitelist."""
+
+    __tablename__ = "sender_rules"
+    __table_args__ = (UniqueConstraint("list_name", "pattern"),)
+
+    id = Column(Integer, primary_key=True)
+    list_name = Column(String, nullable=False, index=True)
+    pattern = Column(String, nullable=False)
+
+    def __str__(self):
+        return f"<SenderRule '{self.list_name}: {self.pattern}'>"
+
+
+class Checkpoint(Base):
+    """The progress of a job that walks through a table, so that it may
+    resume where it stopped."""
+
+    __tablename__ = "checkpoints"
+
+    name = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=False)
+    updated_at = Column(DateTime, default=datetime.datetime.utcnow, nullable=False)
+
+    def __str__(self):
+        return f"<Checkpoint '{self.name}: {self.last_id}'>"
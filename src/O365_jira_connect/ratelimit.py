@@ -0,0 +1,235 @@
+import email.utils
+import logging
+import random
+import threading
+import time
+
+import requests
+import urllib3.util
+
+from O365_jira_connect.adapters import PooledAdapter
+from O365_jira_connect.metrics import Counter, Histogram
+
+__all__ = ("AdaptiveLimiter", "RateLimitedAdapter", "TokenBucket")
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE"))
+
+
+class TokenBucket:
+    """A thread-safe token bucket: ``rate`` requests per second on average,
+    with bursts of up to ``burst`` requests."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take a token, waiting for one if needed.
+
+        :return: the seconds waited
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                delay = max(self._paused_until - now, 0.0)
+                if not delay and self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = delay or (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def pause(self, seconds: float):
+        """Hold every acquisition for the given seconds, e.g. upon a 429."""
+        with self._lock:
+            until = time.monotonic() + seconds
+            self._paused_until = max(self._paused_until, until)
+            self.tokens = 0.0
+
+    def configure(self, rate: float = None, burst: int = None):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate or self.rate
+            self.burst = burst or self.burst
+            self.tokens = min(self.tokens, self.burst)
+
+    def _refill(self, now):
+        elapsed = now - self._updated_at
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+        self._updated_at = now
+
+
+class AdaptiveLimiter:
+    """Bound the requests in flight, adapting the bound AIMD style.
+
+    The limit grows by one every ``limit`` successful requests (additive
+    increase) and is cut by ``decrease`` upon throttling (multiplicative
+    decrease).
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, decrease: float = 0.5):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.decrease = decrease
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> float:
+        """Wait for a free slot.
+
+        :return: the seconds waited
+        """
+        start = time.monotonic()
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        return time.monotonic() - start
+
+    def release(self, throttled: bool = False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+
+class RateLimitedAdapter(PooledAdapter):
+    """An HTTP adapter that paces requests through a token bucket and an
+    adaptive concurrency limit.
+
+    A 429 response pauses the bucket for the time given by ``Retry-After``
+    (or exponential backoff with jitter when absent) and cuts the concurrency
+    limit. Idempotent requests are then retried; others are left to the
+    caller. The ``X-RateLimit-*`` headers, when present, tune the bucket to
+    the server's own limits.
+
+    The adapter is meant to be the only retry layer: sessions that retry on
+    their own, such as Jira's, should be told not to.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10,
+        burst: int = 20,
+        max_concurrency: int = 10,
+        max_retries_on_429: int = 5,
+        connect_retries: int = 3,
+        backoff: float = 1,
+        max_backoff: float = 60,
+        **kwargs,
+    ):
+        """
+        :param rate: the average requests per second
+        :param burst: the max requests sent at once after being idle
+        :param max_concurrency: the max requests in flight
+        :param max_retries_on_429: the max retries of a rate limited request
+        :param connect_retries: the max retries of a request that could not
+                                connect, whatever its method, as it was not
+                                sent
+        :param backoff: the base seconds of the exponential backoff
+        :param max_backoff: the max seconds of the exponential backoff
+        :param kwargs: the arguments of the pooled adapter
+        """
+        kwargs.setdefault(
+            "max_retries",
+            urllib3.util.Retry(
+                total=connect_retries,
+                connect=connect_retries,
+                read=0,
+                status=0,
+                backoff_factor=backoff / 2,
+            ),
+        )
+        super().__init__(**kwargs)
+        self.bucket = TokenBucket(rate=rate, burst=burst)
+        self.limiter = AdaptiveLimiter(max_limit=max_concurrency)
+        self.max_retries_on_429 = max_retries_on_429
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.throttled = Histogram()
+        self.rate_limited = Counter()
+        self.retries = Counter()
+
+    def send(self, request: requests.PreparedRequest, **kwargs):
+        attempt = 0
+        while True:
+            self.throttled.observe(self.bucket.acquire() + self.limiter.acquire())
+            response = None
+            try:
+                response = super().send(request, **kwargs)
+            finally:
+                is_429 = getattr(response, "status_code", None) == 429
+                self.limiter.release(throttled=is_429)
+
+            self._configure(response.headers)
+            if not is_429:
+                return response
+
+            self.rate_limited.inc()
+            delay = self._retry_after(response.headers)
+            if delay is None:
+                delay = min(self.max_backoff, self.backoff * 2**attempt)
+                delay *= random.uniform(0.5, 1)
+            self.bucket.pause(delay)
+
+            attempt += 1
+            if request.method not in IDEMPOTENT_METHODS:
+                return response
+            if attempt > self.max_retries_on_429:
+                return response
+            logger.warning(
+                f"Rate limited on {request.method} {request.url}, "
+                f"retrying [{attempt}/{self.max_retries_on_429}] in {delay:.1f}s."
+            )
+            self.retries.inc()
+            response.close()
+
+    def _configure(self, headers):
+        """Follow the limits the server tells about."""
+        try:
+            fill_rate = float(headers["X-RateLimit-FillRate"])
+            interval = float(headers.get("X-RateLimit-Interval-Seconds", 1))
+            burst = int(headers.get("X-RateLimit-Limit", 0))
+        except (KeyError, ValueError):
+            return
+        if fill_rate > 0 and interval > 0:
+            self.bucket.configure(rate=fill_rate / interval, burst=burst or None)
+
+    @staticmethod
+    def _retry_after(headers):
+        value = headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(date.timestamp() - time.time(), 0.0)
+
+    def snapshot(self) -> dict:
+        return {
+            **super().snapshot(),
+            "rate": self.bucket.rate,
+            "burst": self.bucket.burst,
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+            "rate_limited": self.rate_limited.value,
+            "retries": self.retries.value,
+            "throttled": self.throttled.snapshot(),
+        }
@@ -0,0 +1,105 @@
+import logging
+import threading
+import time
+
+import O365.connection
+
+from O365_jira_connect.metrics import Counter, Histogram
+
+__all__ = ("TokenRefresher",)
+
+logger = logging.getLogger(__name__)
+
+# refresh durations, in seconds
+REFRESH_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class TokenRefresher:
+    """Refresh the OAuth token in the background, ahead of its expiry.
+
+    Requests then never wait on a refresh themselves. The refresh goes
+    through the token backend, so that among the processes sharing the token
+    only one refreshes it and the others pick up the new one. Threads of the
+    same process share the connection and so the refreshed token.
+    """
+
+    def __init__(
+        self,
+        connection: O365.connection.Connection,
+        margin: int = 300,
+        retry_interval: int = 30,
+    ):
+        """
+        :param connection: the connection whose token to refresh
+        :param margin: seconds before the token expiry to refresh it
+        :param retry_interval: seconds to wait before retrying a failed refresh
+        """
+        self.connection = connection
+        self.backend = connection.token_backend
+        self.margin = margin
+        self.retry_interval = retry_interval
+        self.refreshes = Counter()
+        self.failures = Counter()
+        self.latency = Histogram(buckets=REFRESH_BUCKETS)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self.run, name="token-refresher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+        logger.info(f"Token refresher stopped: {self.snapshot()}")
+
+    def run(self):
+        delay = self.next_refresh_in()
+        while not self._stop.wait(delay):
+            delay = self.next_refresh_in() if self.refresh() else self.retry_interval
+
+    def next_refresh_in(self) -> float:
+        """Seconds until the token is to be refreshed."""
+        token = self.backend.token or self.backend.load_token()
+        if not token or "expires_at" not in token:
+            return self.retry_interval
+        return max(0.0, token["expires_at"] - self.margin - time.time())
+
+    def refresh(self) -> bool:
+        """Refresh the token, unless another process just did.
+
+        :return: whether the token is fresh again
+        """
+        start = time.perf_counter()
+        try:
+            should_refresh = self.backend.should_refresh_token(self.connection)
+            if should_refresh is True:
+                refreshed = self.connection.refresh_token() is not False
+            else:
+                # another process refreshed it; share it with the connection
+                if self.connection.session is not None:
+                    self.connection.session.token = self.backend.token
+                refreshed = True
+        except Exception as ex:
+            logger.error(f"Token refresh failed: {ex}")
+            refreshed = False
+        finally:
+            self.latency.observe(time.perf_counter() - start)
+
+        if refreshed:
+            self.refreshes.inc()
+            logger.info("Token refreshed.")
+        else:
+            self.failures.inc()
+        return refreshed
+
+    def snapshot(self) -> dict:
+        return {
+            "refreshes": self.refreshes.value,
+            "failures": self.failures.value,
+            "latency": self.latency.snapshot(),
+        }
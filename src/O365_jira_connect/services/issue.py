@@ -1,18 +1,46 @@
+import concurrent.futures
 import datetime
+import heapq
+import itertools
 import logging
+import time
 import typing
 
+import jira
 import O365
 
+from O365_jira_connect.concurrency import FanOut
 from O365_jira_connect.env import env
-from O365_jira_connect.models import Issue
-from O365_jira_connect.session import with_session
+from O365_jira_connect.models import (
+    Checkpoint,
+    Issue,
+    IssueAttachment,
+    IssueMessage,
+)
+from O365_jira_connect.session import unit_of_work, with_session
 from O365_jira_connect.templates.adf import TemplateBuilder
 
 __all__ = ("IssueSvc",)
 
 logger = logging.getLogger(__name__)
 
+# the filters Jira searches on
+NATIVE_FILTERS = (
+    "assignee",
+    "filters",
+    "labels",
+    "key",
+    "q",
+    "sort",
+    "status",
+    "watcher",
+)
+
+RECONCILE_CHECKPOINT = "reconcile-issues"
+
+# the local keys a search is narrowed down to, loaded at once
+KEYS_BATCH_SIZE = 1000
+
 
 class IssueSvc:
     def __init__(self, jira=None, configs=None):
@@ -22,15 +50,31 @@ class IssueSvc:
             "issue_type": env.str("JIRA_ISSUE_TYPE", None),
             "default_labels": env.list("JIRA_DEFAULT_LABELS", [], delimiter=" "),
         }
+        self.side_effects_workers = env.int("ISSUE_SIDE_EFFECTS_WORKERS", 4)
 
-    @with_session
-    def create(self, session=None, attachments: list = None, **kwargs) -> Issue:
+    def create(
+        self,
+        attachments: list = None,
+        notify: typing.Callable[[str], typing.Any] = None,
+        **kwargs,
+    ) -> Issue:
         """Create a new issue by calling Jira API to create a new
         issue. A new local reference to the issue is also created.
 
-        :param session: injected ORM session
+        Once the issue exists in Jira, the watchers, the attachments and the
+        notification are taken care of concurrently, while the local
+        reference is stored. Those that fail are logged and do not prevent
+        the others.
+
+        Nothing is written to the database while Jira is called: the emails
+        are resolved, and their lookups stored, beforehand, and the local
+        reference is committed on its own once the issue exists in Jira, as
+        are the attachments once added. Hence this is not to be called within
+        a unit of work.
+
         :param attachments: the files to attach to the issue which
                             are stored in Jira
+        :param notify: called with the issue key to notify about the issue
         :param kwargs: properties of the issue
             title: title of the issue
             body: body of the issue in format ADF
@@ -38,12 +82,13 @@ class IssueSvc:
             labels: which labels assign to issue
             priority: severity of the issue
             watchers: user emails to watch for issue changes
+            received_at: when the message that originated the issue was received
         """
         # translate emails into jira.User objects, if possible
         reporter_kw = kwargs["reporter"]
         watchers_kw = kwargs.get("watchers", [])
-        reporter = self.jira.resolve_email(email=reporter_kw) or reporter_kw
-        watchers = [self.jira.resolve_email(email=email) for email in watchers_kw]
+        reporter, *watchers = self.jira.resolve_emails([reporter_kw, *watchers_kw])
+        reporter = reporter or reporter_kw
 
         body = TemplateBuilder.jira_issue_body_template(
             author=reporter, cc=watchers, body=kwargs["body"]
@@ -69,29 +114,57 @@ class IssueSvc:
             **{"priority": priority} if priority else {},
         )
 
-        # add watchers
-        self.jira.add_watchers(issue=issue, watchers=watchers)
-
-        # adding attachments
-        for attachment in attachments or []:
-            self.jira.add_attachment(issue=issue, attachment=attachment)
-
-        # add new entry to the db
+        # add watchers and attachments, and notify, all at once
+        fanout = FanOut(
+            max_workers=self.side_effects_workers, thread_name_prefix="issue"
+        )
+        users = [w for w in watchers if isinstance(w, jira.User)]
+        if users and self.jira.can_manage_watchers(issue):
+            for user in users:
+                name = f"watcher '{user.displayName}'"
+                fanout.submit(name, self.jira.add_user_watcher, issue, user)
+        if attachments:
+            fanout.submit("attachments", self.jira.add_attachments, issue, attachments)
+        if notify:
+            fanout.submit("notification", notify, issue.key)
+
+        # add new entry to the db meanwhile
         local_fields = {k: v for k, v in kwargs.items() if k in Issue.__dict__}
         issue = Issue(key=issue.key, **local_fields)
+        if issue.outlook_message_id:
+            issue.messages.append(
+                IssueMessage(
+                    outlook_message_id=issue.outlook_message_id,
+                    received_at=self._utc(kwargs.get("received_at")),
+                )
+            )
 
-        session.add(issue)
-        session.commit()
+        # commit right away, as the issue exists in Jira already
+        try:
+            with unit_of_work() as session:
+                session.add(issue)
+        finally:
+            results, errors = fanout.join()
+
+        added = results.get("attachments") or []
+        if added:
+            self.index_attachments(issue_id=issue.id, attachments=added)
+        for name, ex in errors.items():
+            logger.error(f"Failed on {name} of issue '{issue.key}'.", exc_info=ex)
 
         logger.info(f"Created issue '{issue.key}'.")
 
-        return self.find_one(key=issue.key)
+        return issue
 
     @staticmethod
     @with_session
     def get(ticket_id, session=None) -> typing.Optional[Issue]:
         return session.query(Issue).get(ticket_id)
 
+    def exists(self, key: str) -> bool:
+        """Check whether an issue still exists in Jira."""
+        return self.jira.exists_issue(key)
+
     def find_one(self, **filters) -> typing.Optional[Issue]:
         """Search for a single ticket based on several criteria."""
         return next(iter(self.find_by(limit=1, **filters)), None)
@@ -115,39 +188,13 @@ class IssueSvc:
         :param _model: whether to return a ticket model or cross results Jira data
         :param filters: the query filters
         """
-        # split filters
-        native_filters = (
-            "assignee",
-            "filters",
-            "labels",
-            "key",
-            "q",
-            "sort",
-            "status",
-            "watcher",
-        )
-        local_filters = {k: v for k, v in filters.items() if k in Issue.__dict__}
-        jira_filters = {k: v for k, v in filters.items() if k in native_filters}
-
         if _model:
+            local_filters = {k: v for k, v in filters.items() if k in Issue.__dict__}
             return session.query(Issue).filter_by(**local_filters).all()
         else:
-            # if any of the filter is not a Jira filter, then
-            # apply local filter and pass on results to jql
-            if local_filters:
-                issues = session.query(Issue).filter_by(**local_filters).all()
-
-                # skip routine if no local entries are found
-                if not issues:
-                    return []
-                jira_filters["key"] = [issue.key for issue in issues]
-
-            # fetch tickets from Jira using jql while skipping jql
-            # validation since local db might not be synched with Jira
-            query = self.jira.create_jql_query(
-                summary=filters.pop("q", None),
-                **jira_filters,
-            )
+            queries = list(self._jql_queries(**filters))
+            if not queries:
+                return []
 
             # include additional fields
             fields = fields or []
@@ -155,40 +202,164 @@ class IssueSvc:
                 fields.append("*navigable")
             rendered = "renderedFields" if "rendered" in fields else "fields"
 
-            issues = []  # container for issues result
+            def search(query):
+                return self.jira.search_issues(
+                    jql_str=query,
+                    maxResults=limit,
+                    validate_query=False,
+                    fields=fields,
+                    expand=rendered,
+                )
+
+            # queries split over many keys are run concurrently
+            if len(queries) == 1:
+                jira_issues = search(queries[0])
+            else:
+                workers = min(self.jira.search_workers, len(queries))
+                with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix="search"
+                ) as executor:
+                    results = list(executor.map(search, queries))
+                merged = self._merge(results, sort=filters.get("sort"))
+                jira_issues = list(itertools.islice(merged, limit))
+            issues = self._hydrate(session, jira_issues)
+
+            # add watchers if requested
+            if "watchers" in fields and issues:
+                self._add_watchers_data(issues)
+            return issues
+
+    @staticmethod
+    def _merge(results: list[list], sort: str = None) -> typing.Iterator:
+        """Merge the results of searches split over many keys, in the order
+        of the searches, or as sorted by Jira if a sort is given.
 
-            jira_issues = self.jira.search_issues(
-                jql_str=query,
-                maxResults=limit,
-                validate_query=False,
-                fields=fields,
-                expand=rendered,
+        Only sorts on the issue key or on fields of plain values, such as
+        dates, can be merged: Jira sorts other fields, e.g. priority, by a
+        rank of its own.
+        """
+        if not sort:
+            return itertools.chain.from_iterable(results)
+        field, *order = sort.split()
+        field = field.lower()
+
+        def key(issue):
+            if field == "key":
+                project, _, number = issue.key.rpartition("-")
+                return False, (project, int(number))
+            value = issue.raw["fields"].get(field)
+            if value is not None and not isinstance(value, (str, int, float)):
+                raise ValueError(f"Cannot merge searches sorted by '{field}'.")
+            return value is None, value  # empty values rank last, as in Jira
+
+        descending = [o.upper() for o in order] == ["DESC"]
+        return heapq.merge(*results, key=key, reverse=descending)
+
+    def iter_issues(
+        self, fields: list = None, page_size: int = 100, **filters
+    ) -> typing.Iterator[Issue]:
+        """Walk through the tickets matching several criteria, lazily.
+
+        Unlike ``find_by``, the number of results is not limited: Jira is
+        searched page by page, as the tickets are consumed, and the local
+        entries of a page are loaded at once. Only one page is held at a time,
+        along with one batch of the local keys the search is narrowed down to.
+
+        :param fields: the Jira fields to fetch; all navigable ones by default
+        :param page_size: the number of tickets fetched at once
+        :param filters: the query filters, as for ``find_by``
+        """
+        for query in self._jql_queries(**filters):
+            pages = self.jira.iter_search_pages(
+                jql=query, fields=fields or ["*navigable"], page_size=page_size
             )
+            for page in pages:
+                with unit_of_work() as session:
+                    issues = self._hydrate(session, page)
+                yield from issues
 
-            for jira_issue in jira_issues:
-                issue = self.jira.find_one(key=jira_issue.key, _model=True)
+    def _jql_queries(self, **filters) -> typing.Iterator[str]:
+        """Build the jql queries out of the filters, lazily.
 
-                # prevent cases where local db is not synched with Jira
-                # for cases where Jira tickets are not yet locally present
-                if issue:
-                    issue.jira_issue = jira_issue
+        Filters on local fields are applied first, narrowing the queries down
+        to the keys of the matching tickets. The keys are loaded in batches,
+        as the queries are consumed, each split across several queries if
+        there are many.
 
-                    # add watchers if requested
-                    if "watchers" in fields:
-                        watchers = self.jira.watchers(jira_issue.key)
-                        issue.jira_issue.raw["watchers"] = watchers.raw["watchers"]
+        :return: the queries, none if no local entry matches
+        """
+        local_filters = {k: v for k, v in filters.items() if k in Issue.__dict__}
+        jira_filters = {k: v for k, v in filters.items() if k in NATIVE_FILTERS}
+        summary = filters.get("q")
+
+        # skipping jql validation since local db might not be synched with Jira
+        if not local_filters:
+            yield from self.jira.create_jql_queries(summary=summary, **jira_filters)
+            return
+
+        # if any of the filter is not a Jira filter, then
+        # apply local filter and pass on results to jql
+        last_id = 0
+        while True:
+            rows = self._find_keys_after(
+                last_id=last_id, limit=KEYS_BATCH_SIZE, **local_filters
+            )
+            if not rows:
+                return
+            jira_filters["key"] = [row.key for row in rows]
+            yield from self.jira.create_jql_queries(summary=summary, **jira_filters)
+            last_id = rows[-1].id
 
-                    issues.append(issue)
-            return issues
+    @staticmethod
+    @with_session
+    def _find_keys_after(last_id, limit, session=None, **filters) -> list:
+        return (
+            session.query(Issue.id, Issue.key)
+            .filter_by(**filters)
+            .filter(Issue.id > last_id)
+            .order_by(Issue.id)
+            .limit(limit)
+            .all()
+        )
+
+    @staticmethod
+    def _hydrate(session, jira_issues: list) -> list[Issue]:
+        """Pair Jira tickets with their local entries, loaded at once.
+
+        Tickets not yet locally present, e.g. if the local db is not synched
+        with Jira, are left out.
+        """
+        keys = [jira_issue.key for jira_issue in jira_issues]
+        if not keys:
+            return []
+        query = session.query(Issue).filter(Issue.key.in_(keys))
+        models = {model.key: model for model in query}
+        issues = []
+        for jira_issue in jira_issues:
+            issue = models.get(jira_issue.key)
+            if issue:
+                issue.jira_issue = jira_issue
+                issues.append(issue)
+        return issues
+
+    def _add_watchers_data(self, issues: list[Issue]):
+        """Fetch the watchers of several tickets concurrently."""
+        workers = min(self.jira.watchers_workers, len(issues))
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="watchers"
+        ) as executor:
+            watchers = executor.map(self.jira.watchers, (i.key for i in issues))
+            for issue, data in zip(issues, watchers):
+                issue.jira_issue.raw["watchers"] = data.raw["watchers"]
 
     @classmethod
     @with_session
     def update(cls, issue_id, session=None, **kwargs):
-        issue = cls.get(issue_id=issue_id)
+        issue = cls.get(ticket_id=issue_id)
         for key, value in kwargs.items():
             if hasattr(issue, key):
                 setattr(issue, key, value)
-        session.commit()
+        session.flush()
 
         msg = f"Updated issue '{issue.key}' with the attributes: '{kwargs}'."
         logger.info(msg)
@@ -196,23 +367,66 @@ class IssueSvc:
     @classmethod
     @with_session
     def delete(cls, issue_id, session=None):
-        issue = cls.get(issue_id=issue_id)
+        issue = cls.get(ticket_id=issue_id)
         if issue:
+            # not every backend enforces the cascade, e.g. SQLite by default
+            for model in (IssueMessage, IssueAttachment):
+                session.query(model).filter_by(issue_id=issue.id).delete()
             session.delete(issue)
-            session.commit()
+            session.flush()
 
             logger.info(f"Deleted issue '{issue.key}'.")
 
     @classmethod
-    def add_message_to_history(cls, message: O365.Message, model: Issue):
+    @with_session
+    def add_message_to_history(cls, message: O365.Message, model: Issue, session=None):
         """Add a message to the issue history."""
-        messages_id = model.outlook_messages_id.split(",")
-        if message.object_id not in messages_id:
-            cls.update(
-                issue_id=model.id,
-                outlook_messages_id=",".join(messages_id + [message.object_id]),
-                updated_at=datetime.datetime.utcnow(),
+        if not cls.has_message(message_id=message.object_id):
+            received_at = message.received or message.created
+            session.add(
+                IssueMessage(
+                    issue_id=model.id,
+                    outlook_message_id=message.object_id,
+                    received_at=cls._utc(received_at),
+                )
             )
+            session.query(Issue).filter_by(id=model.id).update(
+                {"updated_at": datetime.datetime.utcnow()}
+            )
+            session.flush()
+
+    @staticmethod
+    @with_session
+    def has_message(message_id, session=None) -> bool:
+        """Whether a message is already part of any issue history."""
+        query = session.query(IssueMessage.id).filter_by(outlook_message_id=message_id)
+        return session.query(query.exists()).scalar()
+
+    @staticmethod
+    @with_session
+    def last_message_id(issue_id, session=None) -> typing.Optional[str]:
+        """The id of the most recent message in the issue history."""
+        return (
+            session.query(IssueMessage.outlook_message_id)
+            .filter_by(issue_id=issue_id)
+            .order_by(IssueMessage.received_at.desc(), IssueMessage.id.desc())
+            .limit(1)
+            .scalar()
+        )
+
+    @staticmethod
+    def _utc(value: datetime.datetime = None) -> datetime.datetime:
+        """Convert a datetime into a naive UTC datetime, as stored in the db."""
+        if value is None:
+            return datetime.datetime.utcnow()
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return value
+
+    @staticmethod
+    def create_message_body(template, values: dict = None) -> str:
+        """Render the body of an email out of a template."""
+        return TemplateBuilder().render(template, **(values or {}))
 
     def create_comment(
         self,
@@ -232,16 +446,256 @@ class IssueSvc:
                             are stored in Jira
         """
         # translate watchers into jira.User objects iff exists
-        watchers = [self.jira.resolve_email(email=email) for email in watchers or []]
+        watchers = self.jira.resolve_emails(watchers or [])
 
         builder = TemplateBuilder()
         body = builder.jira_issue_body_template(author=author, cc=watchers, body=body)
 
-        self.jira.add_comment(issue=issue, body=body, is_internal=True)
+        key = getattr(issue, "key", issue)
+        self.jira.add_comment(issue=key, body=body, is_internal=True)
 
         # add watchers
-        self.jira.add_watchers(issue=issue, watchers=watchers)
+        self.jira.add_watchers(issue=key, watchers=watchers)
 
-        # adding attachments
-        for attachment in attachments or []:
-            self.jira.add_attachment(issue=issue, attachment=attachment)
+        # adding attachments, except those whose content the issue already has
+        model = (
+            issue if isinstance(issue, Issue) else self.find_one(key=issue, _model=True)
+        )
+        if model:
+            exclude = self.attachment_hashes(issue_id=model.id)
+            added = self.jira.add_attachments(key, attachments, exclude=exclude)
+            self.index_attachments(issue_id=model.id, attachments=added)
+        else:
+            self.jira.add_attachments(issue=key, attachments=attachments)
+
+    @staticmethod
+    @with_session
+    def attachment_hashes(issue_id, session=None) -> set[str]:
+        """The sha256 of the contents already attached to an issue."""
+        query = session.query(IssueAttachment.sha256).filter_by(issue_id=issue_id)
+        return {row.sha256 for row in query}
+
+    @staticmethod
+    @with_session
+    def index_attachments(
+        issue_id, attachments: list[jira.resources.Attachment], session=None
+    ):
+        """Keep the sha256 of the contents attached to an issue."""
+        for attachment in attachments:
+            session.add(IssueAttachment.from_jira(attachment, issue_id=issue_id))
+        session.flush()
+
+    def backfill_attachments(self, batch_size: int = 100) -> int:
+        """Index the attachments that issues already have in Jira, e.g. those
+        added before the index existed. Attachments already indexed are not
+        downloaded again.
+
+        :param batch_size: the number of issues loaded at once
+        :return: the number of attachments indexed
+        """
+        total, last_id = 0, 0
+        while True:
+            issues = self._find_after(last_id=last_id, limit=batch_size)
+            if not issues:
+                return total
+            for issue in issues:
+                try:
+                    total += self.backfill_issue_attachments(issue)
+                except jira.JIRAError as ex:
+                    logger.warning(f"Could not index attachments of '{issue}': {ex}")
+            last_id = issues[-1].id
+
+    @with_session
+    def backfill_issue_attachments(self, issue: Issue, session=None) -> int:
+        """Index the attachments that an issue already has in Jira."""
+        entries = session.query(IssueAttachment).filter_by(issue_id=issue.id).all()
+        indexed = {e.jira_id for e in entries}
+        hashes = {e.sha256 for e in entries}
+
+        count = 0
+        jira_issue = self.jira.issue(id=issue.key, fields="attachment")
+        for attachment in getattr(jira_issue.fields, "attachment", None) or []:
+            if attachment.id in indexed:
+                continue
+            attachment.sha256 = self.jira.attachment_sha256(attachment)
+            if attachment.sha256 not in hashes:
+                hashes.add(attachment.sha256)
+                session.add(IssueAttachment.from_jira(attachment, issue_id=issue.id))
+                count += 1
+        session.flush()
+        return count
+
+    @staticmethod
+    @with_session
+    def _find_after(last_id, limit, session=None) -> list[Issue]:
+        return (
+            session.query(Issue)
+            .filter(Issue.id > last_id)
+            .order_by(Issue.id)
+            .limit(limit)
+            .all()
+        )
+
+    def reconcile(
+        self,
+        batch_size: int = 1000,
+        chunk_size: int = 100,
+        prune: bool = False,
+        restart: bool = False,
+    ) -> dict:
+        """Find the issues no longer in Jira, walking through the local issues
+        in batches.
+
+        The keys of a batch are searched for in chunks, concurrently. The few
+        keys not found are then fetched one by one, as moved issues are found
+        under their new key; only the keys Jira answers 404 for are stale. Each
+        batch is committed along with a checkpoint,
+        so that an interrupted run resumes where it stopped.
+
+        :param batch_size: the number of issues loaded at once
+        :param chunk_size: the number of keys searched for at once
+        :param prune: whether to delete the stale issues and update the moved
+                      ones, or only report them
+        :param restart: whether to start over rather than resume
+        :return: the number of issues checked, live, moved and stale
+        """
+        stats = dict.fromkeys(("checked", "live", "moved", "stale"), 0)
+        last_id = 0 if restart else self.get_checkpoint(name=RECONCILE_CHECKPOINT)
+        started = time.monotonic()
+        while True:
+            issues = self._find_after(last_id=last_id, limit=batch_size)
+            if not issues:
+                break
+            found = self._search_keys([i.key for i in issues], chunk_size=chunk_size)
+            missing = [i for i in issues if i.key not in found]
+            resolved = self._resolve_keys([i.key for i in missing])
+            last_id = issues[-1].id
+
+            with unit_of_work() as session:
+                moved, stale = self._reconcile_batch(
+                    session, missing, resolved, prune=prune
+                )
+                self.set_checkpoint(name=RECONCILE_CHECKPOINT, last_id=last_id)
+
+            stats["checked"] += len(issues)
+            stats["live"] += len(issues) - moved - stale
+            stats["moved"] += moved
+            stats["stale"] += stale
+            rate = stats["checked"] / max(time.monotonic() - started, 1e-6)
+            logger.info(
+                f"Reconciled {stats['checked']} issues up to id {last_id} "
+                f"({rate:.0f} issues/s)."
+            )
+
+        self.set_checkpoint(name=RECONCILE_CHECKPOINT, last_id=None)
+        stats["seconds"] = round(time.monotonic() - started, 3)
+        return stats
+
+    def _search_keys(self, keys: list[str], chunk_size: int) -> set[str]:
+        """The keys found in Jira, searched for in chunks concurrently."""
+        queries = self.jira.create_jql_queries(max_keys=chunk_size, key=keys)
+
+        def search(query):
+            pages = self.jira.iter_search_pages(jql=query, fields=["key"])
+            try:
+                return [issue.key for page in pages for issue in page]
+            except jira.JIRAError as ex:
+                # e.g. a key unknown to Jira; the keys are then fetched one
+                # by one, as the keys not found are, and the live ones kept
+                if ex.status_code != 400:
+                    raise ex
+                logger.warning(f"Search of {query} failed: {ex.text}")
+                return []
+
+        workers = max(min(self.jira.search_workers, len(queries)), 1)
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="reconcile"
+        ) as executor:
+            return {key for keys in executor.map(search, queries) for key in keys}
+
+    def _resolve_keys(self, keys: list[str]) -> dict[str, str]:
+        """The current key of each issue, which differs from the given key if
+        the issue moved, e.g. to another project; keys of deleted issues are
+        left out."""
+        if not keys:
+            return {}
+
+        def resolve(key):
+            try:
+                return self.jira.issue(id=key, fields="key").key
+            except jira.JIRAError as ex:
+                if ex.status_code != 404:
+                    raise ex
+                return None
+
+        workers = min(self.jira.search_workers, len(keys))
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="reconcile"
+        ) as executor:
+            resolved = dict(zip(keys, executor.map(resolve, keys)))
+        return {old: new for old, new in resolved.items() if new}
+
+    @staticmethod
+    def _reconcile_batch(session, missing: list[Issue], resolved: dict, prune: bool):
+        """Update the moved issues and delete the stale ones of a batch.
+
+        :param missing: the issues the search did not find
+        :param resolved: the current key of the missing issues still in Jira
+        :return: the number of moved and of stale issues
+        """
+        taken = {
+            row.key
+            for row in session.query(Issue.key).filter(Issue.key.in_(resolved.values()))
+        }
+        moved, stale = 0, []
+        for issue in missing:
+            key = resolved.get(issue.key)
+            if key is None:
+                logger.warning(f"Issue '{issue.key}' no longer exists in Jira.")
+                stale.append(issue.id)
+            elif key == issue.key:
+                continue  # live, though the search missed it
+            elif key in taken:
+                logger.warning(
+                    f"Issue '{issue.key}' moved to '{key}', which is already "
+                    "tracked; left as is."
+                )
+            else:
+                logger.info(f"Issue '{issue.key}' moved to '{key}'.")
+                if prune:
+                    session.query(Issue).filter_by(id=issue.id).update({"key": key})
+                taken.add(key)
+                moved += 1
+
+        if prune and stale:
+            # not every backend enforces the cascade, e.g. SQLite by default
+            for model in (IssueMessage, IssueAttachment):
+                session.query(model).filter(model.issue_id.in_(stale)).delete(
+                    synchronize_session=False
+                )
+            session.query(Issue).filter(Issue.id.in_(stale)).delete(
+                synchronize_session=False
+            )
+        return moved, len(stale)
+
+    @staticmethod
+    @with_session
+    def get_checkpoint(name: str, session=None) -> int:
+        """The last id a job went through, or 0 if it is yet to start."""
+        checkpoint = session.query(Checkpoint).get(name)
+        return checkpoint.last_id if checkpoint else 0
+
+    @staticmethod
+    @with_session
+    def set_checkpoint(name: str, last_id: typing.Optional[int], session=None):
+        """Keep the last id a job went through; none to clear it."""
+        checkpoint = session.query(Checkpoint).get(name)
+        if last_id is None:
+            if checkpoint:
+                session.delete(checkpoint)
+        elif checkpoint:
+            checkpoint.last_id = last_id
+            checkpoint.updated_at = datetime.datetime.utcnow()
+        else:
+            session.add(Checkpoint(name=name, last_id=last_id))
+        session.flush()
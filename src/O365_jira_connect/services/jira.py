@@ -1,26 +1,70 @@
 import base64
+import concurrent.futures
+import hashlib
 import io
+import json
 import logging
 import tempfile
+import threading
 import typing
 
 import jira.resources
 import O365
 import requests
+import requests.adapters
 from jira import JIRA
 
+from O365_jira_connect import jql
+from O365_jira_connect.attachments import RemoteAttachment
+from O365_jira_connect.cache import TTLCache
 from O365_jira_connect.env import env
 from O365_jira_connect.models import Issue
+from O365_jira_connect.ratelimit import RateLimitedAdapter
+from O365_jira_connect.services.resolver import EmailResolver
 
 __all__ = ("JiraSvc",)
 
 logger = logging.getLogger(__name__)
 
 
+DEFAULT_SPOOL_SIZE = 5 * 1024 * 1024  # 5MB
+CHUNK_SIZE = 64 * 1024  # a multiple of 4, as required by base64 decoding
+
+
+class SpooledUpload(tempfile.SpooledTemporaryFile):
+    """A spooled file that tells its size without rolling over to disk.
+
+    Multipart encoding otherwise asks for the size through ``fileno``, which
+    moves the content to disk.
+    """
+
+    @property
+    def len(self) -> int:
+        position = self.tell()
+        size = self.seek(0, io.SEEK_END)
+        self.seek(position)
+        return size
+
+
+def b64decode_chunks(content: str, chunk_size: int = CHUNK_SIZE):
+    """Decode base64 content piece by piece."""
+    for i in range(0, len(content), chunk_size):
+        yield base64.b64decode(content[i : i + chunk_size])
+
+
 class ProxyJIRA(JIRA):
     """Proxy class for Jira."""
 
-    def __init__(self, **kwargs):
+    def __init__(
+        self,
+        permissions_ttl: int = 300,
+        issues_ttl: int = 600,
+        adapter: requests.adapters.HTTPAdapter = None,
+        **kwargs,
+    ):
+        if adapter is not None:
+            # the adapter owns the retries on 429, rather than the session
+            kwargs.setdefault("max_retries", 0)
         super().__init__(
             options={
                 "rest_path": "api",
@@ -30,25 +74,94 @@ class ProxyJIRA(JIRA):
             },
             **kwargs,
         )
+        self.permissions_cache = TTLCache(maxsize=256, ttl=permissions_ttl)
+        # the keys of the issues known to exist, so as not to fetch them often
+        self.issues_cache = TTLCache(maxsize=1024, ttl=issues_ttl)
+
+        # every Jira call goes through the adapter, e.g. for rate limiting
+        self.adapter = adapter
+        if adapter is not None:
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
 
     def exists_issue(self, issue_id) -> bool:
+        """Check whether an issue exists, fetching nothing but its key.
+
+        Issues known to exist are kept in cache for a while; the cache is
+        invalidated once a write on the issue finds it gone.
+
+        :param issue_id: the Jira id or key of the issue
+        """
+        issue_id = str(issue_id)
+        if self.issues_cache.get(issue_id):
+            return True
         try:
-            self.issue(id=issue_id)
+            issue = self.issue(id=issue_id, fields="key")
         except jira.exceptions.JIRAError as ex:
             if ex.status_code == requests.codes.not_found:
+                self.forget_issue(issue_id)
                 return False
-        else:
-            return True
+            raise ex
+        self.issues_cache.set(issue_id, True)
+        key = getattr(issue, "key", None)
+        if key and key != issue_id:
+            self.issues_cache.set(key, True)
+        return True
 
-    def has_permissions(self, permissions: list[str], **kwargs) -> bool:
+    def forget_issue(self, issue_id):
+        """Drop an issue from the issues known to exist."""
+        self.issues_cache.pop(str(issue_id))
+
+    def add_comment(self, issue, body, **kwargs):
         try:
-            data = self.my_permissions(permissions=",".join(permissions), **kwargs)
-        except jira.JIRAError:
-            return False
-        else:
-            return all(p in data["permissions"] for p in permissions) and all(
+            return super().add_comment(issue=issue, body=body, **kwargs)
+        except jira.JIRAError as ex:
+            self._check_not_found(ex, issue)
+            raise ex
+
+    def add_watcher(self, issue, watcher):
+        try:
+            return super().add_watcher(issue=issue, watcher=watcher)
+        except jira.JIRAError as ex:
+            self._check_not_found(ex, issue)
+            raise ex
+
+    def has_permissions(self, permissions: list[str], **kwargs) -> bool:
+        """Check whether the principal holds all the given permissions.
+
+        The answer is cached per permission set and scope (e.g. ``projectKey``
+        or ``issueKey``) since it rarely changes.
+
+        :param permissions: the permission keys
+        :param kwargs: the scope of the permissions
+        """
+        key = (frozenset(permissions), tuple(sorted(kwargs.items())))
+        allowed = self.permissions_cache.get(key)
+        if allowed is None:
+            try:
+                data = self.my_permissions(permissions=",".join(permissions), **kwargs)
+            except jira.JIRAError as ex:
+                self._check_unauthorized(ex)
+                return False
+            allowed = all(p in data["permissions"] for p in permissions) and all(
                 data["permissions"][p]["havePermission"] for p in permissions
             )
+            self.permissions_cache.set(key, allowed)
+        return allowed
+
+    def invalidate_permissions(self):
+        """Drop every cached permission."""
+        self.permissions_cache.clear()
+
+    def _check_unauthorized(self, ex: jira.JIRAError):
+        """Invalidate cached permissions upon an unauthorized response."""
+        if ex.status_code in (requests.codes.unauthorized, requests.codes.forbidden):
+            self.invalidate_permissions()
+
+    def _check_not_found(self, ex: jira.JIRAError, issue):
+        """Forget an issue upon a not found response on a write to it."""
+        if ex.status_code == requests.codes.not_found:
+            self.forget_issue(getattr(issue, "key", issue))
 
     def board_configuration(self, board_id) -> dict:
         """Get the configuration from a given board
@@ -59,57 +172,55 @@ class ProxyJIRA(JIRA):
         url = self._get_url(f"board/{board_id}/configuration", base=self.AGILE_BASE_URL)
         return self._session.get(url).json()
 
+    def iter_search_pages(
+        self,
+        jql: str,
+        fields: typing.Iterable[str] = ("*navigable",),
+        expand: str = None,
+        page_size: int = 100,
+    ) -> typing.Iterator[list[jira.resources.Issue]]:
+        """Search for issues page by page, fetching a page once the previous
+        one is consumed.
+
+        Pages are walked through with the token based pagination of the
+        ``search/jql`` endpoint, which has no limit on the number of results.
+
+        :param jql: the jql query
+        :param fields: the fields to fetch, to transfer no more than needed
+        :param expand: the expand option (e.g. 'renderedFields')
+        :param page_size: the number of issues per page
+        """
+        url = self._get_url("search/jql")
+        payload = {"jql": jql, "maxResults": page_size, "fields": list(fields)}
+        if expand:
+            payload["expand"] = expand
+        while True:
+            data = self._session.post(url, data=json.dumps(payload)).json()
+            yield [
+                jira.resources.Issue(self._options, self._session, raw=raw)
+                for raw in data.get("issues", [])
+            ]
+            token = data.get("nextPageToken")
+            if not token or data.get("isLast", False):
+                return
+            payload["nextPageToken"] = token
+
     @staticmethod
-    def create_jql_query(
-        assignee: str = None,
-        filters: list[str] = None,
-        expand: list[str] = None,
-        key: typing.Union[str, list[str]] = None,
-        labels: list[str] = None,
-        status: str = None,
-        summary: str = None,
-        watcher: str = None,
-        sort: str = None,
-        **_,
-    ):
+    def create_jql_query(**criteria) -> str:
         """Build jql query based on a provided searching parameters.
 
-        :param assignee: the assignee key (e.g. email)
-        :param expand: the expand fields (enum: ['renderedFields'])
-        :param filters: the filter ids to apply
-        :param key: the Jira ticket key
-        :param labels: base labels to search for
-        :param status: the status key
-        :param summary: the text search
-        :param watcher: the watcher key (e.g. email)
-        :param sort: sorting criteria (enum: ['created'])
+        See ``jql.build_jql`` for the parameters.
         """
-        jql = ""
-        if assignee:
-            jql = f"{jql}&assignee={assignee}"
-        if expand:
-            jql = f"{jql}&expand={','.join(expand)}"
-        if filters:
-            jql = f"{jql}&filter in ({', '.join(filters)})"
-        if key:
-            joined_keys = ", ".join(key) if isinstance(key, list) else key
-            jql = f"{jql}&key in ({joined_keys})"
-        if labels:
-            joined_labels = ", ".join(labels)
-            jql = f"{jql}&labels in ({joined_labels})"
-        if status:
-            jql = f"{jql}&status='{status}'"
-        if summary:
-            jql = f"{jql}&summary ~ '{summary}'"
-        if watcher:
-            jql = f"{jql}&watcher=" + watcher
-        if sort:
-            jql = f"{jql} ORDER BY {sort}"
-
-        # remove trailing url character
-        jql = jql.lstrip("&")
-
-        return jql
+        return jql.build_jql(**criteria)
+
+    @staticmethod
+    def create_jql_queries(max_keys: int = jql.MAX_KEYS, **criteria) -> list[str]:
+        """Build jql queries based on a provided searching parameters,
+        splitting large sets of keys across several queries.
+
+        See ``jql.build_jql`` for the parameters.
+        """
+        return jql.build_jql_chunks(max_keys=max_keys, **criteria)
 
 
 class JiraSvc(ProxyJIRA):
@@ -125,66 +236,235 @@ class JiraSvc(ProxyJIRA):
                     env.str("JIRA_PLATFORM_TOKEN"),
                 ),
             ),
+            permissions_ttl=kwargs.pop(
+                "permissions_ttl", env.int("JIRA_PERMISSIONS_CACHE_TTL", 300)
+            ),
+            issues_ttl=kwargs.pop("issues_ttl", env.int("JIRA_ISSUES_CACHE_TTL", 600)),
+            adapter=kwargs.pop(
+                "adapter",
+                RateLimitedAdapter(
+                    rate=env.float("JIRA_RATE_LIMIT", 10),
+                    burst=env.int("JIRA_RATE_BURST", 20),
+                    max_concurrency=env.int("JIRA_MAX_CONCURRENCY", 10),
+                    max_retries_on_429=env.int("JIRA_MAX_RETRIES_ON_429", 5),
+                    pool_maxsize=env.int("JIRA_POOL_MAXSIZE", 20),
+                    timeout=(
+                        env.float("JIRA_CONNECT_TIMEOUT", 10),
+                        env.float("JIRA_READ_TIMEOUT", 60),
+                    ),
+                ),
+            ),
             **kwargs,
         )
+        self.attachments_spool_size = env.int(
+            "JIRA_ATTACHMENTS_SPOOL_SIZE", DEFAULT_SPOOL_SIZE
+        )
+        self.attachments_workers = env.int("JIRA_ATTACHMENTS_WORKERS", 4)
+        self.attachments_min_inline_size = env.int(
+            "JIRA_ATTACHMENTS_MIN_INLINE_SIZE", 0
+        )
+        self.watchers_workers = env.int("JIRA_WATCHERS_WORKERS", 4)
+        self.search_workers = env.int("JIRA_SEARCH_WORKERS", 4)
+        self.watchers_cache = TTLCache(
+            maxsize=env.int("JIRA_WATCHERS_CACHE_SIZE", 1024),
+            ttl=env.int("JIRA_WATCHERS_CACHE_TTL", 3600),
+        )
+        self._watchers_lock = threading.Lock()
+        self.resolver = EmailResolver(
+            jira=self,
+            maxsize=env.int("JIRA_USERS_CACHE_SIZE", 1024),
+            ttl=env.int("JIRA_USERS_CACHE_TTL", 3600),
+            negative_ttl=env.int("JIRA_USERS_NEGATIVE_CACHE_TTL", 600),
+            store_ttl=env.int("JIRA_USERS_STORE_TTL", 7 * 24 * 3600),
+        )
 
     def add_attachment(
         self,
         issue: typing.Union[jira.Issue, str],
-        attachment: O365.message.MessageAttachment,
+        attachment: typing.Union[O365.message.MessageAttachment, RemoteAttachment],
         filename: str = None,
+        skip: typing.Callable[[str], bool] = None,
     ) -> typing.Optional[jira.resources.Attachment]:
-        """Add attachment considering different types of files."""
-        content = None
-        if isinstance(attachment, O365.message.MessageAttachment):
-            filename = filename or attachment.name
-            if not attachment.content:
-                logger.warning(f"Attachment '{filename}' is empty")
-            else:
-                content = base64.b64decode(attachment.content)
+        """Add attachment considering different types of files.
+
+        The content is streamed into a spooled file, kept in memory up to
+        ``attachments_spool_size`` bytes and on disk beyond, and uploaded
+        from there. The sha256 of the content is kept in the ``sha256``
+        attribute of the added attachment.
+
+        :param issue: the Jira issue
+        :param attachment: the attachment to add
+        :param filename: the name of the file, if not the attachment name
+        :param skip: whether to skip the upload, given the content sha256
+        """
+        if isinstance(attachment, RemoteAttachment):
+            chunks = attachment.iter_content(chunk_size=CHUNK_SIZE)
+        elif isinstance(attachment, O365.message.MessageAttachment):
+            chunks = b64decode_chunks(attachment.content or "", chunk_size=CHUNK_SIZE)
         else:
             logger.warning(f"'{type(attachment)}' is not a supported attachment type.")
+            return None
 
-        # no point on adding empty file
-        if content:
-            file = tempfile.TemporaryFile()
-            file.write(content)
+        filename = filename or attachment.name
+        digest = hashlib.sha256()
+        with SpooledUpload(max_size=self.attachments_spool_size) as file:
+            for chunk in chunks:
+                digest.update(chunk)
+                file.write(chunk)
+
+            # no point on adding empty file
+            if not file.len:
+                logger.warning(f"Attachment '{filename}' is empty")
+                return None
+            if skip and skip(digest.hexdigest()):
+                logger.info(f"Attachment '{filename}' is already attached.")
+                return None
             file.seek(0)
-            fi = io.FileIO(file.fileno())
-            return super().add_attachment(
-                issue=str(issue),
-                attachment=io.BufferedReader(fi),
-                filename=filename,
-            )
+            try:
+                added = super().add_attachment(
+                    issue=str(issue), attachment=file, filename=filename
+                )
+            except jira.JIRAError as ex:
+                self._check_not_found(ex, issue)
+                raise ex
+        added.sha256 = digest.hexdigest()
+        return added
+
+    def add_attachments(
+        self,
+        issue: typing.Union[jira.Issue, str],
+        attachments: list,
+        exclude: typing.Iterable[str] = (),
+    ) -> list[jira.resources.Attachment]:
+        """Add several attachments at once, uploading them concurrently.
+
+        Attachments with the same content as another one, or whose sha256 is
+        excluded, are added only once. Inline attachments smaller than
+        ``attachments_min_inline_size`` bytes (e.g. signature logos) are not
+        added at all.
+
+        :param issue: the Jira issue
+        :param attachments: the attachments to add
+        :param exclude: the sha256 of the contents not to add
+        :return: the added attachments
+        """
+        attachments = [a for a in attachments or [] if not self._is_negligible(a)]
+        if not attachments:
+            return []
+
+        seen, lock = set(exclude), threading.Lock()
+
+        def skip(sha256):
+            with lock:
+                if sha256 in seen:
+                    return True
+                seen.add(sha256)
+                return False
+
+        workers = min(self.attachments_workers, len(attachments))
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="attachments"
+        ) as executor:
+            futures = [
+                executor.submit(self.add_attachment, issue, a, skip=skip)
+                for a in attachments
+            ]
+        return [r for r in (f.result() for f in futures) if r is not None]
+
+    def attachment_sha256(self, attachment: jira.resources.Attachment) -> str:
+        """Compute the sha256 of the content of a Jira attachment."""
+        digest = hashlib.sha256()
+        for chunk in attachment.iter_content(chunk_size=CHUNK_SIZE):
+            digest.update(chunk)
+        return digest.hexdigest()
+
+    def _is_negligible(self, attachment) -> bool:
+        size = getattr(attachment, "size", None) or 0
+        inline = getattr(attachment, "is_inline", False)
+        return inline and size < self.attachments_min_inline_size
 
     def add_watchers(self, issue: Issue, watchers: list[jira.User] = None):
         """Add a list of watchers to a ticket.
 
+        Only the users not watching the ticket yet are added, concurrently.
+        The ticket watchers are fetched once and then kept in cache.
+
         :param issue: the Jira issue
         :param watchers:
         """
+        users = [w for w in watchers or [] if isinstance(w, jira.User)]
+        if not users:
+            return
+
         # add watchers iff has permission
-        if self.has_permissions(permissions=["MANAGE_WATCHERS"]):
-            for watcher in watchers or []:
-                if isinstance(watcher, jira.User):
-                    try:
-                        self.add_watcher(issue=issue.key, watcher=watcher.accountId)
-                    except jira.exceptions.JIRAError as e:
-                        if e.status_code not in (
-                            requests.codes.unauthorized,
-                            requests.codes.forbidden,
-                        ):
-                            raise e
-                        else:
-                            name = watcher.displayName
-                            logger.warning(
-                                f"Watcher '{name}' has no permission to watch issue "
-                                f"'{str(issue)}'."
-                            )
+        if self.can_manage_watchers(issue):
+            known = self.issue_watchers(issue)
+            new = {u.accountId: u for u in users if u.accountId not in known}
+            if not new:
+                return
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(self.watchers_workers, len(new)),
+                thread_name_prefix="watchers",
+            ) as executor:
+                futures = [
+                    executor.submit(self.add_user_watcher, issue, user)
+                    for user in new.values()
+                ]
+            for future in futures:
+                future.result()
+
+    def issue_watchers(self, issue: Issue) -> set[str]:
+        """The account ids of the users watching a ticket."""
+        key = getattr(issue, "key", issue)
+        account_ids = self.watchers_cache.get(key)
+        if account_ids is None:
+            watchers = self.watchers(key).watchers
+            account_ids = frozenset(w.accountId for w in watchers)
+            self.watchers_cache.set(key, account_ids)
+        return account_ids
+
+    def can_manage_watchers(self, issue: Issue) -> bool:
+        project = getattr(issue, "key", issue).rsplit("-", 1)[0]
+        if self.has_permissions(permissions=["MANAGE_WATCHERS"], projectKey=project):
+            return True
+        logger.warning("The principal has no permission to manage watchers.")
+        return False
+
+    def add_user_watcher(self, issue: Issue, watcher: jira.User):
+        """Add a watcher to a ticket, unless not allowed to watch it.
+
+        :param issue: the Jira issue
+        :param watcher: the watcher; anything but a Jira user is ignored
+        """
+        if not isinstance(watcher, jira.User):
+            return
+        key = getattr(issue, "key", issue)
+        try:
+            self.add_watcher(issue=key, watcher=watcher.accountId)
+        except jira.exceptions.JIRAError as e:
+            if e.status_code not in (
+                requests.codes.unauthorized,
+                requests.codes.forbidden,
+            ):
+                raise e
+            else:
+                self.invalidate_permissions()
+                name = watcher.displayName
+                logger.warning(
+                    f"Watcher '{name}' has no permission to watch issue "
+                    f"'{str(issue)}'."
+                )
         else:
-            logger.warning("The principal has no permission to manage watchers.")
+            # keep the cached watchers up to date, if any
+            with self._watchers_lock:
+                known = self.watchers_cache.get(key)
+                if known is not None:
+                    self.watchers_cache.set(key, known | {watcher.accountId})
 
     def resolve_email(self, email) -> typing.Union[jira.resources.User, str]:
         """Translation given email into Jira user."""
-        users = self.search_users(query=email, maxResults=1) if email else []
-        return next(iter(users), email)
+        return self.resolver.resolve(email)
+
+    def resolve_emails(self, emails: list[str]) -> list:
+        """Translation given emails into Jira users, in bulk."""
+        return self.resolver.resolve_many(emails)
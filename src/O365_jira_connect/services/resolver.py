@@ -0,0 +1,192 @@
+import concurrent.futures
+import datetime
+import logging
+import threading
+import typing
+
+import jira.resources
+import sqlalchemy.exc
+from sqlalchemy.dialects import postgresql, sqlite
+
+from O365_jira_connect.cache import TTLCache
+from O365_jira_connect.models import JiraUser
+from O365_jira_connect.session import with_new_session, with_session
+
+__all__ = ("EmailResolver",)
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class EmailResolver:
+    """Translate emails into Jira users.
+
+    Lookups go through an in-memory LRU cache, then through the local
+    ``jira_users`` table and only then to Jira. Emails that do not match any
+    Jira account are cached as well (negative caching), though for a shorter
+    period, since external addresses are the most common case.
+    """
+
+    def __init__(
+        self,
+        jira: "jira.JIRA",
+        maxsize: int = 1024,
+        ttl: int = 3600,
+        negative_ttl: int = 600,
+        store_ttl: int = 7 * 24 * 3600,
+        workers: int = 8,
+    ):
+        """
+        :param jira: the Jira client used to search for users
+        :param maxsize: the max number of emails kept in memory
+        :param ttl: seconds a resolved user is kept in memory
+        :param negative_ttl: seconds an unresolved email is kept in memory
+        :param store_ttl: seconds an entry in the local table is deemed valid
+        :param workers: max concurrent Jira lookups on bulk resolution
+        """
+        self.jira = jira
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.negative_ttl = negative_ttl
+        self.store_ttl = store_ttl
+        self.workers = workers
+        self.store_hits = 0
+        self.lookups = 0
+        self._lock = threading.Lock()
+
+    def resolve(self, email: str) -> typing.Union[jira.resources.User, str, None]:
+        """Resolve an email into a Jira user, if one exists.
+
+        :param email: the email to resolve
+        :return: the Jira user, the email itself when no user matches or
+                 None if no email is given
+        """
+        if not email:
+            return None
+        return self.resolve_many([email])[0]
+
+    def resolve_many(self, emails: list[str]) -> list:
+        """Resolve a list of emails at once.
+
+        Emails not yet cached are loaded from the local table in one query,
+        and those not stored either are looked up in Jira concurrently. The
+        lookups are then stored at once, from the calling thread. The result
+        keeps the order of the given list.
+        """
+        emails = list(emails or [])
+        resolved, pending = {}, {}
+        for email in filter(None, emails):
+            key = email.lower()
+            if key in resolved or key in pending:
+                continue
+            user = self.cache.get(key, _MISSING)
+            if user is _MISSING:
+                pending[key] = email
+            else:
+                resolved[key] = user
+
+        if pending:
+            loaded = self._load(list(pending))
+            searched = {k: e for k, e in pending.items() if k not in loaded}
+            if len(searched) > 1:
+                workers = min(self.workers, len(searched))
+                with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                    users = pool.map(self._search, searched.values())
+                    found = dict(zip(searched, users))
+            else:
+                found = {k: self._search(e) for k, e in searched.items()}
+            if found:
+                self._store(found)
+            for key, user in {**loaded, **found}.items():
+                self._remember(key, user)
+                resolved[key] = user
+
+        return [(resolved[e.lower()] or e) if e else None for e in emails]
+
+    def stats(self) -> dict:
+        """The cache counters. Misses that are served from the local table
+        are counted as ``store_hits``; ``lookups`` are the calls made to Jira."""
+        return {
+            **self.cache.stats(),
+            "store_hits": self.store_hits,
+            "lookups": self.lookups,
+        }
+
+    def _remember(self, key, user):
+        ttl = None if user else self.negative_ttl
+        self.cache.set(key, user, ttl=ttl)
+
+    def _search(self, email) -> typing.Optional[jira.resources.User]:
+        with self._lock:
+            self.lookups += 1
+        users = self.jira.search_users(query=email, maxResults=1)
+        return next(iter(users), None)
+
+    @with_session
+    def _load(self, emails: list[str], session=None) -> dict:
+        """The users stored for the given emails, unless outdated."""
+        query = session.query(JiraUser).filter(JiraUser.email.in_(emails))
+        oldest = datetime.datetime.utcnow() - datetime.timedelta(seconds=self.store_ttl)
+        users = {}
+        for entry in query:
+            if entry.resolved_at < oldest:
+                continue
+            users[entry.email] = (
+                jira.resources.User(
+                    options=self.jira._options,
+                    session=self.jira._session,
+                    raw=entry.raw,
+                )
+                if entry.raw is not None
+                else None
+            )
+        with self._lock:
+            self.store_hits += len(users)
+        return users
+
+    @classmethod
+    def _store(cls, users: dict):
+        """Store the lookups of several emails in one transaction of its own.
+
+        Another worker may store the same email meanwhile, so the entries are
+        upserted; the store is a cache, hence failing to write it is only
+        logged.
+        """
+        now = datetime.datetime.utcnow()
+        rows = [
+            {
+                "email": email,
+                "account_id": getattr(user, "accountId", None),
+                "raw": user.raw if user is not None else None,
+                "resolved_at": now,
+            }
+            for email, user in users.items()
+        ]
+        try:
+            cls._upsert(rows)
+        except sqlalchemy.exc.SQLAlchemyError as ex:
+            logger.warning(f"Could not store Jira user resolution: {ex}")
+            return
+
+        logger.debug(f"Stored Jira user resolution for {len(users)} emails.")
+
+    @staticmethod
+    @with_new_session
+    def _upsert(rows: list[dict], session=None):
+        dialect = {"postgresql": postgresql, "sqlite": sqlite}.get(
+            session.get_bind().dialect.name
+        )
+        if dialect:
+            statement = dialect.insert(JiraUser).values(rows)
+            session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=[JiraUser.email],
+                    set_={
+                        column: statement.excluded[column]
+                        for column in ("account_id", "raw", "resolved_at")
+                    },
+                )
+            )
+        else:
+            for row in rows:
+                session.merge(JiraUser(**row))
@@ -1,26 +1,156 @@
-from sqlalchemy import create_engine
+import contextlib
+import functools
+import threading
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import scoped_session, sessionmaker
 
-__all__ = ("Base", "Session", "init_engine", "with_session")
+__all__ = (
+    "Base",
+    "Session",
+    "init_engine",
+    "new_session",
+    "session_scope",
+    "unit_of_work",
+    "with_new_session",
+    "with_session",
+)
 
 Base = declarative_base()
-Session = sessionmaker()
 
+# one session per thread; objects stay usable once their session is closed
+Session = scoped_session(sessionmaker(expire_on_commit=False))
+
+_scope = threading.local()
+
+
+def init_engine(
+    engine_url,
+    debug=False,
+    pool_size: int = 5,
+    max_overflow: int = 10,
+    pool_pre_ping: bool = True,
+    pool_recycle: int = 3600,
+    busy_timeout: int = 5000,
+):
+    """Bind the sessions to a new engine.
+
+    :param engine_url: the database URI
+    :param debug: whether to log every statement
+    :param pool_size: the number of connections kept open
+    :param max_overflow: the number of connections opened beyond the pool size
+    :param pool_pre_ping: whether to test connections before using them
+    :param pool_recycle: seconds after which connections are replaced
+    :param busy_timeout: milliseconds SQLite waits on a locked database
+    """
+    options = {"pool_pre_ping": pool_pre_ping, "pool_recycle": pool_recycle}
+    is_sqlite = engine_url.startswith("sqlite")
+    if not is_sqlite:  # SQLite opens a connection per session instead
+        options.update(pool_size=pool_size, max_overflow=max_overflow)
+
+    engine = create_engine(url=engine_url, echo=debug, **options)
+    if is_sqlite:
+        event.listen(engine, "connect", _sqlite_pragmas(busy_timeout))
 
-def init_engine(engine_url, debug=False):
-    engine = create_engine(url=engine_url, echo=debug)
+    Session.remove()
     Session.configure(bind=engine)
     Base.metadata.create_all(bind=engine)
+    return engine
+
+
+def _sqlite_pragmas(busy_timeout):
+    def on_connect(dbapi_connection, _):
+        # WAL lets readers carry on while a writer holds the database
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout)}")
+        cursor.close()
+
+    return on_connect
+
+
+@contextlib.contextmanager
+def unit_of_work():
+    """Share one session across every database operation of the block.
+
+    The outermost block commits once it exits, or rolls back if it raises,
+    and then releases the session, unless a session scope holds it. Nested
+    blocks join the outer one.
+
+    Keep network calls out of a block that writes: SQLite holds the write
+    lock from the first flush until the block exits, and every other writer
+    waits on it meanwhile.
+    """
+    session = Session()
+    depth = getattr(_scope, "depth", 0)
+    _scope.depth = depth + 1
+    try:
+        yield session
+        if not depth:
+            session.commit()
+    except BaseException:
+        if not depth:
+            session.rollback()
+        raise
+    finally:
+        _scope.depth = depth
+        if not depth and not getattr(_scope, "held", 0):
+            Session.remove()
+
+
+@contextlib.contextmanager
+def session_scope():
+    """Keep one session for every unit of work of the block.
+
+    Unlike a unit of work, each unit of work of the block still commits on
+    its own, so that a block may call the network in between without holding
+    a write transaction. The session is released once the block exits.
+    """
+    held = getattr(_scope, "held", 0)
+    _scope.held = held + 1
+    try:
+        yield Session()
+    finally:
+        _scope.held = held
+        if not held and not getattr(_scope, "depth", 0):
+            Session.remove()
 
 
 def with_session(f):
-    """Create session for given function."""
+    """Create session for given function, joining the current unit of work
+    if there is one."""
 
+    @functools.wraps(f)
     def wrapper(*args, **kwargs):
-        session = Session()
-        session.begin()
-        f(*args, session=session, **kwargs)
+        with unit_of_work() as session:
+            return f(*args, session=session, **kwargs)
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def new_session():
+    """A session of its own, apart from the current unit of work, committed
+    once the block exits. Meant for state shared with other processes, which
+    must not wait for the unit of work to end to be visible."""
+    session = Session.session_factory()
+    try:
+        yield session
+        session.commit()
+    except BaseException:
+        session.rollback()
+        raise
+    finally:
         session.close()
 
+
+def with_new_session(f):
+    """Create a session of its own for given function."""
+
+    @functools.wraps(f)
+    def wrapper(*args, **kwargs):
+        with new_session() as session:
+            return f(*args, session=session, **kwargs)
+
     return wrapper
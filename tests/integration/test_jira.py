@@ -29,6 +29,9 @@ class TestJiraSvc:
         )
         assert jira_s.exists_issue(issue.id) is True
         issue.delete()
+        # deletions made elsewhere show up once the cached entry expires
+        assert jira_s.exists_issue(issue.id) is True
+        jira_s.forget_issue(issue.id)
         assert jira_s.exists_issue(issue.id) is False
         assert jira_s.exists_issue("000") is False
 
@@ -0,0 +1,8 @@
+import pytest
+
+from O365_jira_connect.session import init_engine
+
+
+@pytest.fixture(autouse=True)
+def engine(tmp_path):
+    init_engine(engine_url=f"sqlite:///{tmp_path / 'unittests.db'}")
@@ -0,0 +1,40 @@
+import socket
+
+import requests
+import requests.adapters
+
+from O365_jira_connect.adapters import PooledAdapter
+from O365_jira_connect.connection import PooledConnection
+
+
+class TestPooledAdapter:
+    def test_pool_wait(self):
+        adapter = PooledAdapter(pool_maxsize=2)
+        pool = adapter.poolmanager.connection_from_url("https://jira.example.com")
+        assert pool.pool.maxsize == 2
+
+        pool._put_conn(pool._get_conn())
+        assert adapter.snapshot()["pool_wait"]["count"] == 1
+
+    def test_keepalive(self):
+        adapter = PooledAdapter()
+        pool = adapter.poolmanager.connection_from_url("https://jira.example.com")
+        options = pool.conn_kw["socket_options"]
+        assert (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) in options
+
+    def test_default_timeout(self, mocker):
+        send = mocker.patch.object(requests.adapters.HTTPAdapter, "send")
+        adapter = PooledAdapter(timeout=(1, 2))
+        request = requests.Request("GET", "https://jira.example.com").prepare()
+        adapter.send(request)
+        assert send.call_args.kwargs["timeout"] == (1, 2)
+        adapter.send(request, timeout=5)
+        assert send.call_args.kwargs["timeout"] == 5
+
+
+class TestPooledConnection:
+    def test_session_adapter(self):
+        adapter = PooledAdapter()
+        connection = PooledConnection(("id", "secret"), adapter=adapter)
+        session = connection.get_session()
+        assert session.get_adapter("https://graph.microsoft.com") is adapter
@@ -0,0 +1,53 @@
+import pytest
+
+from O365_jira_connect.attachments import RemoteAttachment, list_attachments
+
+
+@pytest.fixture
+def message(mocker):
+    message = mocker.Mock(object_id="m1", subject="subject")
+    message.attachments.build_url.side_effect = lambda e: f"https://graph{e}"
+    return message
+
+
+class TestAttachments:
+    def test_list_attachments(self, message, mocker):
+        pages = [
+            {
+                "value": [{"id": "a1", "name": "report.pdf", "size": 10}],
+                "@odata.nextLink": "https://graph/next",
+            },
+            {
+                "value": [
+                    {
+                        "@odata.type": "#microsoft.graph.itemAttachment",
+                        "id": "a2",
+                        "name": "Re: hello",
+                    }
+                ]
+            },
+        ]
+        message.con.get.side_effect = [
+            mocker.Mock(json=mocker.Mock(return_value=page)) for page in pages
+        ]
+
+        attachments = list_attachments(message)
+        assert [a.name for a in attachments] == ["report.pdf", "Re: hello.eml"]
+        assert attachments[0].size == 10
+
+        first, second = message.con.get.call_args_list
+        assert first.args == ("https://graph/messages/m1/attachments",)
+        assert "contentBytes" not in first.kwargs["params"]["$select"]
+        assert second.args == ("https://graph/next",)
+
+    def test_content_is_downloaded_on_demand(self, message, mocker):
+        attachment = RemoteAttachment(message, attachment_id="a1", name="file.txt")
+        message.con.get.assert_not_called()
+
+        response = message.con.get.return_value
+        response.iter_content.return_value = iter([b"raw ", b"content"])
+        assert attachment.download() == b"raw content"
+        message.con.get.assert_called_once_with(
+            "https://graph/messages/m1/attachments/a1/$value", stream=True
+        )
+        response.close.assert_called_once()
@@ -0,0 +1,92 @@
+import time
+
+import pytest
+
+from O365_jira_connect.backend import REFRESH_LOCK, DatabaseTokenBackend, TokenSvc
+from O365_jira_connect.models import AccessToken, SenderRule
+from O365_jira_connect.session import Session, init_engine, unit_of_work
+
+
+def new_token(access_token, expires_in=3600):
+    return {
+        "token_type": "Bearer",
+        "access_token": access_token,
+        "refresh_token": f"refresh-{access_token}",
+        "expires_in": expires_in,
+        "ext_expires_in": expires_in,
+        "expires_at": time.time() + expires_in,
+    }
+
+
+@pytest.fixture
+def backend():
+    backend = DatabaseTokenBackend(lock_ttl=1)
+    backend.token = new_token("first")
+    backend.save_token()
+    return backend
+
+
+class TestDatabaseTokenBackend:
+    def test_load_token_is_cached(self, backend, mocker):
+        backend.invalidate()
+        find_by = mocker.spy(backend.svc, "find_by")
+        assert backend.load_token()["access_token"] == "first"
+        assert backend.check_token() is True
+        assert find_by.call_count == 1
+
+    def test_expired_token_is_reloaded(self, backend, mocker):
+        backend.token = new_token("expiring", expires_in=30)
+        backend.save_token()
+        find_by = mocker.spy(backend.svc, "find_by")
+        backend.load_token()
+        assert find_by.call_count == 1
+
+    def test_save_token_replaces_token(self, backend):
+        TokenSvc.create(**new_token("legacy"))
+        backend.token = new_token("second")
+        backend.save_token()
+        backend.token = new_token("second")  # same token saved twice
+        backend.save_token()
+
+        session = Session()
+        tokens = session.query(AccessToken).all()
+        assert [t.access_token for t in tokens] == ["second"]
+        session.close()
+
+    def test_refresh_lock(self, backend):
+        other = DatabaseTokenBackend(lock_ttl=1)
+        other.token = backend.token
+        assert backend.should_refresh_token() is True
+        assert TokenSvc.acquire_lock(REFRESH_LOCK, other.owner, ttl=1) is False
+
+        # the lock is released once the refreshed token is saved
+        backend.token = new_token("refreshed")
+        backend.save_token()
+        assert TokenSvc.acquire_lock(REFRESH_LOCK, other.owner, ttl=1) is True
+        TokenSvc.release_lock(REFRESH_LOCK, other.owner)
+
+    def test_refresh_by_another_process(self, backend, mocker):
+        other = DatabaseTokenBackend(lock_ttl=1)
+        other.token = backend.token
+        assert backend.should_refresh_token() is True
+
+        def refresh(_):
+            backend.token = new_token("refreshed")
+            backend.save_token()
+
+        mocker.patch("O365_jira_connect.backend.time.sleep", side_effect=refresh)
+        assert other.should_refresh_token() is False
+        assert other.token["access_token"] == "refreshed"
+
+    def test_refresh_lock_on_busy_database(self, backend, tmp_path):
+        init_engine(f"sqlite:///{tmp_path / 'busy.db'}", busy_timeout=100)
+        with unit_of_work() as session:
+            session.add(SenderRule(list_name="blacklist", pattern="example.com"))
+            session.flush()
+
+            # a database locked by a writer reads as the lock being held
+            assert TokenSvc.acquire_lock(REFRESH_LOCK, backend.owner, ttl=1) is False
+
+            backend.token = new_token("refreshed")
+            assert backend.save_token() is False
+            assert backend.load_token()["access_token"] == "refreshed"
@@ -0,0 +1,166 @@
+import threading
+
+import pytest
+import requests
+
+from O365_jira_connect.batch import (
+    MAX_BATCH_SIZE,
+    BatchRequest,
+    GraphBatcher,
+    reply_all,
+    send,
+)
+
+BASE_URL = "https://graph.microsoft.com/v1.0/"
+
+
+def batch_response(mocker, *items):
+    response = mocker.Mock()
+    response.json.return_value = {"responses": list(items)}
+    return response
+
+
+@pytest.fixture
+def batcher(mocker):
+    con = mocker.Mock()
+    protocol = mocker.Mock(service_url=BASE_URL)
+    batcher = GraphBatcher(con, protocol, window=0.01)
+    yield batcher
+    batcher.stop()
+
+
+class TestBatchRequest:
+    def test_to_api_data(self):
+        draft = BatchRequest("patch", f"{BASE_URL}users/a/messages/1", body={"x": 1})
+        send = BatchRequest(
+            "POST", f"{BASE_URL}users/a/messages/1/send", depends_on=[draft]
+        )
+        ids = {draft: "1", send: "2"}
+        assert draft.to_api_data(ids, BASE_URL) == {
+            "id": "1",
+            "method": "PATCH",
+            "url": "/users/a/messages/1",
+            "body": {"x": 1},
+            "headers": {"Content-Type": "application/json"},
+        }
+        assert send.to_api_data(ids, BASE_URL)["dependsOn"] == ["1"]
+
+    def test_params(self):
+        request = BatchRequest("GET", f"{BASE_URL}me/messages/1", params={"a": "b"})
+        assert request.url.endswith("/me/messages/1?a=b")
+
+
+class TestGraphBatcher:
+    def test_send(self, mocker, batcher):
+        batcher.con.post.return_value = batch_response(
+            mocker,
+            {"id": "2", "status": 204},
+            {"id": "1", "status": 200, "body": {"id": "m1"}},
+        )
+        get = BatchRequest("GET", f"{BASE_URL}me/messages/m1")
+        delete = BatchRequest("DELETE", f"{BASE_URL}me/messages/m2")
+
+        got, deleted = batcher.send(get, delete)
+        assert got.json() == {"id": "m1"}
+        assert deleted.status_code == 204
+        (url,) = batcher.con.post.call_args.args
+        assert url == f"{BASE_URL}$batch"
+        assert len(batcher.con.post.call_args.kwargs["data"]["requests"]) == 2
+
+    def test_failure(self, mocker, batcher):
+        batcher.con.post.return_value = batch_response(
+            mocker,
+            {"id": "1", "status": 404, "body": {"error": {"code": "NotFound"}}},
+            {"id": "2", "status": 424},
+        )
+        get = BatchRequest("GET", f"{BASE_URL}me/messages/m1")
+        delete = BatchRequest("DELETE", f"{BASE_URL}me/messages/m1", depends_on=[get])
+        batcher.submit(get, delete)
+
+        with pytest.raises(requests.HTTPError) as ex:
+            get.result(timeout=1)
+        assert ex.value.response.status_code == 404
+        with pytest.raises(requests.HTTPError):
+            delete.result(timeout=1)
+
+    def test_shared_batch(self, mocker, batcher):
+        """Requests queued meanwhile from several threads share one batch."""
+        batcher.window = 0.5
+
+        def post(url, data):
+            items = [{"id": r["id"], "status": 200} for r in data["requests"]]
+            return batch_response(mocker, *items)
+
+        batcher.con.post.side_effect = post
+        threads = [
+            threading.Thread(
+                target=batcher.request, args=("GET", f"{BASE_URL}me/messages/{i}")
+            )
+            for i in range(MAX_BATCH_SIZE + 5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        sizes = sorted(
+            len(c.kwargs["data"]["requests"]) for c in batcher.con.post.call_args_list
+        )
+        assert sum(sizes) == MAX_BATCH_SIZE + 5
+        assert sizes[-1] == MAX_BATCH_SIZE
+        assert len(sizes) <= 3
+
+    def test_group_too_large(self, batcher):
+        requests_ = [BatchRequest("GET", BASE_URL) for _ in range(MAX_BATCH_SIZE + 1)]
+        with pytest.raises(ValueError):
+            batcher.submit(*requests_)
+
+    def test_throttled(self, mocker, batcher):
+        batcher.con.post.side_effect = [
+            batch_response(
+                mocker,
+                {"id": "1", "status": 200},
+                {"id": "2", "status": 429, "headers": {"Retry-After": "0"}},
+                {"id": "3", "status": 424},
+            ),
+            batch_response(
+                mocker, {"id": "1", "status": 202}, {"id": "2", "status": 204}
+            ),
+        ]
+        patch = BatchRequest("PATCH", f"{BASE_URL}me/messages/m1", body={})
+        send = BatchRequest(
+            "POST", f"{BASE_URL}me/messages/m1/send", depends_on=[patch]
+        )
+        delete = BatchRequest("DELETE", f"{BASE_URL}me/messages/m2", depends_on=[send])
+
+        responses = batcher.send(patch, send, delete)
+        assert [r.status_code for r in responses] == [200, 202, 204]
+
+        retried = batcher.con.post.call_args.kwargs["data"]["requests"]
+        assert [r["method"] for r in retried] == ["POST", "DELETE"]
+        assert "dependsOn" not in retried[0]
+        assert retried[1]["dependsOn"] == ["1"]
+        assert batcher.snapshot()["throttled"] == 2
+
+
+class TestSend:
+    def test_direct(self, mocker):
+        con = mocker.Mock()
+        message = mocker.Mock(object_id="m1")
+        message.build_url.side_effect = lambda endpoint: f"{BASE_URL}me{endpoint}"
+        request = reply_all(message, "<p>hi</p>")
+
+        send(con, request)
+        con.oauth_request.assert_called_once_with(
+            f"{BASE_URL}me/messages/m1/replyAll",
+            "post",
+            data={"message": {"body": {"contentType": "HTML", "content": "<p>hi</p>"}}},
+            headers={},
+        )
+
+    def test_batched(self, mocker):
+        con, batcher = mocker.Mock(), mocker.Mock()
+        request = BatchRequest("DELETE", f"{BASE_URL}me/messages/m1")
+        send(con, request, batcher=batcher)
+        batcher.send.assert_called_once_with(request)
+        con.oauth_request.assert_not_called()
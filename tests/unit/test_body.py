@@ -0,0 +1,54 @@
+import pytest
+
+from O365_jira_connect import body as body_module
+from O365_jira_connect.body import ParsedBody
+
+CONTENT = """
+<html>
+    <head>
+        <meta name="message" content="jira issue notification"/>
+        <style>p { color: red; }</style>
+    </head>
+    <body><p>Dear &amp; all,</p><div>{"issue": "UT-1",
+    "id": "10"}</div></body>
+</html>
+"""
+
+
+@pytest.fixture(params=["selectolax", "soup"])
+def backend(request, monkeypatch):
+    if request.param == "selectolax":
+        lexbor = pytest.importorskip("selectolax.lexbor")
+        monkeypatch.setattr(body_module, "HTMLParser", lexbor.LexborHTMLParser)
+    else:
+        monkeypatch.setattr(body_module, "HTMLParser", None)
+    return request.param
+
+
+class TestParsedBody:
+    def test_text(self, backend):
+        text = ParsedBody(CONTENT).text
+        assert "Dear & all," in text
+        assert "color" not in text
+
+    def test_meta(self, backend):
+        body = ParsedBody(CONTENT)
+        assert body.has_meta(content="jira issue notification")
+        assert not body.has_meta(content="relay jira comment")
+
+    def test_json(self, backend):
+        assert ParsedBody(CONTENT).json == {"issue": "UT-1", "id": "10"}
+        assert ParsedBody("<html><body>no payload</body></html>").json is None
+
+    def test_oversize(self):
+        body = ParsedBody(CONTENT, max_size=10)
+        assert body.soup is None
+        assert "Dear & all," in body.text
+        assert "color" not in body.text
+        assert body.has_meta(name="message", content="jira issue notification")
+        assert body.json == {"issue": "UT-1", "id": "10"}
+
+    def test_plain_text(self):
+        body = ParsedBody("some <text>", content_type="text")
+        assert body.text == "some <text>"
+        assert body.meta == []
@@ -0,0 +1,39 @@
+import pytest
+
+from O365_jira_connect.cache import TTLCache
+
+
+@pytest.fixture
+def cache():
+    return TTLCache(maxsize=2, ttl=60)
+
+
+class TestTTLCache:
+    def test_get_set(self, cache):
+        assert cache.get("key") is None
+        cache.set("key", "value")
+        assert cache.get("key") == "value"
+        assert cache.stats()["hits"] == 1
+        assert cache.stats()["misses"] == 1
+
+    def test_lru_eviction(self, cache):
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")  # 'b' becomes the least recently used
+        cache.set("c", 3)
+        assert "a" in cache
+        assert "b" not in cache
+        assert "c" in cache
+
+    def test_expiration(self, cache, mocker):
+        monotonic = mocker.patch("time.monotonic", return_value=0)
+        cache.set("positive", True)
+        cache.set("negative", None, ttl=10)
+        monotonic.return_value = 30
+        assert cache.get("positive") is True
+        assert cache.get("negative", "missing") == "missing"
+
+    def test_membership_is_not_a_lookup(self, cache):
+        cache.set("key", "value")
+        assert "key" in cache
+        assert cache.stats()["hits"] == 0
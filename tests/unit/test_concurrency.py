@@ -0,0 +1,81 @@
+import threading
+import time
+
+import pytest
+
+from O365_jira_connect.concurrency import FanOut, KeyedExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = KeyedExecutor(max_workers=4)
+    yield executor
+    executor.shutdown()
+
+
+class TestKeyedExecutor:
+    def test_same_key_is_serialized(self, executor):
+        running, results = [], []
+        lock = threading.Lock()
+
+        def task(i):
+            with lock:
+                running.append(i)
+                assert len(running) == 1  # no other task for the key is running
+            time.sleep(0.01)
+            with lock:
+                running.remove(i)
+            results.append(i)
+
+        futures = [executor.submit("conversation", task, i) for i in range(5)]
+        for future in futures:
+            future.result()
+        assert results == [0, 1, 2, 3, 4]
+
+    def test_different_keys_run_concurrently(self, executor):
+        barrier = threading.Barrier(2, timeout=1)
+        futures = [executor.submit(key, barrier.wait) for key in ("a", "b")]
+        assert all(future.result() is not None for future in futures)
+
+    def test_exceptions_are_kept_in_future(self, executor):
+        future = executor.submit("key", lambda: 1 / 0)
+        assert isinstance(future.exception(), ZeroDivisionError)
+        assert executor.submit("key", lambda: "next").result() == "next"
+
+    def test_submit_after_shutdown(self, executor):
+        executor.shutdown()
+        future = executor.submit("key", lambda: "late")
+        assert isinstance(future.exception(timeout=1), RuntimeError)
+        assert isinstance(
+            executor.submit("key", int).exception(timeout=1), RuntimeError
+        )
+        assert not executor._queues
+
+
+class TestFanOut:
+    def test_runs_concurrently(self):
+        barrier = threading.Barrier(3, timeout=1)
+
+        def task(name):
+            barrier.wait()  # breaks unless the three tasks run at once
+            return name
+
+        fanout = FanOut(max_workers=3)
+        for name in ("a", "b", "c"):
+            fanout.submit(name, task, name)
+
+        results, errors = fanout.join()
+        assert results == {"a": "a", "b": "b", "c": "c"}
+        assert errors == {}
+
+    def test_failures_are_collected(self):
+        def fail():
+            raise RuntimeError("unavailable")
+
+        fanout = FanOut(max_workers=2)
+        fanout.submit("fails", fail)
+        fanout.submit("succeeds", lambda: 1)
+
+        results, errors = fanout.join()
+        assert results == {"succeeds": 1}
+        assert isinstance(errors["fails"], RuntimeError)
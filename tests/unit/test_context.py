@@ -0,0 +1,49 @@
+import pytest
+
+from O365_jira_connect.context import MessageContext
+
+
+@pytest.fixture
+def message(mocker):
+    def recipient(address):
+        return mocker.Mock(address=address)
+
+    return mocker.Mock(
+        conversation_id="conversation",
+        unique_body="<html><body>some text</body></html>",
+        unique_body_type="HTML",
+        sender=recipient("me@example.com"),
+        to=[recipient("support@example.com")],
+        cc=[recipient("him@example.com"), recipient("her@example.com")],
+        bcc=[recipient("him@example.com")],
+    )
+
+
+class TestMessageContext:
+    def test_issue_is_looked_up_once(self, message, mocker):
+        find_one = mocker.patch("O365_jira_connect.context.issue_s.find_one")
+        ctx = MessageContext(message)
+        assert ctx.issue is ctx.issue
+        find_one.assert_called_once_with(
+            outlook_conversation_id="conversation", _model=True
+        )
+
+    def test_body_is_parsed_once(self, message):
+        ctx = MessageContext(message)
+        assert ctx.unique_body is ctx.unique_body
+        assert ctx.unique_body.text == "some text"
+
+    def test_recipients(self, message):
+        ctx = MessageContext(message)
+        assert ctx.sender == "me@example.com"
+        assert ctx.to == {"support@example.com"}
+        assert ctx.watchers == ["him@example.com", "her@example.com"]
+
+    def test_attachments_are_listed_on_demand(self, message, mocker):
+        list_attachments = mocker.patch(
+            "O365_jira_connect.context.list_attachments", return_value=[]
+        )
+        ctx = MessageContext(message)
+        list_attachments.assert_not_called()
+        assert ctx.attachments is ctx.attachments
+        list_attachments.assert_called_once_with(message)
@@ -0,0 +1,80 @@
+import datetime
+
+import jira
+import pytest
+
+from O365_jira_connect.handlers import JiraNotificationHandler
+
+
+@pytest.fixture
+def message(mocker):
+    message = mocker.Mock(
+        body="<html><head><style>p {margin: 0}</style></head>"
+        "<body><p>the printer is down</p></body></html>",
+        body_type="HTML",
+        subject="Printer <3rd floor>",
+        sent=datetime.datetime(2022, 3, 7, 14, 30),
+    )
+    message.sender.name, message.sender.address = "Me", "me@example.com"
+    message.to = [mocker.Mock(name="support", address="support@example.com")]
+    message.to[0].name = "support@example.com"
+    message.cc = []
+    return message
+
+
+class TestRenderReply:
+    def test_html(self, message):
+        body = JiraNotificationHandler.render_reply(
+            message, values={"body": "issue created", "metadata": []}
+        )
+        assert "issue created" in body
+        assert "<p>the printer is down</p>" in body
+        assert "p {margin: 0}" in body
+        assert "Me &lt;me@example.com&gt;" in body
+        assert "<b>To:</b> support@example.com<br/>" in body
+        assert "Printer &lt;3rd floor&gt;" in body
+        assert "Monday, March 07, 2022 02:30 PM" in body
+        assert "Cc:" not in body
+
+    def test_text(self, message):
+        message.body, message.body_type = "line 1\n<line 2>", "text"
+        body = JiraNotificationHandler.render_reply(message, values={"metadata": []})
+        assert "line 1<br/>&lt;line 2&gt;" in body
+
+
+class TestHandleMessage:
+    @pytest.fixture
+    def issue_s(self, mocker):
+        issue_s = mocker.patch("O365_jira_connect.handlers.issue_s")
+        issue_s.has_message.return_value = False
+        return issue_s
+
+    @pytest.fixture
+    def handler(self, mocker, issue_s):
+        return JiraNotificationHandler(parent=mocker.Mock(), namespace=mocker.Mock())
+
+    @pytest.fixture
+    def reply(self, mocker, message):
+        message.object_id, message.created = "m2", message.sent
+        ctx = mocker.patch("O365_jira_connect.handlers.MessageContext").return_value
+        ctx.issue = mocker.Mock(id=1, key="UT-1")
+        ctx.sender = "me@example.com"
+        return message
+
+    def test_comment_on_deleted_issue(self, handler, issue_s, reply):
+        """An issue deleted in Jira while still cached as live gets replaced."""
+        issue_s.exists.return_value = True
+        issue_s.create_comment.side_effect = jira.JIRAError(status_code=404)
+
+        handler.handle_message(reply)
+        issue_s.delete.assert_called_once_with(issue_id=1)
+        issue_s.add_message_to_history.assert_not_called()
+        issue_s.create.assert_called_once()
+
+    def test_comment_failure(self, handler, issue_s, reply):
+        issue_s.create_comment.side_effect = jira.JIRAError(status_code=500)
+
+        with pytest.raises(jira.JIRAError):
+            handler.handle_message(reply)
+        issue_s.delete.assert_not_called()
+        issue_s.create.assert_not_called()
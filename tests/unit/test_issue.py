@@ -0,0 +1,325 @@
+import jira
+import pytest
+
+from O365_jira_connect.models import (
+    Issue,
+    IssueAttachment,
+    IssueMessage,
+    SenderRule,
+)
+from O365_jira_connect.services import issue as issue_module
+from O365_jira_connect.services.issue import IssueSvc
+from O365_jira_connect.session import (
+    Session,
+    init_engine,
+    new_session,
+    unit_of_work,
+    with_session,
+)
+
+
+@pytest.fixture
+def issue():
+    session = Session()
+    issue = Issue(key="UT-1", reporter="me@example.com")
+    session.add(issue)
+    session.commit()
+    session.refresh(issue)
+    session.close()
+    return issue
+
+
+@pytest.fixture
+def issue_s(mocker):
+    return IssueSvc(jira=mocker.Mock(), configs={})
+
+
+def user(mocker, name):
+    return mocker.Mock(spec=jira.User, accountId=name, displayName=name)
+
+
+class TestIssueSvc:
+    def test_attachments_index(self, issue, issue_s, mocker):
+        attachment = mocker.Mock(sha256="abc", id="10", filename="a.pdf", size=1)
+        issue_s.index_attachments(issue_id=issue.id, attachments=[attachment])
+        assert issue_s.attachment_hashes(issue_id=issue.id) == {"abc"}
+
+    def test_backfill_attachments(self, issue, issue_s, mocker):
+        attachments = [
+            mocker.Mock(id="10", filename="a.pdf", size=1),
+            mocker.Mock(id="11", filename="b.pdf", size=1),
+            mocker.Mock(id="12", filename="c.pdf", size=1),
+        ]
+        jira_issue = issue_s.jira.issue.return_value
+        jira_issue.fields.attachment = attachments
+        issue_s.jira.attachment_sha256.side_effect = ["abc", "def", "abc", "abc"]
+
+        assert issue_s.backfill_attachments() == 2
+        assert issue_s.attachment_hashes(issue_id=issue.id) == {"abc", "def"}
+
+        # indexed attachments are not downloaded again, only the duplicate is
+        assert issue_s.backfill_attachments() == 0
+        assert issue_s.jira.attachment_sha256.call_count == 4
+
+        session = Session()
+        assert session.query(IssueAttachment).count() == 2
+        session.close()
+
+    def test_create(self, issue_s, mocker):
+        issue_s.configs.update(project_key="UT", issue_type="Task", default_labels=[])
+        watchers = [user(mocker, "him"), user(mocker, "her")]
+        issue_s.jira.resolve_emails.return_value = ["me@example.com", *watchers]
+        issue_s.jira.create_issue.return_value = mocker.Mock(key="UT-2")
+        issue_s.jira.add_user_watcher.side_effect = [RuntimeError("unavailable"), None]
+        added = mocker.Mock(sha256="abc", id="10", filename="a.pdf", size=1)
+        issue_s.jira.add_attachments.return_value = [added]
+        notify = mocker.Mock()
+
+        model = issue_s.create(
+            title="printer down",
+            body="the printer is down",
+            reporter="me@example.com",
+            watchers=["him@example.com", "her@example.com"],
+            attachments=[mocker.Mock()],
+            notify=notify,
+            outlook_message_id="m1",
+        )
+
+        # a failing watcher does not prevent the other side effects
+        assert model.key == "UT-2"
+        assert issue_s.jira.add_user_watcher.call_count == 2
+        notify.assert_called_once_with("UT-2")
+        assert issue_s.attachment_hashes(issue_id=model.id) == {"abc"}
+        assert issue_s.last_message_id(issue_id=model.id) == "m1"
+
+    def test_create_holds_no_lock(self, issue_s, mocker, tmp_path):
+        init_engine(f"sqlite:///{tmp_path / 'locks.db'}", busy_timeout=100)
+        issue_s.configs.update(project_key="UT", issue_type="Task", default_labels=[])
+
+        @with_session
+        def resolve_emails(emails, session=None):
+            # as the resolver does, storing its lookups
+            session.add(SenderRule(list_name="blacklist", pattern="a.com"))
+            session.flush()
+            return emails
+
+        def create_issue(**_):
+            # another worker writes meanwhile
+            with new_session() as session:
+                session.add(SenderRule(list_name="blacklist", pattern="b.com"))
+            return mocker.Mock(key="UT-1")
+
+        issue_s.jira.resolve_emails.side_effect = resolve_emails
+        issue_s.jira.create_issue.side_effect = create_issue
+
+        model = issue_s.create(title="t", body="b", reporter="me@example.com")
+        assert issue_s.get(ticket_id=model.id).key == "UT-1"
+
+    def test_find_by(self, issue, issue_s, mocker):
+        session = Session()
+        session.add(Issue(key="UT-3", reporter="me@example.com"))
+        session.commit()
+        session.close()
+
+        jira_issues = [mocker.Mock(key=k, raw={}) for k in ("UT-3", "UT-2", "UT-1")]
+        issue_s.jira.create_jql_queries.return_value = ['labels in ("support")']
+        issue_s.jira.search_issues.return_value = jira_issues
+        issue_s.jira.watchers_workers = 2
+        issue_s.jira.watchers.side_effect = lambda key: mocker.Mock(
+            raw={"watchers": [key]}
+        )
+
+        # tickets not locally present are left out
+        issues = issue_s.find_by(labels=["support"], fields=["watchers"])
+        assert [i.key for i in issues] == ["UT-3", "UT-1"]
+        assert issues[0].jira_issue.raw["watchers"] == ["UT-3"]
+        assert issue_s.jira.watchers.call_count == 2
+
+    def test_iter_issues(self, issue, issue_s, mocker):
+        def pages(jql, fields, page_size):
+            yield [mocker.Mock(key="UT-2"), mocker.Mock(key="UT-1")]
+            yield [mocker.Mock(key="UT-1")]
+
+        issue_s.jira.create_jql_queries.return_value = ['key in ("UT-1")']
+        issue_s.jira.iter_search_pages.side_effect = pages
+        issues = issue_s.iter_issues(fields=["summary"], reporter="me@example.com")
+        assert [i.key for i in issues] == ["UT-1", "UT-1"]
+
+        # local filters narrow the search down
+        kwargs = issue_s.jira.create_jql_queries.call_args.kwargs
+        assert kwargs["key"] == ["UT-1"]
+        assert list(issue_s.iter_issues(reporter="nobody@example.com")) == []
+
+    def test_iter_issues_key_batches(self, issue_s, mocker, monkeypatch):
+        monkeypatch.setattr(issue_module, "KEYS_BATCH_SIZE", 2)
+        session = Session()
+        session.add_all(
+            Issue(key=f"UT-{i}", reporter="me@example.com") for i in range(5)
+        )
+        session.commit()
+        session.close()
+
+        issue_s.jira.create_jql_queries.side_effect = lambda key, **_: [tuple(key)]
+        issue_s.jira.iter_search_pages.side_effect = lambda jql, **_: iter(
+            [[mocker.Mock(key=key) for key in jql]]
+        )
+
+        # the local keys are loaded a batch at a time, as issues are consumed
+        issues = issue_s.iter_issues(reporter="me@example.com")
+        assert [next(issues).key, next(issues).key] == ["UT-0", "UT-1"]
+        assert issue_s.jira.create_jql_queries.call_count == 1
+        assert [i.key for i in issues] == ["UT-2", "UT-3", "UT-4"]
+        assert issue_s.jira.create_jql_queries.call_count == 3
+
+    def test_find_by_many_keys(self, issue_s, mocker):
+        session = Session()
+        session.add_all(
+            Issue(key=f"UT-{i}", reporter="me@example.com") for i in range(5)
+        )
+        session.commit()
+        session.close()
+
+        results = {"q1": ["UT-1", "UT-0"], "q2": ["UT-3", "UT-2"], "q3": ["UT-4"]}
+        issue_s.jira.create_jql_queries.return_value = list(results)
+        issue_s.jira.search_workers = 3
+        issue_s.jira.search_issues.side_effect = lambda jql_str, **_: [
+            mocker.Mock(key=key) for key in results[jql_str]
+        ]
+
+        # the searches results are merged in the order of the queries
+        issues = issue_s.find_by(reporter="me@example.com", limit=4)
+        assert [i.key for i in issues] == ["UT-1", "UT-0", "UT-3", "UT-2"]
+        assert issue_s.jira.search_issues.call_count == 3
+
+    def test_find_by_many_keys_sorted(self, issue_s, mocker):
+        session = Session()
+        session.add_all(
+            Issue(key=f"UT-{i}", reporter="me@example.com") for i in range(12)
+        )
+        session.commit()
+        session.close()
+
+        created = {
+            "UT-1": "2023-01-03",
+            "UT-2": "2023-01-02",
+            "UT-10": "2023-01-04",
+            "UT-11": "2023-01-01",
+        }
+        results = {"q1": ["UT-10", "UT-2"], "q2": ["UT-1", "UT-11"]}
+        issue_s.jira.create_jql_queries.return_value = list(results)
+        issue_s.jira.search_workers = 2
+        issue_s.jira.search_issues.side_effect = lambda jql_str, **_: [
+            mocker.Mock(
+                key=key,
+                raw={"fields": {"created": created.get(key), "priority": {"id": 1}}},
+            )
+            for key in results[jql_str]
+        ]
+
+        # each search is sorted by Jira, and their results merged alike
+        issues = issue_s.find_by(
+            reporter="me@example.com", sort="created DESC", limit=3
+        )
+        assert [i.key for i in issues] == ["UT-10", "UT-1", "UT-2"]
+
+        results = {"q1": ["UT-2", "UT-10"], "q2": ["UT-1", "UT-11"]}
+        issues = issue_s.find_by(reporter="me@example.com", sort="key", limit=3)
+        assert [i.key for i in issues] == ["UT-1", "UT-2", "UT-10"]
+
+        # priorities are sorted by a rank of Jira's own
+        with pytest.raises(ValueError):
+            issue_s.find_by(reporter="me@example.com", sort="priority", limit=3)
+
+    def test_reconcile(self, issue_s, mocker):
+        session = Session()
+        session.add_all(
+            Issue(key=f"UT-{i}", reporter="me@example.com") for i in range(5)
+        )
+        session.commit()
+        session.close()
+        with unit_of_work() as session:
+            session.add(IssueMessage(issue_id=5, outlook_message_id="m5"))
+
+        # UT-3 moved to OT-3, UT-4 was deleted; the second run fails midway
+        live = {"UT-0", "UT-1", "UT-2"}
+        issue_s.jira.search_workers = 2
+        issue_s.jira.create_jql_queries.side_effect = lambda max_keys, key: [
+            key[i : i + max_keys] for i in range(0, len(key), max_keys)
+        ]
+        issue_s.jira.iter_search_pages.side_effect = lambda jql, fields: iter(
+            [[mocker.Mock(key=key) for key in jql if key in live]]
+        )
+
+        def issue(id, fields):
+            if id == "UT-4":
+                raise jira.JIRAError(status_code=404)
+            return mocker.Mock(key={"UT-3": "OT-3"}.get(id, id))
+
+        issue_s.jira.issue.side_effect = issue
+
+        stats = issue_s.reconcile(batch_size=2, chunk_size=1)
+        assert stats["checked"] == 5
+        assert (stats["live"], stats["moved"], stats["stale"]) == (3, 1, 1)
+        assert issue_s.get(ticket_id=4) is not None  # only reported
+
+        found = [mocker.Mock(key="UT-0"), mocker.Mock(key="UT-1")]
+        issue_s.jira.iter_search_pages.side_effect = [iter([found]), jira.JIRAError()]
+        with pytest.raises(jira.JIRAError):
+            issue_s.reconcile(batch_size=2, prune=True)
+        assert issue_s.get_checkpoint(name="reconcile-issues") == 2
+
+        # the next run resumes past the checkpoint
+        issue_s.jira.iter_search_pages.side_effect = lambda jql, fields: iter(
+            [[mocker.Mock(key=key) for key in jql if key in live]]
+        )
+        stats = issue_s.reconcile(batch_size=2, prune=True)
+        assert stats["checked"] == 3
+        assert issue_s.get(ticket_id=4).key == "OT-3"
+        assert issue_s.get(ticket_id=5) is None
+        assert not issue_s.has_message(message_id="m5")
+        assert issue_s.get_checkpoint(name="reconcile-issues") == 0
+
+    def test_reconcile_rejected_search(self, issue_s, mocker):
+        session = Session()
+        session.add_all(
+            Issue(key=f"UT-{i}", reporter="me@example.com") for i in range(4)
+        )
+        session.commit()
+        session.close()
+
+        # the chunk of UT-3, deleted meanwhile, is rejected as a whole
+        issue_s.jira.search_workers = 2
+        issue_s.jira.create_jql_queries.side_effect = lambda max_keys, key: [
+            key[i : i + max_keys] for i in range(0, len(key), max_keys)
+        ]
+
+        def iter_search_pages(jql, fields):
+            if "UT-3" in jql:
+                raise jira.JIRAError(status_code=400, text="UT-3 does not exist")
+            yield [mocker.Mock(key=key) for key in jql]
+
+        def issue(id, fields):
+            if id == "UT-3":
+                raise jira.JIRAError(status_code=404)
+            return mocker.Mock(key=id)
+
+        issue_s.jira.iter_search_pages.side_effect = iter_search_pages
+        issue_s.jira.issue.side_effect = issue
+
+        stats = issue_s.reconcile(batch_size=4, chunk_size=2, prune=True)
+        assert (stats["live"], stats["moved"], stats["stale"]) == (3, 0, 1)
+        assert issue_s.jira.issue.call_count == 2
+        assert [issue_s.get(ticket_id=i).key for i in (1, 2, 3)] == [
+            "UT-0",
+            "UT-1",
+            "UT-2",
+        ]
+        assert issue_s.get(ticket_id=4) is None
+
+    def test_delete(self, issue, issue_s, mocker):
+        attachment = mocker.Mock(sha256="abc", id="10", filename="a.pdf", size=1)
+        issue_s.index_attachments(issue_id=issue.id, attachments=[attachment])
+
+        issue_s.delete(issue_id=issue.id)
+        assert issue_s.get(ticket_id=issue.id) is None
+        assert issue_s.attachment_hashes(issue_id=issue.id) == set()
@@ -1,4 +1,8 @@
+import base64
+import hashlib
+
 import jira
+import O365
 import pytest
 import requests
 import requests_mock
@@ -32,7 +36,28 @@ class TestJiraSvc:
         mocker.patch.object(
             jira_s, "issue", side_effect=jira.JIRAError(status_code=404)
         )
-        assert jira_s.exists_issue("Jira-123") is False
+        assert jira_s.exists_issue("Jira-456") is False
+
+        mocker.patch.object(
+            jira_s, "issue", side_effect=jira.JIRAError(status_code=500)
+        )
+        with pytest.raises(jira.JIRAError):
+            jira_s.exists_issue("Jira-456")
+
+    def test_exists_issue_cache(self, jira_s, adapter):
+        path = jira_s._get_url("issue/Jira-123")
+        adapter.register_uri("GET", path, json={"id": "1", "key": "Jira-123"})
+        assert jira_s.exists_issue("Jira-123") is True
+        assert jira_s.exists_issue("Jira-123") is True
+        assert adapter.call_count == 1
+        assert adapter.last_request.qs["fields"] == ["key"]
+
+        # a write finding the issue gone invalidates the cache
+        path = jira_s._get_url("issue/Jira-123/comment")
+        adapter.register_uri("POST", path, status_code=404)
+        with pytest.raises(jira.JIRAError):
+            jira_s.add_comment("Jira-123", "body")
+        assert jira_s.issues_cache.get("Jira-123") is None
 
     def test_has_permissions(self, jira_s, adapter):
         path = jira_s._get_url("mypermissions")
@@ -50,10 +75,111 @@ class TestJiraSvc:
         assert jira_s.has_permissions(permissions=["perm2"]) is False
         assert jira_s.has_permissions(permissions=["perm1", "perm2"]) is False
 
+    def test_has_permissions_cache(self, jira_s, adapter):
+        path = jira_s._get_url("mypermissions")
+        data = {"permissions": {"perm": {"havePermission": True}}}
+        matcher = adapter.register_uri("GET", path, json=data)
+        assert jira_s.has_permissions(permissions=["perm"]) is True
+        assert jira_s.has_permissions(permissions=["perm"]) is True
+        assert matcher.call_count == 1
+        assert jira_s.has_permissions(permissions=["perm"], projectKey="UT") is True
+        assert matcher.call_count == 2
+
+        # unauthorized responses drop the cached permissions
+        adapter.register_uri("GET", path, status_code=403)
+        assert jira_s.has_permissions(permissions=["other"]) is False
+        assert len(jira_s.permissions_cache) == 0
+
+    def test_add_attachment(self, jira_s, mocker):
+        uploads = []
+
+        def upload(issue, attachment, filename):
+            uploads.append((filename, attachment.len, attachment.read()))
+            return mocker.Mock()
+
+        mocker.patch.object(jira.JIRA, "add_attachment", side_effect=upload)
+        attachment = mocker.Mock(spec=O365.message.MessageAttachment)
+        attachment.name = "file.txt"
+        attachment.content = base64.b64encode(b"x" * 100_000).decode()
+
+        jira_s.attachments_spool_size = 1024
+        added = jira_s.add_attachment(issue="UT-1", attachment=attachment)
+        assert uploads == [("file.txt", 100_000, b"x" * 100_000)]
+        assert added.sha256 == hashlib.sha256(b"x" * 100_000).hexdigest()
+
+        attachment.content = None
+        assert jira_s.add_attachment(issue="UT-1", attachment=attachment) is None
+        assert len(uploads) == 1
+
+    def test_add_attachments(self, jira_s, mocker):
+        def upload(issue, attachment, filename):
+            return mocker.Mock(filename=filename)
+
+        mocker.patch.object(jira.JIRA, "add_attachment", side_effect=upload)
+
+        def attachment(name, content, is_inline=False):
+            a = mocker.Mock(spec=O365.message.MessageAttachment)
+            a.name, a.content = name, base64.b64encode(content).decode()
+            a.size, a.is_inline = len(content), is_inline
+            return a
+
+        logo = attachment("logo.png", b"logo", is_inline=True)
+        attachments = [attachment("a.pdf", b"a"), attachment("b.pdf", b"a"), logo]
+        assert jira_s.add_attachments(issue="UT-1", attachments=[]) == []
+        added = jira_s.add_attachments(issue="UT-1", attachments=attachments)
+        assert len(added) == 2  # same content is added once
+
+        sha256 = {a.filename: a.sha256 for a in added}
+        assert jira_s.add_attachments("UT-1", [logo], exclude=sha256.values()) == []
+
+        # small inline attachments are left out
+        jira_s.attachments_min_inline_size = 1024
+        assert jira_s.add_attachments(issue="UT-1", attachments=[logo]) == []
+
+    def test_add_watchers(self, jira_s, mocker):
+        def user(account_id):
+            return mocker.Mock(spec=jira.User, accountId=account_id, displayName="")
+
+        mocker.patch.object(jira_s, "has_permissions", return_value=True)
+        watchers = mocker.patch.object(jira.JIRA, "watchers")
+        watchers.return_value.watchers = [user("him")]
+        add_watcher = mocker.patch.object(jira.JIRA, "add_watcher")
+        issue = mocker.Mock(key="UT-1")
+
+        jira_s.add_watchers(issue, watchers=[user("him"), user("her"), "x@y.com"])
+        add_watcher.assert_called_once_with(issue="UT-1", watcher="her")
+
+        # only the new ones are added; the watchers are fetched once
+        jira_s.add_watchers(issue, watchers=[user("him"), user("her"), user("it")])
+        assert add_watcher.call_count == 2
+        add_watcher.assert_called_with(issue="UT-1", watcher="it")
+        watchers.assert_called_once_with("UT-1")
+
+    def test_iter_search_pages(self, jira_s, adapter):
+        path = jira_s._get_url("search/jql")
+        adapter.register_uri(
+            "POST",
+            path,
+            [
+                {"json": {"issues": [{"key": "UT-1"}], "nextPageToken": "t1"}},
+                {"json": {"issues": [{"key": "UT-2"}], "isLast": True}},
+            ],
+        )
+        pages = jira_s.iter_search_pages("project = UT", fields=["summary"])
+        assert [i.key for i in next(pages)] == ["UT-1"]
+        assert adapter.call_count == 1  # the next page is fetched on demand
+        assert [i.key for i in next(pages)] == ["UT-2"]
+        assert next(pages, None) is None
+        assert adapter.last_request.json() == {
+            "jql": "project = UT",
+            "maxResults": 100,
+            "fields": ["summary"],
+            "nextPageToken": "t1",
+        }
+
     def test_jql_builder(self, jira_s):
         query = jira_s.create_jql_query(
             assignee="user",
-            expand=["renderedFields"],
             filters=["filter1", "filter2"],
             key="JIRA-123",
             labels=["test", "label"],
@@ -62,15 +188,15 @@ class TestJiraSvc:
             summary="test summary",
             watcher="test",
         )
-        assert "assignee=user" in query
-        assert "expand=renderedFields" in query
-        assert "filter in (filter1, filter2)" in query
-        assert "key in (JIRA-123)" in query
-        assert "labels in (test, label)" in query
-        assert "status='open'" in query
-        assert "summary ~ 'test summary'" in query
-        assert "watcher=test" in query
-        assert "ORDER BY created" in query
+        assert query == (
+            'assignee = "user" AND filter in ("filter1", "filter2") '
+            'AND key in ("JIRA-123") AND labels in ("test", "label") '
+            'AND status = "open" AND summary ~ "test summary" '
+            'AND watcher = "test" ORDER BY created'
+        )
+
+        queries = jira_s.create_jql_queries(key=["UT-1", "UT-2", "UT-3"], max_keys=2)
+        assert queries == ['key in ("UT-1", "UT-2")', 'key in ("UT-3")']
 
     def test_mention(self, jira_s):
         email = "user@xyz.com"
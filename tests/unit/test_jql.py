@@ -0,0 +1,36 @@
+import pytest
+
+from O365_jira_connect.jql import _compile, build_jql, build_jql_chunks, quote
+
+
+class TestJql:
+    def test_quote(self):
+        assert quote("support") == '"support"'
+        assert quote('say "hi"') == '"say \\"hi\\""'
+        assert quote("back\\slash") == '"back\\\\slash"'
+
+    def test_build_jql(self):
+        assert build_jql() == ""
+        assert build_jql(labels="support") == 'labels in ("support")'
+        assert build_jql(key=["UT-1"], sort="created DESC") == (
+            'key in ("UT-1") ORDER BY created DESC'
+        )
+        assert build_jql(summary='x" OR project = "Y') == (
+            'summary ~ "x\\" OR project = \\"Y"'
+        )
+        with pytest.raises(ValueError):
+            build_jql(sort="created; DROP")
+
+    def test_build_jql_is_cached(self):
+        _compile.cache_clear()
+        build_jql(status="open", labels=["a", "b"])
+        build_jql(status="open", labels=("a", "b"))
+        assert _compile.cache_info().hits == 1
+
+    def test_build_jql_chunks(self):
+        keys = [f"UT-{i}" for i in range(5)]
+        queries = build_jql_chunks(key=keys, max_keys=2, status="open")
+        assert len(queries) == 3
+        assert queries[0] == 'key in ("UT-0", "UT-1") AND status = "open"'
+        assert queries[2] == 'key in ("UT-4") AND status = "open"'
+        assert build_jql_chunks(status="open") == ['status = "open"']
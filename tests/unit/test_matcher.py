@@ -0,0 +1,68 @@
+import os
+
+import pytest
+
+from O365_jira_connect.filters.matcher import ReloadingSenderMatcher, SenderMatcher
+from O365_jira_connect.models import SenderRule
+from O365_jira_connect.session import Session
+
+
+@pytest.fixture
+def matcher():
+    return SenderMatcher(
+        rules=[
+            "someone@example.com",
+            "example.org",
+            "*.example.net",
+            r"re:^noreply-\d+@",
+        ]
+    )
+
+
+class TestSenderMatcher:
+    def test_address(self, matcher):
+        assert matcher.match("someone@example.com")
+        assert matcher.match("SomeOne@Example.com")
+        assert not matcher.match("other@example.com")
+
+    def test_domain(self, matcher):
+        assert matcher.match("anyone@example.org")
+        assert not matcher.match("anyone@sub.example.org")
+
+    def test_subdomain(self, matcher):
+        assert matcher.match("anyone@sub.example.net")
+        assert matcher.match("anyone@deep.sub.example.net")
+        assert not matcher.match("anyone@example.net")
+        assert not matcher.match("anyone@badexample.net")
+
+    def test_regex(self, matcher):
+        assert matcher.match("noreply-123@anywhere.com")
+        assert not matcher.match("noreply@anywhere.com")
+
+    def test_empty(self):
+        assert not SenderMatcher().match("someone@example.com")
+        assert not SenderMatcher(rules=["example.com"]).match("")
+
+
+class TestReloadingSenderMatcher:
+    def test_file_reload(self, tmp_path):
+        path = tmp_path / "rules.txt"
+        path.write_text("# comment\nexample.com\n")
+        matcher = ReloadingSenderMatcher(path=str(path), interval=0)
+        assert matcher.match("someone@example.com")
+
+        path.write_text("example.org\n")
+        os.utime(path, (0, 1))  # ensure the modification is noticed
+        assert not matcher.match("someone@example.com")
+        assert matcher.match("someone@example.org")
+
+    def test_database_reload(self):
+        matcher = ReloadingSenderMatcher(rules=["example.com"], name="list", interval=0)
+        assert not matcher.match("someone@example.org")
+
+        session = Session()
+        session.add(SenderRule(list_name="list", pattern="example.org"))
+        session.commit()
+        session.close()
+        assert matcher.match("someone@example.org")
+        assert matcher.match("someone@example.com")
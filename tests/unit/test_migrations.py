@@ -0,0 +1,51 @@
+import datetime
+
+from O365_jira_connect import migrations
+from O365_jira_connect.models import Issue, IssueMessage
+from O365_jira_connect.session import Session
+
+
+class TestMigrations:
+    def test_migrate_messages_history(self):
+        session = Session()
+        session.add_all(
+            [
+                Issue(
+                    key="UT-1",
+                    reporter="me@example.com",
+                    outlook_messages_id="m1,m2,m3",
+                    created_at=datetime.datetime(2022, 1, 1),
+                ),
+                Issue(key="UT-2", reporter="me@example.com", outlook_messages_id="m4"),
+            ]
+        )
+        session.commit()
+        session.close()
+
+        assert migrations.pending()
+        assert migrations.migrate_messages_history(batch_size=1) == 2
+        assert migrations.migrate_messages_history(batch_size=1) == 0
+        assert not migrations.pending()
+
+        session = Session()
+        issue = session.query(Issue).filter_by(key="UT-1").one()
+        assert issue.outlook_messages_id is None
+        assert [m.outlook_message_id for m in issue.messages] == ["m1", "m2", "m3"]
+        assert session.query(IssueMessage).count() == 4
+        session.close()
+
+    def test_migrate_many_messages(self, monkeypatch):
+        monkeypatch.setattr(migrations, "MAX_PARAMS", 2)
+        session = Session()
+        session.add(IssueMessage(issue_id=1, outlook_message_id="m3"))
+        session.add(
+            Issue(key="UT-1", reporter="me@example.com", outlook_messages_id="m1,m2,m3")
+        )
+        session.commit()
+        session.close()
+
+        # the messages already migrated are looked up in chunks
+        assert migrations.migrate_messages_history() == 1
+        session = Session()
+        assert session.query(IssueMessage).count() == 3
+        session.close()
@@ -0,0 +1,83 @@
+import pytest
+
+from O365_jira_connect.filters.base import FilterCost, OutlookMessageFilter
+from O365_jira_connect.filters.pipeline import FilterPipeline
+
+
+class Accept(OutlookMessageFilter):
+    def __init__(self):
+        self.calls = 0
+
+    def apply(self, message, ctx=None):
+        self.calls += 1
+        return message
+
+
+class Reject(Accept):
+    def apply(self, message, ctx=None):
+        super().apply(message, ctx)
+        return None
+
+
+class Network(Accept):
+    cost = FilterCost.NETWORK
+
+
+class Database(Reject):
+    cost = FilterCost.DATABASE
+
+
+class SideEffect(Accept):
+    cost = FilterCost.NETWORK
+    side_effects = True
+
+
+class CheapSideEffect(Accept):
+    side_effects = True
+
+
+class TestFilterPipeline:
+    def test_cost_ordering(self):
+        filters = [Network(), Database(), SideEffect(), Accept()]
+        pipeline = FilterPipeline(filters)
+        names = [FilterPipeline.name(f) for f in pipeline.filters]
+        assert names == ["Accept", "Database", "Network", "SideEffect"]
+
+        # filters with side effects keep their order among themselves
+        filters = [SideEffect(), Database(), CheapSideEffect(), Accept()]
+        pipeline = FilterPipeline(filters)
+        names = [FilterPipeline.name(f) for f in pipeline.filters]
+        assert names == ["Accept", "Database", "SideEffect", "CheapSideEffect"]
+
+    def test_explicit_ordering(self):
+        filters = [Network(), Database(), Accept()]
+        pipeline = FilterPipeline(filters, order=["Network", "Accept"])
+        names = [FilterPipeline.name(f) for f in pipeline.filters]
+        assert names == ["Network", "Accept", "Database"]
+
+        with pytest.raises(ValueError):
+            FilterPipeline(filters, order=["Missing"])
+
+    def test_short_circuit(self, mocker):
+        network = Network()
+        pipeline = FilterPipeline([network, Database(), Accept()])
+        assert pipeline.apply(mocker.Mock(), ctx=mocker.Mock()) is False
+        assert network.calls == 0
+
+        stats = pipeline.snapshot()
+        assert stats["Accept"]["applied"] == 1
+        assert stats["Database"]["rejected"] == 1
+        assert stats["Database"]["latency"]["count"] == 1
+        assert stats["Network"]["applied"] == 0
+
+    def test_stats_per_instance(self, mocker):
+        named = Reject()
+        named.name = "Named"
+        pipeline = FilterPipeline([Accept(), Accept(), named])
+        assert pipeline.names == ["Accept", "Accept#2", "Named"]
+
+        # filters of the same class keep counters of their own
+        assert pipeline.apply(mocker.Mock(), ctx=mocker.Mock()) is False
+        stats = pipeline.snapshot()
+        assert stats["Accept"]["applied"] == stats["Accept#2"]["applied"] == 1
+        assert stats["Named"]["rejected"] == 1
@@ -0,0 +1,125 @@
+import io
+
+import jira
+import pytest
+import requests
+import requests.adapters
+
+from O365_jira_connect.ratelimit import AdaptiveLimiter, RateLimitedAdapter, TokenBucket
+from O365_jira_connect.services.jira import ProxyJIRA
+
+
+def response(status_code, headers=None):
+    r = requests.Response()
+    r.status_code = status_code
+    r.raw = io.BytesIO()
+    r.headers.update(headers or {})
+    return r
+
+
+def request(method):
+    return requests.Request(method, "https://jira.example.com/rest").prepare()
+
+
+@pytest.fixture
+def clock(mocker):
+    """A fake clock, moved forward by sleeping."""
+    now = [1000.0]
+
+    def sleep(seconds):
+        now[0] += seconds
+
+    mocker.patch("O365_jira_connect.ratelimit.time.monotonic", lambda: now[0])
+    return mocker.patch("O365_jira_connect.ratelimit.time.sleep", side_effect=sleep)
+
+
+class TestTokenBucket:
+    def test_acquire(self, clock):
+        bucket = TokenBucket(rate=10, burst=2)
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == 0
+        assert bucket.acquire() == pytest.approx(0.1)  # out of tokens
+
+    def test_pause(self, clock):
+        bucket = TokenBucket(rate=1000, burst=10)
+        bucket.pause(5)
+        assert bucket.acquire() == pytest.approx(5)
+
+
+class TestAdaptiveLimiter:
+    def test_aimd(self):
+        limiter = AdaptiveLimiter(max_limit=8)
+        limiter.acquire()
+        limiter.release(throttled=True)
+        assert limiter.limit == 4
+        for _ in range(4):
+            limiter.acquire()
+            limiter.release()
+        assert 4.9 < limiter.limit < 5
+        assert limiter.in_flight == 0
+
+
+class TestRateLimitedAdapter:
+    def test_retry_idempotent(self, clock, mocker):
+        send = mocker.patch.object(
+            requests.adapters.HTTPAdapter,
+            "send",
+            side_effect=[response(429, {"Retry-After": "2"}), response(200)],
+        )
+        adapter = RateLimitedAdapter(max_concurrency=4)
+        assert adapter.send(request("GET")).status_code == 200
+        assert send.call_count == 2
+
+        snapshot = adapter.snapshot()
+        assert snapshot["rate_limited"] == 1
+        assert snapshot["retries"] == 1
+        assert snapshot["concurrency_limit"] == 2
+        assert snapshot["throttled"]["sum"] >= 2
+
+    def test_no_retry_non_idempotent(self, clock, mocker):
+        send = mocker.patch.object(
+            requests.adapters.HTTPAdapter, "send", return_value=response(429)
+        )
+        adapter = RateLimitedAdapter()
+        assert adapter.send(request("POST")).status_code == 429
+        assert send.call_count == 1
+
+    def test_server_limits(self, mocker):
+        headers = {
+            "X-RateLimit-FillRate": "50",
+            "X-RateLimit-Interval-Seconds": "10",
+            "X-RateLimit-Limit": "100",
+        }
+        mocker.patch.object(
+            requests.adapters.HTTPAdapter, "send", return_value=response(200, headers)
+        )
+        adapter = RateLimitedAdapter()
+        adapter.send(request("GET"))
+        assert adapter.bucket.rate == 5
+        assert adapter.bucket.burst == 100
+
+
+class TestJiraSession:
+    def test_single_retry_layer(self, clock, mocker):
+        """Jira's session leaves the retries on 429 to the adapter."""
+        send = mocker.patch.object(
+            requests.adapters.HTTPAdapter,
+            "send",
+            side_effect=lambda *_, **__: response(429, {"Retry-After": "1"}),
+        )
+        client = ProxyJIRA(
+            server="https://jira.example.com",
+            basic_auth=("user", "token"),
+            get_server_info=False,
+            adapter=RateLimitedAdapter(max_retries_on_429=2),
+        )
+        url = client._get_url("myself")
+
+        with pytest.raises(jira.JIRAError):
+            client._session.get(url)
+        assert send.call_count == 3  # sent once, then retried by the adapter
+
+        send.reset_mock()
+        with pytest.raises(jira.JIRAError):
+            client._session.post(url, data="{}")
+        assert send.call_count == 1
@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+from O365_jira_connect.refresher import TokenRefresher
+
+
+@pytest.fixture
+def connection(mocker):
+    connection = mocker.Mock()
+    connection.token_backend.token = {"expires_at": time.time() + 3600}
+    connection.token_backend.should_refresh_token.return_value = True
+    return connection
+
+
+class TestTokenRefresher:
+    def test_next_refresh_in(self, connection):
+        refresher = TokenRefresher(connection, margin=600)
+        assert 2990 < refresher.next_refresh_in() <= 3000
+
+        connection.token_backend.token = {"expires_at": time.time()}
+        assert refresher.next_refresh_in() == 0
+
+    def test_refresh(self, connection):
+        refresher = TokenRefresher(connection)
+        assert refresher.refresh() is True
+        connection.refresh_token.assert_called_once()
+
+        connection.refresh_token.side_effect = RuntimeError("unavailable")
+        assert refresher.refresh() is False
+        assert refresher.snapshot()["refreshes"] == 1
+        assert refresher.snapshot()["failures"] == 1
+        assert refresher.snapshot()["latency"]["count"] == 2
+
+    def test_refreshed_by_another_process(self, connection):
+        connection.token_backend.should_refresh_token.return_value = False
+        refresher = TokenRefresher(connection)
+        assert refresher.refresh() is True
+        connection.refresh_token.assert_not_called()
+        assert connection.session.token is connection.token_backend.token
+
+    def test_background_refresh(self, connection):
+        connection.token_backend.token = {"expires_at": time.time()}
+        refresher = TokenRefresher(connection, retry_interval=0.01)
+        connection.refresh_token.return_value = False
+        refresher.start()
+        time.sleep(0.1)
+        refresher.stop(timeout=1)
+        assert connection.refresh_token.call_count > 1  # retried on failure
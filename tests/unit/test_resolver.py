@@ -0,0 +1,80 @@
+import datetime
+
+import jira
+import pytest
+import sqlalchemy.exc
+
+from O365_jira_connect.models import JiraUser
+from O365_jira_connect.services.resolver import EmailResolver
+from O365_jira_connect.session import Session
+
+
+@pytest.fixture
+def client(mocker):
+    client = mocker.Mock(_options={}, _session=None)
+    users = {
+        "guest@example.com": jira.User(
+            {}, None, raw={"self": "", "accountId": "123", "displayName": "Guest"}
+        )
+    }
+    client.search_users.side_effect = lambda query, **_: (
+        [users[query]] if query in users else []
+    )
+    return client
+
+
+@pytest.fixture
+def resolver(client):
+    return EmailResolver(jira=client)
+
+
+class TestEmailResolver:
+    def test_resolve(self, resolver):
+        assert resolver.resolve("guest@example.com").accountId == "123"
+        assert resolver.resolve("xyz@email.com") == "xyz@email.com"
+        assert resolver.resolve("") is None
+
+    def test_negative_caching(self, resolver, client):
+        resolver.resolve("nobody@email.com")
+        resolver.resolve("nobody@email.com")
+        assert client.search_users.call_count == 1
+        assert resolver.stats()["hits"] == 1
+
+    def test_persistent_store(self, client):
+        EmailResolver(jira=client).resolve("guest@example.com")
+        user = EmailResolver(jira=client).resolve("Guest@example.com")
+        assert user.accountId == "123"
+        assert client.search_users.call_count == 1
+
+    def test_resolve_many(self, resolver, client, mocker):
+        emails = ["guest@example.com", "other@email.com", "guest@example.com"]
+        users = resolver.resolve_many(emails)
+        assert users[0].accountId == users[2].accountId == "123"
+        assert users[1] == "other@email.com"
+        assert client.search_users.call_count == 2
+        assert (resolver.stats()["hits"], resolver.stats()["misses"]) == (0, 2)
+
+        # lookups are stored at once, and then served from the cache
+        store = mocker.spy(resolver, "_store")
+        resolver.resolve_many(["a@email.com", "b@email.com", "guest@example.com"])
+        store.assert_called_once()
+        assert set(store.call_args.args[0]) == {"a@email.com", "b@email.com"}
+        assert resolver.stats()["hits"] == 1
+
+    def test_store_conflict(self, resolver, client, mocker):
+        # stored by another worker after this one missed it
+        session = Session()
+        outdated = datetime.datetime(2020, 1, 1)
+        session.add(JiraUser(email="guest@example.com", resolved_at=outdated))
+        session.commit()
+        session.close()
+
+        assert resolver.resolve("guest@example.com").accountId == "123"
+        session = Session()
+        assert session.query(JiraUser).get("guest@example.com").account_id == "123"
+        session.close()
+
+        # failing to store a lookup does not fail the resolution
+        error = sqlalchemy.exc.IntegrityError("INSERT", {}, Exception("UNIQUE"))
+        mocker.patch.object(EmailResolver, "_upsert", side_effect=error)
+        assert resolver.resolve("other@email.com") == "other@email.com"
@@ -0,0 +1,63 @@
+import pytest
+
+from O365_jira_connect.models import SenderRule
+from O365_jira_connect.session import (
+    Session,
+    init_engine,
+    session_scope,
+    unit_of_work,
+    with_session,
+)
+
+
+@with_session
+def add_rule(pattern, session=None):
+    rule = SenderRule(list_name="blacklist", pattern=pattern)
+    session.add(rule)
+    session.flush()
+    return rule
+
+
+@with_session
+def count_rules(session=None):
+    return session.query(SenderRule).count()
+
+
+class TestSession:
+    def test_with_session(self):
+        rule = add_rule(pattern="example.com")
+        assert rule.id is not None
+        assert rule.pattern == "example.com"  # still usable once committed
+        assert count_rules() == 1
+
+    def test_unit_of_work(self):
+        with unit_of_work() as session:
+            add_rule(pattern="a.com")
+            add_rule(pattern="b.com")
+            assert Session() is session
+        assert count_rules() == 2
+
+    def test_unit_of_work_rollback(self):
+        with pytest.raises(RuntimeError):
+            with unit_of_work():
+                add_rule(pattern="a.com")
+                raise RuntimeError
+        assert count_rules() == 0
+
+    def test_session_scope(self):
+        with session_scope() as session:
+            rule = add_rule(pattern="a.com")
+            assert Session() is session
+            assert rule in session
+
+            # each unit of work of the scope is committed on its own
+            other = Session.session_factory()
+            assert other.query(SenderRule).count() == 1
+            other.close()
+        assert Session() is not session
+
+    def test_sqlite_pragmas(self, tmp_path):
+        engine = init_engine(f"sqlite:///{tmp_path / 'wal.db'}", busy_timeout=1234)
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == 1234